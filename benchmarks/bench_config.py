@@ -0,0 +1,80 @@
+"""
+scaling_mode reads: the old path (schema check on every call, then the SELECT), a plain SELECT, and
+ConfigCache. Then how long a set_config from elsewhere takes to show up in the cache, with LISTEN and
+on the TTL fallback. Needs the database from POSTGRES_*:
+
+    python -m benchmarks.bench_config
+"""
+import statistics
+import time
+
+from src.config_cache import ConfigCache
+from src.database import DatabaseManager
+
+READS = 200
+CHANGES = 20
+
+def per_call(fn, n=READS):
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+# What ensure_table() ran before every query while tables_ready was never set, on an up-to-date schema
+LEGACY_CHECK = [
+    """SELECT EXISTS (SELECT 1 FROM pg_attribute WHERE attrelid = to_regclass('system_metrics_1h') AND attname = 'host_id'),
+              to_regclass('metric_samples') IS NOT NULL""",
+    "SELECT relkind FROM pg_class WHERE oid = to_regclass('system_metrics')",
+    "CREATE TABLE IF NOT EXISTS system_config (key TEXT PRIMARY KEY, value TEXT)",
+    "INSERT INTO system_config (key, value) VALUES ('scaling_mode', 'auto') ON CONFLICT (key) DO NOTHING",
+    "CREATE TABLE IF NOT EXISTS scale_leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at TIMESTAMPTZ NOT NULL)",
+]
+
+def legacy_read(db):
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        for statement in LEGACY_CHECK:
+            cursor.execute(statement)
+        connection.commit()
+    return db.get_config("scaling_mode")
+
+def propagation(db, cache, timeout=5.0):
+    """ms from a set_config (bypassing this cache, like another process) until cache.get() returns it"""
+    latencies = []
+    for i in range(CHANGES):
+        value = f"bench-{i}"
+        started = time.perf_counter()
+        db.set_config("bench_mode", value)
+        while cache.get("bench_mode") != value:
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError("change never showed up")
+            time.sleep(0.001)
+        latencies.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.05)
+    return latencies
+
+def main():
+    db = DatabaseManager()
+    db.set_config("bench_mode", "start")
+
+    cache = ConfigCache(db).start()
+    deadline = time.monotonic() + 10
+    while not cache.listening() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    cache.get("scaling_mode")
+
+    print(f"{'scaling_mode read':<28} {'us/call':>10}")
+    print(f"{'schema check + SELECT':<28} {per_call(lambda: legacy_read(db), n=50):>10.1f}")
+    print(f"{'SELECT':<28} {per_call(lambda: db.get_config('scaling_mode')):>10.1f}")
+    print(f"{'ConfigCache':<28} {per_call(lambda: cache.get('scaling_mode'), n=100_000):>10.2f}")
+
+    print(f"\n{'propagation':<28} {'p50 ms':>10} {'max ms':>10}")
+    latencies = propagation(db, cache)
+    print(f"{'LISTEN/NOTIFY':<28} {statistics.median(latencies):>10.1f} {max(latencies):>10.1f}")
+    cache.stop()
+
+    fallback = ConfigCache(db, listen=False)    # Re-reads once fallback_ttl (CONFIG_CACHE_TTL) has passed
+    latencies = propagation(db, fallback)
+    print(f"{'TTL fallback (1s)':<28} {statistics.median(latencies):>10.1f} {max(latencies):>10.1f}")
+
+if __name__ == "__main__":
+    main()
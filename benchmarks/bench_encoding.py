@@ -0,0 +1,85 @@
+"""
+/metrics serialization: the row-per-dict JSON path vs the columnar encodings, for 1k/10k/100k rows.
+Starts from what the DB cursor returns (tuples) and measures build + encode time and the bytes on the
+wire, raw and compressed. MessagePack/Arrow/Brotli are skipped when not installed. No database needed:
+
+    python -m benchmarks.bench_encoding
+"""
+import gzip
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src import encoding
+from src.encoding import ARROW, COLUMNAR, MSGPACK, encode
+
+SIZES = (1_000, 10_000, 100_000)
+REPEAT = 5
+
+def cursor_rows(n, seed=3):
+    """Rows as get_recent_metrics / get_recent_columns fetch them"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1)
+    values = rng.uniform(0, 100, (n, 4)).round(1)
+    return (
+        [(start + timedelta(seconds=i), *map(float, values[i]), "node-1") for i in range(n)],
+        [(1704067200000 + i * 1000, *map(float, values[i]), "node-1") for i in range(n)],
+    )
+
+def rows_json(rows):
+    """The original path: a dict per row with isoformat(), then FastAPI's generic encoder"""
+    data = [{
+        "timestamp": row[0].isoformat(), "cpu": row[1], "memory": row[2], "disk": row[3], "network": row[4], "host": row[5]
+    } for row in rows]
+    return JSONResponse(jsonable_encoder({"count": len(data), "data": data})).body
+
+def columns(rows):
+    """get_recent_columns(): epoch ms comes from SQL, numpy arrays per metric"""
+    timestamps, cpu, memory, disk, network, hosts = zip(*rows)
+    return {
+        "count": len(rows),
+        "data": {
+            "timestamp": np.array(timestamps, dtype=np.int64),
+            "cpu": np.array(cpu, dtype=float),
+            "memory": np.array(memory, dtype=float),
+            "disk": np.array(disk, dtype=float),
+            "network": np.array(network, dtype=float),
+            "host": list(hosts),
+        },
+    }
+
+def encode_columns(rows, media_type):
+    return encode(columns(rows), media_type)
+
+def best_of(fn, *args, **kwargs):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, result
+
+def main():
+    encoders = {"columnar json": COLUMNAR}
+    if encoding.msgpack is not None:
+        encoders["msgpack"] = MSGPACK
+    if encoding.pa is not None:
+        encoders["arrow"] = ARROW
+
+    print(f"{'rows':>7} {'format':<14} {'ms':>8} {'bytes':>11} {'gzip':>10} {'gzip ms':>8} {'br':>10}")
+    for size in SIZES:
+        dated, epoch = cursor_rows(size)
+        results = {"rows json": best_of(rows_json, dated)}
+        for name, media_type in encoders.items():
+            results[name] = best_of(encode_columns, epoch, media_type)
+
+        for name, (ms, body) in results.items():
+            gzip_ms, packed = best_of(gzip.compress, body, compresslevel=5)
+            br = len(encoding.brotli.compress(body, quality=4)) if encoding.brotli is not None else "-"
+            print(f"{size:>7} {name:<14} {ms:>8.1f} {len(body):>11,} {len(packed):>10,} {gzip_ms:>8.1f} {br:>10}")
+
+if __name__ == "__main__":
+    main()
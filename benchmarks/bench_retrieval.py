@@ -0,0 +1,82 @@
+"""
+Runbook retrieval latency: the embedded LocalVectorIndex (build, reopen from the memory-mapped cache,
+query p50/p99 at several index sizes) and, when a Chroma server answers at CHROMA_HOST, the same
+queries over HTTP. Runs offline otherwise:
+
+    python -m benchmarks.bench_retrieval
+"""
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from src.rag_agent import RUNBOOK
+from src.vector_index import LocalVectorIndex
+
+QUESTIONS = [
+    ("my pod keeps restarting with CrashLoopBackOff", 0),
+    ("ErrImageNeverPull after deploying to k3d", 1),
+    ("users get 502 bad gateway", 2),
+    ("what counts as high network traffic for the autoscaler", 3),
+]
+SIZES = (4, 100, 1_000, 10_000)
+REPEAT = 200
+
+def filler(n, seed=5):
+    """Unrelated operational notes that pad the index to `n` documents"""
+    rng = np.random.default_rng(seed)
+    words = ["restart", "service", "cache", "redis", "queue", "latency", "backup", "cron", "certificate", "dns",
+             "ssl", "volume", "quota", "nginx", "config", "reload", "deploy", "rollback", "log", "rotate", "memory",
+             "leak", "swap", "kernel", "upgrade"]
+    return [" ".join(rng.choice(words, 12)) for _ in range(n)]
+
+def percentile_ms(timings, q):
+    return float(np.percentile(timings, q)) * 1000
+
+def time_queries(collection):
+    timings = []
+    hits = 0
+    for _ in range(REPEAT // len(QUESTIONS)):
+        for question, expected in QUESTIONS:
+            started = time.perf_counter()
+            result = collection.query(query_texts=[question], n_results=2)
+            timings.append(time.perf_counter() - started)
+            hits += result["ids"][0][:1] == [f"runbook_rule_{expected}"]
+    return timings, hits / len(timings)
+
+def main():
+    ids = [f"runbook_rule_{i}" for i in range(len(RUNBOOK))]
+    print(f"{'index':<22} {'build ms':>9} {'reopen ms':>10} {'p50 ms':>8} {'p99 ms':>8} {'top-1':>6}")
+    for size in SIZES:
+        documents = RUNBOOK + filler(size - len(RUNBOOK))
+        doc_ids = ids + [f"note_{i}" for i in range(size - len(RUNBOOK))]
+        with tempfile.TemporaryDirectory() as path:
+            started = time.perf_counter()
+            LocalVectorIndex(path).upsert(documents=documents, ids=doc_ids)
+            build = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            index = LocalVectorIndex(path)
+            index.upsert(documents=documents, ids=doc_ids)    # Startup seeding: hashes only
+            reopen = (time.perf_counter() - started) * 1000
+
+            timings, top1 = time_queries(index)
+        print(f"{f'local, {size} docs':<22} {build:>9.1f} {reopen:>10.1f} {percentile_ms(timings, 50):>8.3f} "
+              f"{percentile_ms(timings, 99):>8.3f} {top1:>6.0%}")
+
+    try:
+        import chromadb
+        client = chromadb.HttpClient(host=os.getenv("CHROMA_HOST", "localhost"), port=8000)
+        collection = client.get_or_create_collection(name="devops_runbook")
+        collection.upsert(documents=RUNBOOK, ids=ids)
+    except Exception as e:     # noqa: BLE001 Chroma is optional for this benchmark
+        print(f"Chroma skipped: {e}")
+        return
+    timings, top1 = time_queries(collection)
+    print(f"{'chroma (HTTP), runbook':<22} {'':>9} {'':>10} {statistics.median(timings) * 1000:>8.3f} "
+          f"{percentile_ms(timings, 99):>8.3f} {top1:>6.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Load test: /metrics latency while /predict and /chat are saturated.
+
+Runs the real app and the real Predictor (fits in its process pool, cached inference) under uvicorn.
+The database is replaced by an in-memory series that gains a sample every second (reads cost 5 ms)
+and the LLM by a 3 s call. Measures /metrics alone, then again while many concurrent /predict
+and /chat requests keep their executors full:
+
+    python -m benchmarks.load_api
+"""
+import asyncio
+import math
+import multiprocessing
+import socket
+import statistics
+import time
+from datetime import UTC, datetime, timedelta
+
+import httpx
+import uvicorn
+
+METRICS_REQUESTS = 300
+PREDICT_CLIENTS = 20
+PREDICT_RATE = 100      # req/s across all /predict clients, ~200 open dashboards. 0 = as fast as possible
+CHAT_CLIENTS = 20
+
+class FakeSeries:
+    """Newest-first rows at 1s spacing that keep growing in real time"""
+    def __init__(self, history=900):
+        self.start = datetime.now(UTC) - timedelta(seconds=history)
+
+    def rows(self):
+        return int((datetime.now(UTC) - self.start).total_seconds())
+
+    def get_recent_metrics(self, limit=10, host=None):
+        time.sleep(0.005)
+        newest = self.rows()
+        return [
+            {"timestamp": (self.start + timedelta(seconds=i)).isoformat(), "cpu": 30 + 20 * math.sin(i / 60),
+             "memory": 50 + i % 5, "network": 1 + math.cos(i / 30), "host": "local"}
+            for i in range(newest - 1, max(-1, newest - 1 - limit), -1)
+        ]
+
+    def get_fleet_metrics(self, limit=10, step=None):
+        return self.get_recent_metrics(limit)     # A single host is its own fleet
+
+    def get_latest_timestamp(self, host=None):
+        return self.start + timedelta(seconds=self.rows() - 1)
+
+def fake_ask(question):
+    time.sleep(3)
+    return "ok"
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+async def measure_metrics(client):
+    latencies = []
+    for _ in range(METRICS_REQUESTS):
+        started = time.perf_counter()
+        response = await client.get("/metrics?limit=10")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.005)
+    return latencies
+
+async def hammer(client, stop, counts, method, path, rate=0, **kwargs):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            await client.request(method, path, **kwargs)
+            counts[path] = counts.get(path, 0) + 1
+        except httpx.HTTPError:
+            pass
+        if rate:
+            await asyncio.sleep(max(0, 1 / rate - (time.perf_counter() - started)))
+
+def report(name, latencies):
+    print(f"  {name:<12} p50 {statistics.median(latencies):6.1f} ms   p99 {percentile(latencies, 99):6.1f} ms   max {max(latencies):6.1f} ms")
+
+async def run(base_url):
+    limits = httpx.Limits(max_connections=200)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        idle = await measure_metrics(client)
+
+        stop = asyncio.Event()
+        counts = {}
+        load = [asyncio.create_task(hammer(client, stop, counts, "GET", "/predict", rate=PREDICT_RATE / PREDICT_CLIENTS)) for _ in range(PREDICT_CLIENTS)]
+        load += [asyncio.create_task(hammer(client, stop, counts, "POST", "/chat", json={"question": "status?"})) for _ in range(CHAT_CLIENTS)]
+        await asyncio.sleep(1)      # Let both executors fill up
+        started = time.perf_counter()
+        busy = await measure_metrics(client)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*load)
+
+    print(f"/metrics latency, {METRICS_REQUESTS} requests each:")
+    report("idle", idle)
+    report("saturated", busy)
+    rates = ", ".join(f"{path} {count / elapsed:.0f} req/s" for path, count in counts.items())
+    print(f"  ({PREDICT_CLIENTS} clients looping /predict, {CHAT_CLIENTS} looping /chat: {rates})")
+
+def serve(port):
+    """Server process: real app, fake data source and LLM"""
+    from src import api
+
+    series = FakeSeries()
+    api.db.get_recent_metrics = series.get_recent_metrics
+    api.db.get_fleet_metrics = series.get_fleet_metrics
+    api.predictor.db = series
+    api.rag_agent.ask = fake_ask
+    api.predictor.check_interval = 1
+    api.predictor.train()
+    api.predictor.start()
+
+    uvicorn.run(api.app, port=port, log_level="warning", lifespan="off")
+
+def wait_until_up(base_url, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+def main():
+    # Separate process, so the load generator doesn't compete with the server for the GIL
+    port = free_port()
+    # Not daemonic: the server starts its own fit process pool
+    server = multiprocessing.get_context("spawn").Process(target=serve, args=(port,))
+    server.start()
+    try:
+        wait_until_up(f"http://127.0.0.1:{port}")
+        asyncio.run(run(f"http://127.0.0.1:{port}"))
+    finally:
+        server.terminate()
+        server.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Autoscaler replay: runs a network trace through several ScalingPolicy settings and reports scale
+actions, flaps (direction changes), false scale ups on one-sample spikes and reaction latency to
+real load steps. The default trace is synthetic (1s samples, 1 hour). Record a real one with:
+
+    python -m benchmarks.replay_autoscaler                 # synthetic trace
+    python -m benchmarks.replay_autoscaler --db 6          # last 6 hours from POSTGRES_* (network column)
+"""
+import argparse
+from datetime import datetime, timedelta
+from itertools import pairwise
+
+import numpy as np
+
+from src.autoscaler import ScalingPolicy, replay
+
+# (start, seconds, level MB/s) sustained load steps in the synthetic trace
+BURSTS = [(900, 300, 4.0), (2400, 600, 7.0)]
+QUIET = [(1500, 600), (3000, 600)]      # (start, seconds) near-idle stretches
+
+def synthetic_trace(seconds=3600, spikes=20, seed=11):
+    rng = np.random.default_rng(seed)
+    values = np.clip(0.5 + rng.normal(0, 0.1, seconds), 0, None)
+    for start, length in QUIET:
+        values[start:start + length] = np.clip(0.05 + rng.normal(0, 0.01, length), 0, None)
+    for start, length, level in BURSTS:
+        values[start:start + length] = level + rng.normal(0, 0.3, length)
+    # One-sample spikes outside the bursts, a single sample shouldn't move the fleet
+    busy = np.zeros(seconds, dtype=bool)
+    for start, length, _ in BURSTS:
+        busy[max(0, start - 60):start + length + 60] = True
+    for index in rng.choice(np.flatnonzero(~busy), spikes, replace=False):
+        values[index] = rng.uniform(3, 6)
+    return [(float(t), float(v)) for t, v in enumerate(values)], busy
+
+def db_trace(hours):
+    from src.database import DatabaseManager
+    db = DatabaseManager()
+    end = datetime.now()
+    after, trace = None, []
+    while True:
+        rows, after = db.get_raw_metrics(end - timedelta(hours=hours), end, limit=10000, after=after)
+        trace += [(datetime.fromisoformat(row["timestamp"]).timestamp(), row["network"]) for row in rows]
+        if after is None:
+            return trace
+
+def lookahead(trace, seconds=60):
+    """A perfect forecast, the value `seconds` ahead: the upper bound for predictive scaling"""
+    values = [value for _, value in trace]
+    return [values[min(i + seconds, len(values) - 1)] for i in range(len(values))]
+
+def legacy_replay(trace, high=2.0, low=0.1, replicas=1):
+    """What decide() used to do: newest sample against the thresholds, no window, dwell time or cooldown"""
+    actions = []
+    for timestamp, value in trace:
+        if value > high:
+            replicas += 1
+            actions.append((timestamp, "up", 1, replicas))
+        elif value < low and replicas > 1:
+            replicas -= 1
+            actions.append((timestamp, "down", 1, replicas))
+    return actions
+
+POLICIES = {
+    "mean 30s": lambda: ScalingPolicy(),
+    "p90 30s": lambda: ScalingPolicy(percentile=90),
+    "mean 30s+forecast": lambda: ScalingPolicy(),
+}
+
+def report(name, actions, busy=None):
+    ups = [a for a in actions if a[1] == "up"]
+    flaps = sum(1 for a, b in pairwise(actions) if a[1] != b[1])
+    line = f"{name:<20} {len(actions):>7} {len(ups):>4} {len(actions) - len(ups):>5} {flaps:>6} {max([a[3] for a in actions], default=1):>5}"
+    if busy is not None:
+        false_ups = sum(1 for a in ups if not busy[int(a[0])])
+        latencies = []
+        for start, length, _ in BURSTS:
+            # Negative: scaled ahead of the load (forecast)
+            first = next((a[0] for a in ups if start - 60 <= a[0] < start + length), None)
+            latencies.append(f"{first - start:.0f}s" if first is not None else "missed")
+        line += f" {false_ups:>9}  {', '.join(latencies)}"
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", type=float, metavar="HOURS", help="replay the last HOURS of recorded metrics")
+    args = parser.parse_args()
+
+    if args.db:
+        trace, busy = db_trace(args.db), None
+    else:
+        trace, busy = synthetic_trace()
+    print(f"{len(trace)} samples")
+
+    header = f"{'policy':<20} {'actions':>7} {'ups':>4} {'downs':>5} {'flaps':>6} {'max':>5}"
+    print(header + (f" {'false ups':>9}  reaction per burst" if busy is not None else ""))
+    report("latest sample", legacy_replay(trace), busy)
+    for name, make in POLICIES.items():
+        forecasts = lookahead(trace) if "forecast" in name else None
+        report(name, replay(trace, make(), forecasts=forecasts), busy)
+
+if __name__ == "__main__":
+    main()
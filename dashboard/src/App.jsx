@@ -17,62 +17,23 @@ function App() {
   const [systemStatus, setSystemStatus] = useState("offline") 
   
   const lastTimestampRef = useRef(null)     
-  const stuckCounterRef = useRef(0)         
+  const lastSampleAtRef = useRef(0)         
 
-  const fetchData = async () => {
-    try {
-      const [historyRes, predictRes, systemRes, modeRes] = await Promise.all([
-        axios.get(`${API_URL}/metrics?limit=30`),
-        axios.get(`${API_URL}/predict`),
-        axios.get(`${API_URL}/system`), 
-        axios.get(`${API_URL}/config/mode`)
-      ])
-
-      // Set the system info state
-      setSysInfo(systemRes.data)
-      setMode(modeRes.data.mode)
-
-      const latestItem = historyRes.data.data[0] 
-      
-      if (latestItem) {
-        const currentTimestamp = latestItem.timestamp
-        
-        if (currentTimestamp === lastTimestampRef.current) {
-          // Data hasn't changed since last fetch
-          stuckCounterRef.current += 1
-        } else {
-          // Data changed system is alive.
-          stuckCounterRef.current = 0
-          lastTimestampRef.current = currentTimestamp
-        }
-
-        // Data hasn't changed for 10+ seconds.
-        if (stuckCounterRef.current > 5) {
-           setSystemStatus("warning")
-        } else {
-           setSystemStatus("online")
-        }
-      }
+  // Newest-first rows from the API -> chart points, oldest first
+  const formatMetrics = (items) => items.map(item => ({
+    ...item,
+    time: new Date(item.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit', second: '2-digit' }),
+    cpu: item.cpu,
+    memory: item.memory,
+    disk: item.disk
+  })).reverse()
 
-      // Format data for chart
-      const formattedData = historyRes.data.data.map(item => ({
-        ...item,
-        time: new Date(item.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit', second: '2-digit' }),
-        cpu: item.cpu,
-        memory: item.memory,
-        disk: item.disk
-      })).reverse()
-
-      setMetrics(formattedData)
-      setPrediction(predictRes.data)
-      setError(null) 
-      setLoading(false)
-
-    } catch (err) {
-      console.error("Fetch error:", err)
-      setSystemStatus("offline")
-      setError(err.message || "Unknown Connection Error")
-      setLoading(false)
+  const markSample = (items) => {
+    if (items.length && items[0].timestamp !== lastTimestampRef.current) {
+      // Data changed system is alive.
+      lastTimestampRef.current = items[0].timestamp
+      lastSampleAtRef.current = Date.now()
+      setSystemStatus("online")
     }
   }
 
@@ -88,9 +49,50 @@ function App() {
   }
 
   useEffect(() => {
-    fetchData()
-    const interval = setInterval(fetchData, 2000)
-    return () => clearInterval(interval)
+    // Host info is static, fetched once
+    axios.get(`${API_URL}/system`)
+      .then(res => setSysInfo(res.data))
+      .catch(err => console.error("System info error:", err))
+
+    // One push stream replaces polling /metrics, /predict and /config/mode every 2 seconds
+    const source = new EventSource(`${API_URL}/stream`)
+
+    source.addEventListener("snapshot", (event) => {
+      const snapshot = JSON.parse(event.data)
+      setMetrics(formatMetrics(snapshot.metrics))
+      lastTimestampRef.current = null   // (Re)connected, count the snapshot as fresh
+      markSample(snapshot.metrics)
+      if (snapshot.prediction) setPrediction(snapshot.prediction)
+      if (snapshot.mode) setMode(snapshot.mode)
+      setError(null)
+      setLoading(false)
+    })
+    source.addEventListener("metrics", (event) => {
+      const items = JSON.parse(event.data)
+      markSample(items)
+      setMetrics(previous => [...previous, ...formatMetrics(items)].slice(-30))
+    })
+    source.addEventListener("prediction", (event) => setPrediction(JSON.parse(event.data)))
+    source.addEventListener("mode", (event) => setMode(JSON.parse(event.data).mode))
+
+    source.onerror = () => {
+      // EventSource reconnects by itself, a fresh snapshot follows
+      console.error("Stream error")
+      setSystemStatus("offline")
+      setError("Live stream disconnected, reconnecting...")
+      setLoading(false)
+    }
+
+    // Data hasn't changed for 10+ seconds.
+    const watchdog = setInterval(() => {
+      if (source.readyState !== EventSource.OPEN || !lastSampleAtRef.current) return
+      setSystemStatus(Date.now() - lastSampleAtRef.current > 10000 ? "warning" : "online")
+    }, 2000)
+
+    return () => {
+      clearInterval(watchdog)
+      source.close()
+    }
   }, [])
 
   const getStatusColor = () => {
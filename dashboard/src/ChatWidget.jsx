@@ -1,6 +1,5 @@
 import { useState, useRef, useEffect } from 'react'
 import ReactMarkdown from 'react-markdown'
-import axios from 'axios'
 import { Send, Bot, User, Loader2, Terminal } from 'lucide-react'
 
 export default function ChatWidget() {
@@ -25,8 +24,39 @@ export default function ChatWidget() {
 
     try {
       const API_URL = import.meta.env.VITE_API_URL || "/api"
-      const res = await axios.post(`${API_URL}/chat`, { question: userMessage })
-      setMessages(prev => [...prev, { role: 'bot', text: res.data.answer }])
+      const res = await fetch(`${API_URL}/chat/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ question: userMessage })
+      })
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`)
+
+      // Server-Sent Events over the POST response, the answer grows as tokens arrive
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ""
+      let started = false
+      const append = (text) => {
+        const first = !started
+        started = true
+        setMessages(prev => first
+          ? [...prev, { role: 'bot', text }]
+          : [...prev.slice(0, -1), { role: 'bot', text: prev[prev.length - 1].text + text }])
+        setIsLoading(false)
+      }
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split("\n\n")
+        buffer = events.pop()
+        for (const block of events) {
+          const event = block.match(/^event: (.*)$/m)?.[1]
+          const data = block.match(/^data: (.*)$/m)?.[1]
+          if (event === "token") append(JSON.parse(data).text)
+          if (event === "error") append(`AI Generation Error: ${JSON.parse(data).error}`)
+        }
+      }
     } catch (error) {
       setMessages(prev => [...prev, { role: 'bot', text: "Error: Gemini AI Connection Failed." }])
     } finally {
@@ -1,16 +1,47 @@
 import docker
 import os
+import socket
 import subprocess
+import threading
+import time
+from contextlib import contextmanager
 from kubernetes import client, config
+from src.database import DatabaseManager
+from src.docker_scaler import DockerScaler
+from src.replica_watch import DockerReplicaWatcher, K8sReplicaWatcher
+
+DESIRED_KEY = "desired_replicas"   # system_config key, shared by every process that scales
+SCALE_LEASE = "scaler"
 
 class Actuator:
-    def __init__(self):
+    """
+    Moves the nginx service towards a desired replica count. Every scaler (autoscaler, RAG agent,
+    any API replica) records intent as the shared desired target and only acts while it holds both
+    the local lock and the DB lease, so concurrent requests don't stack on a stale count.
+    A reconcile loop keeps re-applying the target until the orchestrator matches it
+    """
+    def __init__(self, db=None):
         # Where app lives. Options: "docker", "kubernetes" or "safe_mode"
         self.mode = os.getenv("ORCHESTRATOR", "safe_mode").lower()
+        self.db = db if db is not None else DatabaseManager()
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+        self.min_replicas = int(os.getenv("SCALE_MIN_REPLICAS", "1"))
+        self.max_replicas = int(os.getenv("SCALE_MAX_REPLICAS", "10"))
+        self.lease_ttl = float(os.getenv("SCALE_LEASE_TTL", "60"))      # Longer than the slowest scale action
+        self.reconcile_interval = float(os.getenv("SCALE_RECONCILE_INTERVAL", "15"))
+        self.lease_wait = 5.0   # Seconds a scale request waits for another scaler to finish
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
 
         self.docker_service_name = "nginx"
+        self.compose_project = os.getenv("COMPOSE_PROJECT", "system_monitoring_app")
         self.k8s_deployment_name = "client-deployment"
         self.k8_namespace = "default"
+        self.replicas = None    # ReplicaWatcher, keeps the count current from orchestrator events
+        self.docker_scaler = None
+        self.last_scale = None  # Report of the last scale command, incl. latency
+        self.last_scale_at = 0.0
 
         if self.mode == "docker":
             self._init_docker()
@@ -19,6 +50,16 @@ class Actuator:
         else:
             print(f"Unknown orchestrator: {self.mode}. Running in SAFE MODE (No scaling).")
             self.mode = "safe_mode"
+
+        if self.mode == "docker":
+            self.replicas = DockerReplicaWatcher(self.client, self.docker_service_name, self.compose_project).start()
+            if os.getenv("DOCKER_SCALE_BACKEND", "sdk").lower() == "sdk":
+                self.docker_scaler = DockerScaler(
+                    self.client, self.docker_service_name, self.compose_project,
+                    ready_timeout=float(os.getenv("DOCKER_READY_TIMEOUT", "30")),
+                )
+        elif self.mode == "kubernetes":
+            self.replicas = K8sReplicaWatcher(self.k8s_apps_api, self.k8s_deployment_name, self.k8_namespace).start()
     
     def _init_docker(self):
         self.client = None
@@ -49,6 +90,7 @@ class Actuator:
         except Exception:
             try:
                 config.load_kube_config()
+                self.k8s_apps_api = client.AppsV1Api()
                 print("Loaded local Kubernetes config.")
             except Exception as e:
                 print(f"Could not load Kubernetes config: {e}")
@@ -56,34 +98,32 @@ class Actuator:
     
     def get_container_count(self):
         """
-        Counts how many nginx_server containers are running
-        Returns a dummy value if in k8s mode
+        How many nginx replicas are running. Served from the watcher's cached count (kept current by
+        Docker events / a Kubernetes watch), a label-filtered query only while the stream is down
         """
-        if self.mode == "docker" and self.client:
-            return sum(
-                1 for container in self.client.containers.list() 
-                if container.name and self.docker_service_name in container.name
-            )
-        elif self.mode == "kubernetes":
-            try:
-                # Read client-deployment file and tell me the replicas count
-                deployment = self.k8s_apps_api.read_namespaced_deployment(self.k8s_deployment_name, self.k8_namespace)
-                return deployment.status.replicas 
-            except Exception as e:
-                print(f"K8s read error: {e}")
-                return 0
-        return 0
+        if self.replicas is None:
+            return 0
+        try:
+            return self.replicas.count()
+        except Exception as e:     # noqa: BLE001 Docker and Kubernetes clients raise their own errors
+            print(f"Replica count failed: {e}")
+            return 0
 
     def execute_scale(self, target_count):
+        """
+        Sends the scale command. Docker goes through the SDK (parallel starts, readiness wait) and falls back
+        to docker-compose when that fails or DOCKER_SCALE_BACKEND=compose. Returns a report with latencies
+        """
+        started = time.perf_counter()
+        report = None
         if self.mode == "docker":
-            cmd = ["docker-compose", "-p", "system_monitoring_app", "up", "-d", "--no-recreate", "--scale", 
-                   f"{self.docker_service_name}={target_count}", self.docker_service_name]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.stdout:
-                print(f"Docker Output: {result.stdout}", flush=True)
-            if result.stderr:
-                print(f"Docker Error/Warning: {result.stderr}", flush=True)
+            if self.docker_scaler is not None:
+                try:
+                    report = self.docker_scaler.scale(target_count)
+                except Exception as e:     # noqa: BLE001 Any failure of the Docker API falls back to compose
+                    print(f"Native Docker scaling failed, falling back to docker-compose: {e}", flush=True)
+            if report is None:
+                report = self._compose_scale(target_count)
         elif self.mode == "kubernetes":
             try:
                 body = {"spec": {"replicas": target_count}}
@@ -93,31 +133,149 @@ class Actuator:
                     body=body
                 )
                 print(f"Kubernetes Scaling Command Sent. Target: {target_count}", flush=True)
+                report = {"backend": "kubernetes", "to": target_count}
             except Exception as e:
                 print(f"K8s scaling failed: {e}", flush=True)
-                return 0
-        return 0
-    
-    def scale_up(self):
+        if report is None:
+            return None
+
+        report.setdefault("ms", round((time.perf_counter() - started) * 1000, 1))
+        self.last_scale = report
+        self.last_scale_at = time.monotonic()
+        print(f"Scale to {target_count} via {report['backend']} took {report['ms']} ms", flush=True)
+        return report
+
+    def _compose_scale(self, target_count):
+        cmd = ["docker-compose", "-p", self.compose_project, "up", "-d", "--no-recreate", "--scale",
+               f"{self.docker_service_name}={target_count}", self.docker_service_name]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+
+        if result.stdout:
+            print(f"Docker Output: {result.stdout}", flush=True)
+        if result.stderr:
+            print(f"Docker Error/Warning: {result.stderr}", flush=True)
+        return {"backend": "docker-compose", "to": target_count, "returncode": result.returncode}
+
+    def clamp(self, replicas):
+        return max(self.min_replicas, min(self.max_replicas, replicas))
+
+    def get_desired(self):
+        value = self.db.get_config(DESIRED_KEY)
+        try:
+            return int(value) if value is not None else None
+        except ValueError:
+            return None
+
+    @contextmanager
+    def leadership(self, wait=None):
         """
-        Starts a new container
+        Local lock + DB lease. Yields True when this process may scale, False if another scaler
+        kept the lease for `wait` seconds
         """
-        current = self.get_container_count()
-        new_count = current + 1
-        self.execute_scale(new_count)
-        print(f"Scaling UP to {new_count}")
+        wait = self.lease_wait if wait is None else wait
+        if not self.lock.acquire(timeout=wait):
+            yield False
+            return
+        try:
+            deadline = time.monotonic() + wait
+            while not self.db.acquire_lease(SCALE_LEASE, self.holder, self.lease_ttl):
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                time.sleep(0.2)
+            try:
+                yield True
+            finally:
+                self.db.release_lease(SCALE_LEASE, self.holder)
+        finally:
+            self.lock.release()
 
-    def scale_down(self):
+    def scale_by(self, steps):
         """
-        Removes a container 
+        Moves the desired target `steps` replicas from what is running, within min/max. A scale up that is
+        still starting counts as done: repeating the same request while containers come up is a no-op
+        instead of adding more. Returns the new target, None if nothing could be done
         """
-        current = self.get_container_count()
-        if current > 1:
-            new_count = current - 1
-            self.execute_scale(new_count)
-            print(f"Scaling DOWN to {new_count}")
-        else:
-            print("Cannot scale DOWN below 1")\
+        if self.mode == "safe_mode":
+            print("SAFE MODE: scaling disabled")
+            return None
+        with self.leadership() as leader:
+            if not leader:
+                print("Another scaler holds the lease, skipping", flush=True)
+                return None
+            current = self.get_container_count()
+            desired = self.get_desired()
+            if steps > 0:
+                target = max(desired if desired is not None else 0, current + steps)
+            else:
+                target = min(desired if desired is not None else current, current + steps)
+            target = self.clamp(target)
+            if target != desired:
+                self.db.set_config(DESIRED_KEY, str(target))
+            # Same target sent moments ago: containers are still starting, the reconcile loop covers a failure
+            in_flight = (target == desired and self.last_scale is not None and self.last_scale.get("to") == target
+                         and time.monotonic() - self.last_scale_at < self.reconcile_interval)
+            if target != current and not in_flight:
+                self.execute_scale(target)
+            return target
+
+    def reconcile(self):
+        """
+        One pass of the reconcile loop: re-applies the desired target if the orchestrator drifted from it
+        (crashed container, failed or partial scale). Doesn't wait when another scaler is busy
+        """
+        if self.mode == "safe_mode":
+            return None
+        with self.leadership(wait=0) as leader:
+            if not leader:
+                return None
+            desired = self.get_desired()
+            if desired is None:
+                return None
+            desired = self.clamp(desired)
+            current = self.get_container_count()
+            if current != desired:
+                print(f"Reconciling replicas {current} -> {desired}", flush=True)
+                return self.execute_scale(desired)
+        return None
+
+    def run(self):
+        while not self.stopping.wait(self.reconcile_interval):
+            try:
+                self.reconcile()
+            except Exception as e:     # noqa: BLE001 One failed round must not stop the reconcile loop
+                print(f"Reconcile failed: {e}")
+
+    def start(self):
+        if self.mode != "safe_mode" and (self.thread is None or not self.thread.is_alive()):
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name="scale-reconciler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        if self.replicas:
+            self.replicas.stop()
+
+    def scale_up(self, steps=1):
+        """
+        Starts `steps` new containers, up to max_replicas
+        """
+        target = self.scale_by(steps)
+        if target is not None:
+            print(f"Scaling UP to {target}")
+        return target
+
+    def scale_down(self, steps=1):
+        """
+        Removes up to `steps` containers, never below min_replicas
+        """
+        target = self.scale_by(-steps)
+        if target is not None:
+            print(f"Scaling DOWN to {target}")
+        return target
 
 if __name__ == "__main__":
     # Test mode
@@ -1,15 +1,39 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel  # For POST request body
-from src.database import DatabaseManager
+from src import executors
+from src.database import CONFIG_CHANNEL, DatabaseManager, decode_cursor, encode_cursor, parse_labels
+from src.encoding import JSON, NotAcceptable, compress, encode, negotiate, to_columns
+from src.executors import run_in
+from src.host_facts import HostFacts
 from src.predictor import Predictor
 from src.rag_agent import RagAgent
-import platform
-import psutil
+from src.stream import MetricHub, sse
 import os
-import socket
 
-app = FastAPI()
+db = DatabaseManager()
+predictor = Predictor()
+rag_agent = RagAgent()
+host_facts = HostFacts.shared()
+config = rag_agent.config      # Process-wide system_config cache, invalidated by NOTIFY
+scale_jobs = rag_agent.scale_jobs      # One worker per process, shared by /chat and /scale
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+MAX_POINTS = 10_000     # Most points one range request may ask for
+STREAM_KEEPALIVE = 15   # Seconds between SSE comments, keeps proxies from closing idle streams
+
+@asynccontextmanager
+async def lifespan(app):
+    predictor.start()   # Background model training, /predict only runs inference
+    yield
+    await hub.stop()
+    scale_jobs.shutdown()
+    predictor.stop()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins = ["http://localhost:5173"],
@@ -18,27 +42,6 @@ app.add_middleware(
     allow_headers = ["*"],
 )
 
-db = DatabaseManager()
-predictor = Predictor()
-rag_agent = RagAgent()
-
-def get_primary_interface():
-    """Finds the active network interface and IP address"""
-    try:
-        # Dummy connection to figure out which interface connects to the internet
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.connect(("8.8.8.8", 80))
-        primary_ip = sock.getsockname()[0]
-        sock.close()
-
-        # Match the IP to the interface name
-        for iface_name, ifac_addrs in psutil.net_if_addrs().items():
-            for addr in ifac_addrs:
-                if addr.family == socket.AF_INET and addr.address == primary_ip:
-                    return f"{iface_name} - {primary_ip}"
-    except Exception as e:
-        print("Can't identify IP Address or Network Interface\n", e)
-
 # Data shape for the chat and config requests
 class ChatReqeust(BaseModel):
     question: str
@@ -46,6 +49,10 @@ class ChatReqeust(BaseModel):
 class ConfigReqeust(BaseModel):
     value: str
 
+class ScaleRequest(BaseModel):
+    direction: str      # "up" or "down"
+    steps: int = 1
+
 @app.get("/")
 def root():
     """
@@ -53,81 +60,292 @@ def root():
     """
     return {"message": "System Monitor API is Online !!!"}
 
+def utc_naive(value):
+    """Query datetimes are compared with the naive UTC timestamps in the DB"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+def media_type_for(request, format):
+    try:
+        return negotiate(request.headers.get("accept"), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+def encoded(request, payload, media_type):
+    """
+    Encodes and compresses a metric payload. Called on the DB executor together with the query,
+    so serializing a large page doesn't hold up the event loop
+    """
+    body, encoding = compress(encode(payload, media_type), request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
+
 @app.get("/metrics")
-def get_metrics(limit: int = 10):
+async def get_metrics(
+    request: Request, limit: int = 10, host: str | None = None,
+    start: datetime | None = None, end: datetime | None = None, step: int | None = None,
+    max_points: int = 500, agg: str = "bucket", field: str = "cpu", format: str | None = None,
+):
     """
-    Returns the latest system stats
+    Returns the latest system stats, for one host or the whole fleet.
+    With `start` (and optional `end`, default now) it returns the range downsampled on the server instead:
+    agg=bucket gives avg/min/max per `step` seconds (widened so at most `max_points` (<= MAX_POINTS) come back),
+    agg=lttb keeps the `max_points` samples that best preserve the shape of `field`.
+    Columnar formats (Accept header or ?format=columnar|msgpack|arrow) return one array per field
+    with epoch-ms timestamps instead of one object per row
     """
-    data = db.get_recent_metrics(limit=limit)
+    media_type = media_type_for(request, format)
+    if agg not in ("bucket", "lttb"):
+        raise HTTPException(status_code=400, detail="agg must be 'bucket' or 'lttb'")
+    if not 1 <= max_points <= MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"max_points must be between 1 and {MAX_POINTS}")
+    if start is not None:
+        start, end = utc_naive(start), utc_naive(end) or datetime.now(UTC).replace(tzinfo=None)
+        if end <= start:
+            raise HTTPException(status_code=400, detail="end must be after start")
+
+    def build():
+        if start is None and media_type != JSON:
+            columns = db.get_recent_columns(limit=limit, host=host)
+            return encoded(request, {"count": len(columns.get("timestamp", [])), "data": columns}, media_type)
+        if start is None:
+            series = {"data": db.get_recent_metrics(limit=limit, host=host)}
+        elif agg == "bucket":
+            series = db.get_series(start, end, step=step, max_points=max_points, host=host)
+        else:
+            series = db.get_lttb_series(start, end, max_points=max_points, field=field, host=host)
+
+        data = series.pop("data")
+        payload = {**series, "count": len(data), "data": data if media_type == JSON else to_columns(data)}
+        return encoded(request, payload, media_type)
+
+    try:
+        return await run_in(executors.DB, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/metrics/export")
+async def export_metrics(
+    request: Request, start: datetime, end: datetime | None = None, host: str | None = None,
+    limit: int = 1000, cursor: str | None = None, format: str | None = None,
+):
+    """
+    Raw rows between `start` and `end`, oldest first, one page at a time.
+    Pass the returned `next_cursor` to get the next page, it is null on the last one
+    """
+    media_type = media_type_for(request, format)
+    limit = max(1, min(limit, 10000))
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    start, end = utc_naive(start), utc_naive(end) or datetime.now(UTC).replace(tzinfo=None)
+
+    def build():
+        data, last = db.get_raw_metrics(start, end, limit=limit, after=after, host=host)
+        return encoded(request, {
+            "count": len(data),
+            "next_cursor": encode_cursor(*last) if last else None,
+            "data": data if media_type == JSON else to_columns(data),
+        }, media_type)
+
+    return await run_in(executors.DB, build)
+
+@app.get("/metrics/detail")
+async def get_detail_metrics(host: str | None = None, metric: str = "", minutes: int = 5):
+    """
+    Latest per-core / per-interface / per-disk / per-process values, filtered by metric name prefix
+    """
+    data = await run_in(executors.DB, db.get_detail_metrics, host=host, prefix=metric, minutes=minutes)
     return {"count": len(data), "data": data}
 
-@app.get("/predict")
-def get_prediction():
+@app.get("/hosts")
+async def get_hosts():
     """
-    Asks the AI to forecast the next CPU and Network load
+    Every agent that has reported, with its labels
+    """
+    hosts = await run_in(executors.DB, db.get_hosts)
+    return {"count": len(hosts), "hosts": hosts}
+
+@app.get("/fleet/summary")
+async def get_fleet_summary(minutes: int = 5, labels: str | None = None):
+    """
+    Per-host and fleet-wide load over the last few minutes. labels filter: 'env=prod,role=web'
+    """
+    return await run_in(executors.DB, db.get_fleet_summary, minutes=minutes, labels=parse_labels(labels) or None)
+
+def prediction_payload():
+    """
+    /predict response body, also pushed to live dashboards by the hub
     """
     predictions, status = predictor.predict_next_minute()
 
     if predictions is None:
         return {"status": status, "cpu": None, "network": None}
 
-    return {
+    response = {
         "status": status,
         "cpu": predictions['cpu'],
         "network": predictions['network']
     }
+    # Memory forecast, every horizon, model version and fit/predict timings
+    for key in ("memory", "horizon", "horizons", "model"):
+        if key in predictions:
+            response[key] = predictions[key]
+    return response
 
-@app.get("/system")
-def get_system_info():
+@app.get("/predict")
+async def get_prediction():
     """
-    Returns static info about host machine
+    Asks the AI to forecast the next CPU and Network load
     """
-    system_os = platform.system()
-    disk_path = '/'
+    return await run_in(executors.MODEL, prediction_payload)
 
-    if system_os == 'Windows':
-        disk_path = 'C:\\'
-    elif system_os == 'Darwin':
-        if os.path.exists('/System/Volumes/Data'):
-            disk_path = '/System/Volumes/Data'
+def hub_listen(channels, callback):
+    """db.listen for the hub, a mode change drops the cached mode before the hub wakes up to read it"""
+    def forward(channel, payload):
+        if channel == CONFIG_CHANNEL:
+            config.on_notify(channel, payload)
+        callback(channel, payload)
+    return db.listen(channels, forward)
 
-    try:
-        disk_info = psutil.disk_usage(disk_path)
-    except Exception:
-        print(f"Disk check failed for {disk_path}, falling back to current directory")
-        disk_info = psutil.disk_usage('.')
-
-    return{
-        "hostname": platform.node(),
-        "os": f"{platform.system()} {platform.release()}",
-        "cpu_arch": platform.machine(),
-        "cpu_cores": psutil.cpu_count(logical=True),
-        "ram_total": round(psutil.virtual_memory().total / (1024 ** 3), 2), # Bytes to GB
-        "disk_total": round(disk_info.total / (1024 ** 3), 2),
-        "disk_used": round(disk_info.used / (1024 ** 3), 2),
-        "net_interface": get_primary_interface(),
-        "python_version": platform.python_version()
-    }
+hub = MetricHub(
+    fetch = lambda limit: db.get_fleet_metrics(limit=limit),     # The chart draws one line, not one per agent
+    predict = prediction_payload,
+    mode = lambda: config.get("scaling_mode") or "auto",
+    listen = hub_listen,
+    poll_interval = float(os.getenv("STREAM_POLL_INTERVAL", "2")),
+)
+
+@app.get("/stream")
+async def stream(request: Request):
+    """
+    Live dashboard feed (Server-Sent Events): a snapshot first, then new samples,
+    prediction and mode changes as they happen. Fed once per sample for all subscribers
+    """
+    queue, snapshot = await hub.subscribe()
+
+    async def events():
+        try:
+            yield sse("snapshot", snapshot)
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse(event, data)
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",     # nginx: don't buffer the stream
+    })
+
+@app.get("/system")
+def get_system_info():
+    """
+    Returns static info about host machine, cached (see HostFacts)
+    """
+    return host_facts.system_info()
 
 @app.post("/chat")
-def chat_ai(request: ChatReqeust):
+async def chat_ai(request: ChatReqeust):
     """
-    Sends user question + DB context to Gemini
+    Sends user question + DB context to Gemini, on its own threads and with a time limit
     """
-    answer = rag_agent.ask(request.question)
+    try:
+        answer = await run_in(executors.LLM, rag_agent.ask, request.question, timeout=LLM_TIMEOUT)
+    except TimeoutError:
+        answer = f"AI Generation Error: no answer within {LLM_TIMEOUT:.0f}s, try again"
     return {"answer": answer}
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatReqeust):
+    """
+    /chat as Server-Sent Events: 'token' events with the answer as the model writes it, then 'done'.
+    Each piece is awaited on the LLM threads, a gap over LLM_TIMEOUT ends the stream with an 'error' event
+    """
+    pieces = rag_agent.ask_stream(request.question)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    piece = await run_in(executors.LLM, next, pieces, None, timeout=LLM_TIMEOUT)
+                except TimeoutError:
+                    yield sse("error", {"error": f"no answer within {LLM_TIMEOUT:.0f}s, try again"})
+                    return
+                if piece is None:
+                    break
+                yield sse("token", {"text": piece})
+            yield sse("done", {})
+        finally:
+            try:
+                pieces.close()
+            except ValueError:
+                pass    # Still running on an LLM thread after a timeout, it finishes there
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
 @app.get("/config/mode")
-def get_mode():
+async def get_mode():
     """Get current scaling mode auto/manual"""
-    mode = db.get_config("scaling_mode")
+    mode = await run_in(executors.DB, config.get, "scaling_mode")
     return {"mode": mode or "auto"}
 
 @app.post("/config/mode")
-def set_mode(req: ConfigReqeust):
+async def set_mode(req: ConfigReqeust):
     """Set scaling mode"""
     if req.value not in ["auto", "manual"]:
         return {"error": "Invalid mode, Use 'auto' or 'manual'"}
     
-    db.set_config("scaling_mode", req.value)
-    return {"status": "updated", "mode": req.value}
\ No newline at end of file
+    await run_in(executors.DB, config.set, "scaling_mode", req.value)
+    hub.poke(CONFIG_CHANNEL)    # Same process: don't wait for the NOTIFY round trip
+    return {"status": "updated", "mode": req.value}
+
+@app.post("/scale", status_code=202)
+async def submit_scale(req: ScaleRequest):
+    """
+    Queues a scale action and returns the job right away, poll /scale/jobs/{id} for progress.
+    Like the chat command, only allowed in manual mode so it doesn't fight the autoscaler
+    """
+    if req.direction not in ("up", "down") or req.steps < 1:
+        raise HTTPException(status_code=400, detail="direction must be 'up' or 'down', steps at least 1")
+    mode = await run_in(executors.DB, config.get, "scaling_mode")
+    if (mode or "auto") != "manual":
+        raise HTTPException(status_code=409, detail="Scaling is automatic, switch to manual mode first")
+    return await run_in(executors.DB, scale_jobs.submit, req.direction, req.steps, "api")
+
+@app.get("/scale/jobs/{job_id}")
+async def get_scale_job(job_id: str):
+    """Status and timings of one scale job (queued, running, succeeded, skipped or failed)"""
+    job = await run_in(executors.DB, scale_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown scale job")
+    return job
+
+@app.get("/scale/history")
+async def get_scale_history(limit: int = 50):
+    """Recent scale actions from every scaler, newest first, with queue / run / end-to-end ms"""
+    jobs = await run_in(executors.DB, db.get_scale_history, min(limit, 500))
+    return {"count": len(jobs), "data": jobs}
+
+@app.get("/stats/db")
+async def get_db_stats():
+    """Connection pool usage for this API process"""
+    return db.pool_stats()
+
+@app.get("/stats")
+async def get_stats():
+    """Live stream, config cache, runbook retrieval and chat counters for this API process"""
+    return {"stream": hub.stats(), "config": config.stats(), **rag_agent.stats()}
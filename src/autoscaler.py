@@ -1,57 +1,247 @@
-import time
-from src.database import DatabaseManager
+import math
+import os
+import threading
+from collections import deque
+from datetime import datetime
+import numpy as np
+from src.database import CONFIG_CHANNEL, METRICS_CHANNEL, DatabaseManager
 from src.actuator import Actuator
+from src.config_cache import ConfigCache
+from src.scale_jobs import ScaleJobs
+
+class ScalingPolicy:
+    """
+    Decision engine, no I/O so recorded traces can be replayed through it.
+    - Signal: mean (or percentile) of the samples in the last `window` seconds, optionally
+      raised to the forecast so predicted load can scale up ahead of time
+    - Steps: proportional to load, one replica per `high` MB/s (4 MB/s -> 2 replicas, 7 -> 4),
+      at most `max_step` at once. Scale down is one replica at a time
+    - Hysteresis: scale down only once the remaining replicas would run below `down_fraction` of
+      `high` (or the load is under `low`), and the signal has to stay past a threshold for
+      `up_for` / `down_for` seconds before anything happens
+    - Cooldown: no scale up within `cooldown_up` s of the last action, no scale down within `cooldown_down` s
+    Time is the sample timestamp (epoch seconds), not the wall clock
+    """
+    def __init__(self, high=2.0, low=0.1, window=30, percentile=None, up_for=10, down_for=60,
+                 cooldown_up=30, cooldown_down=120, max_step=3, down_fraction=0.5):
+        self.high = high
+        self.low = low
+        self.window = window
+        self.percentile = percentile
+        self.up_for = up_for
+        self.down_for = down_for
+        self.cooldown_up = cooldown_up
+        self.cooldown_down = cooldown_down
+        self.max_step = max_step
+        self.down_fraction = down_fraction
+
+        self.samples = deque()      # (timestamp, value), oldest first
+        self.above_since = None
+        self.below_since = None
+        self.last_action = None     # Time of the last scale action
+
+    def observe(self, timestamp, value):
+        if value is None:
+            return
+        self.samples.append((timestamp, value))
+        while self.samples and timestamp - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def signal(self):
+        if not self.samples:
+            return None
+        values = np.fromiter((value for _, value in self.samples), dtype=float, count=len(self.samples))
+        if self.percentile is not None:
+            return float(np.percentile(values, self.percentile))
+        return float(values.mean())
+
+    def decide(self, now, replicas=1, forecast=None):
+        """
+        Returns ("up" | "down", steps) or None. Call after observe(), `now` is the newest sample time
+        """
+        signal = self.signal()
+        if signal is None:
+            return None
+        # Forecast only ever pulls a scale up earlier, scale down waits for measured load
+        up_signal = signal if forecast is None else max(signal, forecast)
+        needed = max(1, math.ceil(up_signal / self.high))
+        floor = max(self.low, self.high * (replicas - 1) * self.down_fraction)
+
+        self.above_since = (self.above_since if self.above_since is not None else now) if needed > replicas else None
+        self.below_since = (self.below_since if self.below_since is not None else now) if signal < floor and replicas > 1 else None
+        since_action = math.inf if self.last_action is None else now - self.last_action
+
+        if self.above_since is not None and now - self.above_since >= self.up_for and since_action >= self.cooldown_up:
+            return self.record(now, "up", min(self.max_step, needed - replicas))
+        if self.below_since is not None and now - self.below_since >= self.down_for and since_action >= self.cooldown_down:
+            return self.record(now, "down", 1)
+        return None
+
+    def record(self, now, direction, steps):
+        self.last_action = now
+        # A fresh breach has to build up again after every action
+        self.above_since = None
+        self.below_since = None
+        return direction, steps
+
+def replay(trace, policy, replicas=1, forecasts=None):
+    """
+    Runs a recorded trace [(timestamp, value), ...] through a policy, tracking the replica count.
+    Returns [(timestamp, direction, steps, replicas after)]
+    """
+    actions = []
+    for i, (timestamp, value) in enumerate(trace):
+        policy.observe(timestamp, value)
+        action = policy.decide(timestamp, replicas, forecasts[i] if forecasts is not None else None)
+        if action:
+            direction, steps = action
+            replicas = replicas + steps if direction == "up" else max(1, replicas - steps)
+            actions.append((timestamp, direction, steps, replicas))
+    return actions
 
 class AutoScaler:
-    def __init__(self):
+    """
+    Feeds new network samples into the ScalingPolicy as they are saved (Postgres NOTIFY),
+    polling every `poll_interval` seconds only while LISTEN is unavailable.
+    `forecast` is an optional callable returning the predicted network load
+    """
+    def __init__(self, forecast=None):
         self.db = DatabaseManager()
-        self.actuator = Actuator()
-        self.cooldown_end = 0 
-
-        # Rules
-        self.HIGH_LOAD_THRESHOLD = 2.0  # 2 MB/s 
-        self.LOW_LOAD_THRESHOLD = 0.1   # 100 KB/s
-        self.COOLDOWN_SECONDS = 30  # Wait for 30s between actions
-        
+        self.config = ConfigCache.shared(self.db)
+        self.actuator = Actuator(db=self.db)
+        self.jobs = ScaleJobs(self.actuator, self.db)   # Scale actions run off the decision loop
+        self.forecast = forecast
+
+        percentile = os.getenv("AUTOSCALER_PERCENTILE")
+        self.policy = ScalingPolicy(
+            high=float(os.getenv("AUTOSCALER_HIGH", "2.0")),          # 2 MB/s
+            low=float(os.getenv("AUTOSCALER_LOW", "0.1")),            # 100 KB/s
+            window=float(os.getenv("AUTOSCALER_WINDOW", "30")),       # Seconds of samples in the signal
+            percentile=float(percentile) if percentile else None,     # Empty: mean
+            up_for=float(os.getenv("AUTOSCALER_UP_FOR", "10")),
+            down_for=float(os.getenv("AUTOSCALER_DOWN_FOR", "60")),
+            cooldown_up=float(os.getenv("AUTOSCALER_COOLDOWN", "30")),
+            cooldown_down=float(os.getenv("AUTOSCALER_DOWN_COOLDOWN", "120")),
+            max_step=int(os.getenv("AUTOSCALER_MAX_STEP", "3")),
+        )
+        self.host = os.getenv("AUTOSCALER_HOST") or None     # Scale on one agent's traffic, default the fleet average
+        self.poll_interval = float(os.getenv("AUTOSCALER_POLL_INTERVAL", "5"))
+        self.heartbeat = 30     # Re-check this often even when NOTIFY is quiet
+
+        self.mode = None
+        self.last_seen = None   # Newest sample (fleet bucket) timestamp fed to the policy
+        self.listener = None
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+
+    def on_notify(self, channel, payload):
+        if channel == CONFIG_CHANNEL:
+            self.config.on_notify(channel, payload)     # Drop the cached mode before the loop wakes up to read it
+        self.wake.set()
+
+    def listening(self):
+        return self.listener is not None and self.listener.connected.is_set()
+
+    def new_samples(self):
+        """
+        Samples newer than the last one seen, oldest first. One agent's rows with AUTOSCALER_HOST, otherwise the
+        fleet series: one averaged value per timestamp, held back until every live agent has flushed it, so a
+        batch that lands after another host's newer one isn't skipped
+        """
+        if self.host:
+            rows = self.db.get_recent_metrics(limit=120, host=self.host)     # Newest first
+        else:
+            rows = self.db.get_fleet_metrics(limit=120)
+        samples = []
+        for row in reversed(rows):
+            timestamp = datetime.fromisoformat(row['timestamp']).timestamp()
+            if self.last_seen is None or timestamp > self.last_seen:
+                samples.append((timestamp, row['network']))
+        if samples:
+            self.last_seen = samples[-1][0]
+        return samples
+
     def decide(self):
-        mode = self.db.get_config("scaling_mode")
-        if mode == "manual":
+        self.mode = self.config.get("scaling_mode")
+        if self.mode == "manual":
             print(" System in MANUAL mode. Autoscaler paused!")
             return
 
-        metrics = self.db.get_recent_metrics(limit=1)
-        if not metrics:
-            print("Can't decide No metrics")
+        samples = self.new_samples()
+        if not samples:
+            if self.last_seen is None:
+                print("Can't decide No metrics")
             return
-        
-        current_net = metrics[0]['network']
-        
-        # current_time = time.time()
-        # if current_time < self.cooldown_end:
-        #     remaining = int(self.cooldown_end - current_time)
-        #     print(f"Cooldown active ({remaining}s reamining)...")
-        #     return
-        
-        print(f"Traffic: {current_net}")
-
-        if current_net > self.HIGH_LOAD_THRESHOLD:
-            print(f"High Traffic! ({current_net}%)")
-            self.actuator.scale_up()
-            self.cooldown_end = time.time() + self.COOLDOWN_SECONDS
-        elif current_net < self.LOW_LOAD_THRESHOLD:
-            print(f"Low Traffic! ({current_net}%)")
-            self.actuator.scale_down()
-            self.cooldown_end = time.time() + self.COOLDOWN_SECONDS
-        
+
+        forecast = None
+        if self.forecast:
+            try:
+                forecast = self.forecast()
+            except Exception as e:     # noqa: BLE001 Scaling goes on without a forecast
+                print(f"Forecast unavailable: {e}")
+
+        # Sample by sample like replay(), so dwell times follow sample time even when a batch arrives at once
+        replicas = self.actuator.get_container_count() or 1
+        for timestamp, value in samples:
+            self.policy.observe(timestamp, value)
+            action = self.policy.decide(timestamp, replicas, forecast)
+            if action is None:
+                continue
+
+            direction, steps = action
+            signal = self.policy.signal()
+            if direction == "up":
+                print(f"High Traffic! ({signal:.2f} MB/s)")
+                self.jobs.submit("up", steps, source="autoscaler")
+                replicas += steps
+            else:
+                print(f"Low Traffic! ({signal:.2f} MB/s)")
+                self.jobs.submit("down", steps, source="autoscaler")
+                replicas = max(1, replicas - steps)
+        signal = self.policy.signal()
+        print(f"Traffic: {samples[-1][1]} (signal {round(signal, 2) if signal is not None else None} over {self.policy.window:.0f}s, forecast {forecast})")
+
     def start(self):
         print("Auto-Scaler Agent: ONLINE")
+        self.actuator.start()   # Reconcile loop, keeps the orchestrator at the desired replica count
+        try:
+            self.listener = self.db.listen([METRICS_CHANNEL, CONFIG_CHANNEL], self.on_notify)
+        except Exception as e:     # noqa: BLE001 Without LISTEN the loop polls
+            print(f"Autoscaler falls back to polling: {e}")
         try:
-            while True:
-                self.decide()
-                time.sleep(5)
+            while not self.stopping.is_set():
+                self.wake.clear()
+                try:
+                    self.decide()
+                except Exception as e:     # noqa: BLE001 One failed decision must not stop the loop
+                    print(f"Autoscaler decision failed: {e}")
+                self.wake.wait(self.heartbeat if self.listening() else self.poll_interval)
         except KeyboardInterrupt:
             print("\nAuto-Scaler Stopped")
+        finally:
+            if self.listener:
+                self.listener.stop()
+            self.jobs.shutdown()
+            self.actuator.stop()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+
+def predicted_network():
+    """
+    Network forecast from an in-process Predictor, used when AUTOSCALER_FORECAST=1
+    """
+    from src.predictor import Predictor
+    predictor = Predictor()
+    predictor.start()
+
+    def forecast():
+        predictions, _ = predictor.predict_next_minute()
+        return predictions['network'] if predictions else None
+    return forecast
 
 if __name__ == "__main__":
-    bot = AutoScaler()
-    bot.start()     
\ No newline at end of file
+    forecast = predicted_network() if os.getenv("AUTOSCALER_FORECAST") == "1" else None
+    bot = AutoScaler(forecast=forecast)
+    bot.start()
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one computation,
+    the other callers block and get the leader's result (or exception)
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache. Entries expire after `ttl` seconds (None keeps them until evicted).
+    get_or_compute() goes through SingleFlight, so a cold key is computed once however many callers race for it
+    """
+    def __init__(self, ttl=None, max_size=128):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()    # key -> (expires_at, value)
+        self.flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                self.entries.pop(key, None)
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, fn, ttl=None):
+        """
+        Returns (value, hit). None results are not cached, ttl overrides the cache default for this entry
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value, True
+
+        def compute():
+            # Re-check, the previous leader may have filled it while we queued
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and (entry[0] is None or entry[0] >= time.monotonic()):
+                    return entry[1]
+            result = fn()
+            if result is not None:
+                self.set(key, result, ttl)
+            return result
+
+        return self.flight.do(key, compute), False
+
+    def invalidate(self, key=None):
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
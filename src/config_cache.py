@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+from src.database import CONFIG_CHANNEL
+
+
+class ConfigCache:
+    """
+    system_config values in memory, one cache per process and database (see shared()).
+    set_config() NOTIFYs the key on CONFIG_CHANNEL, the cache drops it and the next get() re-reads it.
+    A read that raced with a notification isn't stored (`version` changed meanwhile), and anything read
+    while LISTEN was down only lives `fallback_ttl` seconds, so a change shows up within that time at worst.
+    Values that have to be exact under a lock (desired_replicas) should keep using db.get_config()
+    """
+    _shared = {}     # noqa: RUF012 One per process, only touched under _shared_lock
+    _shared_lock = threading.Lock()
+
+    def __init__(self, db, fallback_ttl=1.0, listen=True):
+        self.db = db
+        self.fallback_ttl = fallback_ttl
+        self.listen = listen    # False: TTL only
+        self.lock = threading.Lock()
+        self.values = {}    # key -> (read at, listener epoch or None, value)
+        self.version = 0    # Bumped on every change this process hears about
+        self.epoch = 0      # Bumped on every LISTEN (re)connect
+        self.listener = None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def shared(cls, db):
+        key = tuple(sorted(db.connect_kwargs.items()))
+        with cls._shared_lock:
+            cache = cls._shared.get(key)
+            if cache is None:
+                cache = cls._shared[key] = cls(db, fallback_ttl=float(os.getenv("CONFIG_CACHE_TTL", "1")))
+            return cache
+
+    def start(self):
+        if self.listener is None and self.listen:
+            try:
+                self.listener = self.db.listen([CONFIG_CHANNEL], self.on_notify, on_connect=self.on_connect)
+            except Exception as e:     # noqa: BLE001 Without LISTEN entries expire after fallback_ttl
+                print(f"Config cache falls back to a {self.fallback_ttl}s TTL: {e}")
+        return self
+
+    def stop(self):
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+    def listening(self):
+        return self.listener is not None and self.listener.connected.is_set()
+
+    def on_notify(self, channel, payload):
+        with self.lock:
+            self.version += 1
+            self.values.pop(payload, None)
+
+    def on_connect(self):
+        # Notifications sent while disconnected are lost, nothing read before counts as current
+        with self.lock:
+            self.version += 1
+            self.epoch += 1
+            self.values.clear()
+
+    def get(self, key):
+        if self.listener is None and self.listen:
+            self.start()
+        listening = self.listening()
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is not None:
+                read_at, epoch, value = entry
+                if (listening and epoch == self.epoch) or time.monotonic() - read_at < self.fallback_ttl:
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            version = self.version
+
+        value = self.db.get_config(key)
+        with self.lock:
+            if self.version == version:
+                self.values[key] = (time.monotonic(), self.epoch if listening else None, value)
+        return value
+
+    def set(self, key, value):
+        """Writes through: this process sees the value at once, the others on their NOTIFY"""
+        with self.lock:
+            version = self.version
+        self.db.set_config(key, value)
+        with self.lock:
+            if self.version == version:
+                self.values[key] = (time.monotonic(), self.epoch if self.listening() else None, value)
+            else:
+                self.values.pop(key, None)  # Someone else changed config meanwhile, re-read
+            self.version += 1
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.values), "version": self.version, "hits": self.hits,
+                    "misses": self.misses, "listening": self.listening()}
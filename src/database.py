@@ -1,9 +1,98 @@
-import psycopg2
+import base64
+import json
+import math
 import os 
+import re
+from contextlib import contextmanager
+from datetime import UTC, datetime, timedelta
 from dotenv import load_dotenv
+import numpy as np
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import Json, execute_values
+from src import migrations
+from src.db_pool import ConnectionPool
+from src.downsample import lttb
+from src.notify import PgListener
+
+# Appended to WHERE clauses when a query is scoped to one host, expects a %(host)s param
+HOST_FILTER = "AND host_id = (SELECT id FROM metric_hosts WHERE name = %(host)s)"
+PARTITION_NAME = re.compile(r"^(\w+)_p(\d{8})$")
+LOCAL_HOST = "local"                   # Rows saved without a host name belong here
+METRICS_CHANNEL = "system_metrics"     # NOTIFY per saved batch, payload {"host", "timestamp", "count"}
+CONFIG_CHANNEL = "system_config"       # NOTIFY per set_config, payload is the key
+
+# scale_history columns, the keys of a ScaleJobs job. The first four never change after submit
+SCALE_JOB_FIELDS = ["id", "source", "action", "submitted_at", "steps", "status", "replicas_from", "replicas_to",
+                    "started_at", "finished_at", "queue_ms", "run_ms", "total_ms", "report", "error"]
+
+# (rollup column prefix, raw column)
+ROLLUP_FIELDS = [("cpu", "cpu_usage"), ("memory", "memory_usage"), ("disk", "disk_usage"), ("network", "network_mbps")]
+# Coarsest first: (table, bucket width in seconds, date_trunc unit)
+ROLLUPS = [("system_metrics_1h", 3600, "hour"), ("system_metrics_1m", 60, "minute")]
+
+def parse_labels(text):
+    """'env=prod,role=web' -> {'env': 'prod', 'role': 'web'}"""
+    labels = {}
+    for pair in (text or "").split(","):
+        if "=" in pair:
+            key, value = pair.split("=", 1)
+            labels[key.strip()] = value.strip()
+    return labels
+
+def encode_cursor(timestamp, row_id):
+    """Opaque page token for keyset pagination over (timestamp, id)"""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(token):
+    """Inverse of encode_cursor(), raises ValueError on a malformed token"""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+def rollup_upsert(table, unit, source):
+    """
+    SQL that folds raw rows from `source` into a rollup table, one bucket per host and period.
+    Buckets keep sum/min/max/count, so adding samples later just merges into the existing row
+    """
+    columns = ", ".join(f"{name}_sum, {name}_min, {name}_max" for name, _ in ROLLUP_FIELDS)
+    aggregates = ", ".join(f"SUM({raw}::float8), MIN({raw}), MAX({raw})" for _, raw in ROLLUP_FIELDS)
+    updates = ", ".join(
+        f"{name}_sum = r.{name}_sum + EXCLUDED.{name}_sum, "
+        f"{name}_min = LEAST(r.{name}_min, EXCLUDED.{name}_min), "
+        f"{name}_max = GREATEST(r.{name}_max, EXCLUDED.{name}_max)"
+        for name, _ in ROLLUP_FIELDS
+    )
+    return f"""
+        INSERT INTO {table} AS r (host_id, bucket, samples, {columns})
+        SELECT host_id, date_trunc('{unit}', timestamp), COUNT(*), {aggregates}
+        FROM {source}
+        GROUP BY 1, 2
+        ON CONFLICT (host_id, bucket) DO UPDATE SET samples = r.samples + EXCLUDED.samples, {updates}
+    """
+
+# Raw insert, host heartbeat and both rollups in a single statement,
+# so a batch is one round-trip and rollups never drift
+SAVE_METRICS_SQL = f"""
+    WITH rows AS (
+        INSERT INTO system_metrics (timestamp, cpu_usage, memory_usage, disk_usage, network_mbps, host_id)
+        VALUES %s
+        RETURNING host_id, timestamp, cpu_usage, memory_usage, disk_usage, network_mbps
+    ), seen AS (
+        UPDATE metric_hosts h SET last_seen = GREATEST(h.last_seen, s.latest)
+        FROM (SELECT host_id, MAX(timestamp) AS latest FROM rows GROUP BY host_id) s
+        WHERE h.id = s.host_id
+    ), minutes AS ({rollup_upsert("system_metrics_1m", "minute", "rows")})
+    {rollup_upsert("system_metrics_1h", "hour", "rows")}
+"""
+
+# (pid, connection settings) whose schema was checked, every DatabaseManager after the first skips it
+SCHEMA_CHECKED = set()
 
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, auto_migrate=None):
         load_dotenv()
         self.host = os.getenv("POSTGRES_HOST", "localhost")
         self.port = os.getenv("POSTGRES_PORT", "5432")
@@ -11,179 +100,788 @@ class DatabaseManager:
         self.user = os.getenv("POSTGRES_USER")
         self.password = os.getenv("POSTGRES_PASSWORD")
 
+        self.connect_kwargs = {
+            "host": self.host,
+            "port": self.port,
+            "database": self.name,
+            "user": self.user,
+            "password": self.password,
+            "connect_timeout": int(os.getenv("POSTGRES_CONNECT_TIMEOUT", "5")),
+        }
+        # One pool per process, every DatabaseManager with the same settings shares it
+        self.pool = ConnectionPool.shared(
+            self.connect_kwargs,
+            min_size = int(os.getenv("POSTGRES_POOL_MIN", "1")),
+            max_size = int(os.getenv("POSTGRES_POOL_MAX", "10")),
+            timeout = float(os.getenv("POSTGRES_POOL_TIMEOUT", "5")),
+            max_idle = float(os.getenv("POSTGRES_POOL_MAX_IDLE", "30")),
+        )
+
+        self.host_ids = {}  # host name -> metric_hosts.id, hosts never change id
+        self.series_ids = {}    # (host_id, name, labels json) -> metric_series.id
+        # Fleet series bucket width, at least one sample interval so every host lands in every bucket
+        self.fleet_step = max(1, math.ceil(float(os.getenv("MONITOR_INTERVAL", "1"))))
         self.tables_ready = False
-        self.initialize_tables()
+        # Off (DB_AUTO_MIGRATE=0): migrations only run from `python -m src.migrations`, startup just checks
+        self.auto_migrate = os.getenv("DB_AUTO_MIGRATE", "1") == "1" if auto_migrate is None else auto_migrate
+        if self.auto_migrate:
+            self.initialize_tables()
     
+    @contextmanager
     def get_connection(self):
         """        
-        Private method: Creates a new connection
+        Private method: Borrows a pooled connection (None if the DB is unreachable) and hands it back afterwards
         """
         try:
-            return psycopg2.connect(
-                host = self.host,
-                port = self.port,
-                database = self.name,
-                user = self.user,
-                password = self.password
-            )
+            connection = self.pool.getconn()
         except Exception as e:
             print(f"DB Connection Error: {e}")
-            return None
-        
+            yield None
+            return
+
+        try:
+            yield connection
+        finally:
+            self.pool.putconn(connection)
+
+    def pool_stats(self):
+        """Connection pool usage (in-use, waits, wait time...)"""
+        return self.pool.stats()
+
+    def listen(self, channels, callback, on_connect=None):
+        """
+        Starts a background LISTEN on the given channels, callback(channel, payload) runs on its thread
+        """
+        return PgListener(self.connect_kwargs, channels, callback, on_connect=on_connect).start()
+
     def get_config(self, key):
         self.ensure_table()
-        connection = self.get_connection()
         val = None
-        if connection:
-            try:
+        with self.get_connection() as connection:
+            if connection:
                 with connection.cursor() as cursor:
                     cursor.execute("SELECT value FROM system_config WHERE key = %s", (key,))
                     row = cursor.fetchone()
                     if row: 
                         val = row[0]    # string 'auto' from the tuple 
-            finally:
-                connection.close()
         return val
     
     def set_config(self, key, value):
         self.ensure_table()
-        connection = self.get_connection()
-        if connection:
-            try:
+        with self.get_connection() as connection:
+            if connection:
                 with connection.cursor() as cursor:
                     cursor.execute("""
                         INSERT INTO system_config (key, value) VALUES (%s, %s)
                         ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
                     """, (key, value))
+                    cursor.execute("SELECT pg_notify(%s, %s)", (CONFIG_CHANNEL, key))
                     connection.commit()
-            finally:
-                connection.close()
+
+    def acquire_lease(self, name, holder, ttl):
+        """
+        Takes or renews the named lease for `ttl` seconds. True if `holder` has it, False if someone else
+        holds an unexpired lease (or the DB is unreachable: without the DB nobody can prove they're alone)
+        """
+        self.ensure_table()
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("""
+                            INSERT INTO scale_leases (name, holder, expires_at)
+                            VALUES (%(name)s, %(holder)s, now() + make_interval(secs => %(ttl)s))
+                            ON CONFLICT (name) DO UPDATE SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+                            WHERE scale_leases.holder = EXCLUDED.holder OR scale_leases.expires_at < now()
+                            RETURNING holder
+                        """, {"name": name, "holder": holder, "ttl": ttl})
+                        acquired = cursor.fetchone() is not None
+                        connection.commit()
+                        return acquired
+                except psycopg2.Error as e:
+                    connection.rollback()
+                    print(f"Lease {name} failed: {e}")
+        return False
+
+    def release_lease(self, name, holder):
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("DELETE FROM scale_leases WHERE name = %s AND holder = %s", (name, holder))
+                        connection.commit()
+                except psycopg2.Error as e:
+                    connection.rollback()
+                    print(f"Lease {name} release failed: {e}")
+
+    def save_scale_job(self, job):
+        """
+        Inserts or updates one scale job (see ScaleJobs), called on every status change
+        """
+        self.ensure_table()
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"""
+                            INSERT INTO scale_history ({", ".join(SCALE_JOB_FIELDS)})
+                            VALUES ({", ".join(f"%({field})s" for field in SCALE_JOB_FIELDS)})
+                            ON CONFLICT (id) DO UPDATE SET
+                            {", ".join(f"{field} = EXCLUDED.{field}" for field in SCALE_JOB_FIELDS[4:])}
+                        """, {**job, "report": Json(job["report"]) if job.get("report") is not None else None})
+                        connection.commit()
+                except psycopg2.Error as e:
+                    connection.rollback()
+                    print(f"Saving scale job failed: {e}")
+
+    def get_scale_history(self, limit=50, job_id=None):
+        """
+        Scale jobs, newest first, with their queue / run / end-to-end durations in ms
+        """
+        self.ensure_table()
+        jobs = []
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"""
+                            SELECT {", ".join(SCALE_JOB_FIELDS)} FROM scale_history
+                            WHERE %(id)s::text IS NULL OR id = %(id)s
+                            ORDER BY submitted_at DESC
+                            LIMIT %(limit)s
+                        """, {"id": job_id, "limit": limit})
+                        for row in cursor.fetchall():
+                            job = dict(zip(SCALE_JOB_FIELDS, row))
+                            for field in ("submitted_at", "started_at", "finished_at"):
+                                if job[field] is not None:
+                                    job[field] = job[field].isoformat()
+                            jobs.append(job)
+                except psycopg2.Error as e:
+                    print(f"Fetching scale history failed: {e}")
+        return jobs
+
+    def get_scale_job(self, job_id):
+        jobs = self.get_scale_history(limit=1, job_id=job_id)
+        return jobs[0] if jobs else None
 
     def initialize_tables(self):
         """
-        Private method: Set up the table if missing
+        Schema bootstrap, once per process and database: applies pending migrations (src/migrations.py),
+        or with auto_migrate off only warns about them. Queries never issue DDL
         """
-        connection = self.get_connection()
-        if connection:
-            try:
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS system_metrics(
-                            id SERIAL PRIMARY KEY,
-                            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            cpu_usage REAL,
-                            memory_usage REAL,
-                            disk_usage REAL,
-                            network_mbps REAL
-                        );
-                    """)
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS system_config (
-                            key TEXT PRIMARY KEY,
-                            value TEXT           
-                        );
-                    """)
-                    cursor.execute("""
-                        INSERT INTO system_config (key, value)
-                        VALUES ('scaling_mode', 'auto')
-                        ON CONFLICT (key) DO NOTHING;
-                    """)
+        key = (os.getpid(), tuple(sorted(self.connect_kwargs.items())))
+        if key not in SCHEMA_CHECKED:
+            if self.auto_migrate:
+                if migrations.migrate(self) is None:
+                    return
+            else:
+                missing = migrations.pending(self)
+                if missing is None:
+                    return
+                if missing:
+                    print(f"Database schema is {len(missing)} migration(s) behind, run: python -m src.migrations")
+            SCHEMA_CHECKED.add(key)
+        self.tables_ready = True
+
+    def _create_partition(self, cursor, day, parent="system_metrics"):
+        """
+        Adds the partition of `parent` for one day, moving any rows the default partition already holds for it.
+        Returns False if it already exists
+        """
+        name = f"{parent}_p{day:%Y%m%d}"
+        cursor.execute("SELECT to_regclass(%s)", (name,))
+        if cursor.fetchone()[0]:
+            return False
+
+        start, end = day, day + timedelta(days=1)
+        table, parent_table = sql.Identifier(name), sql.Identifier(parent)
+        default_table = sql.Identifier(f"{parent}_default")
+        cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(table, parent_table))
+        cursor.execute(sql.SQL("""
+            WITH moved AS (
+                DELETE FROM {} WHERE timestamp >= %s AND timestamp < %s RETURNING *
+            )
+            INSERT INTO {} SELECT * FROM moved
+        """).format(default_table, table), (start, end))
+        cursor.execute(
+            sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(parent_table, table),
+            (start, end)
+        )
+        return True
+
+    def run_maintenance(self, days_ahead=2, retention_days=30, detail_retention_days=7,
+                        minute_rollup_days=14, hour_rollup_days=365):
+        """
+        Creates partitions for the next `days_ahead` days and drops the ones older than `retention_days`
+        (`detail_retention_days` for the per-core/NIC/disk/process samples).
+        Rollups are trimmed on their own (longer) schedule.
+        Safe to run from several agents, only one does the work at a time
+        """
+        self.ensure_table()
+        result = {"created": [], "dropped": []}
+
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext('system_metrics_maintenance')), CURRENT_DATE")
+                        locked, today = cursor.fetchone()
+                        if not locked:
+                            return result
+
+                        for parent, keep_days in (("system_metrics", retention_days), ("metric_samples", detail_retention_days)):
+                            for offset in range(days_ahead + 1):
+                                day = today + timedelta(days=offset)
+                                if self._create_partition(cursor, day, parent):
+                                    result["created"].append(f"{parent}_p{day:%Y%m%d}")
+
+                            cutoff = today - timedelta(days=keep_days)
+                            cursor.execute("""
+                                SELECT c.relname FROM pg_inherits i
+                                JOIN pg_class c ON c.oid = i.inhrelid
+                                WHERE i.inhparent = %s::regclass
+                            """, (parent,))
+                            for (name,) in cursor.fetchall():
+                                match = PARTITION_NAME.match(name)
+                                if match and datetime.strptime(match.group(2), "%Y%m%d").date() < cutoff:
+                                    cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                                    result["dropped"].append(name)
+                            cursor.execute(
+                                sql.SQL("DELETE FROM {} WHERE timestamp < %s").format(sql.Identifier(f"{parent}_default")),
+                                (cutoff,)
+                            )
+                        cursor.execute("DELETE FROM system_metrics_1m WHERE bucket < %s", (today - timedelta(days=minute_rollup_days),))
+                        cursor.execute("DELETE FROM system_metrics_1h WHERE bucket < %s", (today - timedelta(days=hour_rollup_days),))
                     connection.commit()
-                    # print("!!! Database Schema Ready !!!")
-            except Exception as e:
-                print(f"Table init failed: {e}")
-            finally:
-                connection.close()
-    
+                except psycopg2.Error as e:
+                    print(f"Metrics maintenance failed: {e}")
+                    return {"created": [], "dropped": []}
+        return result
+
     def ensure_table(self):
-        """IF tables aren't ready, try to create them"""
+        """Bootstrap the schema if that hasn't worked yet in this process (DB was down), a flag check otherwise"""
         if not self.tables_ready:
             self.initialize_tables()
     
-    def save_metric(self, cpu, memory, disk, network):
+    def save_metric(self, cpu, memory, disk, network, host=None):
+        self.save_metrics([(datetime.now(UTC), cpu, memory, disk, network)], host=host)
+    
+    def save_metrics(self, samples, host=None):
+        """
+        Bulk insert for (timestamp, cpu, memory, disk, network) tuples from one host, one round-trip
+        and one commit per batch. The 1m/1h rollups and the host's last_seen are updated in the same statement.
+        Returns False when the batch didn't make it so the caller can keep it and retry
+        """
+        if not samples:
+            return True
         self.ensure_table()
-        connection = self.get_connection()
-        if connection:
+        host_id = self.get_host_id(host or LOCAL_HOST)
+        if host_id is None:
+            return False
+        rows = [(*sample, host_id) for sample in samples]
+
+        with self.get_connection() as connection:
+            if not connection:
+                return False
             try:
                 with connection.cursor() as cursor:
-                    cursor.execute(
-                        "INSERT INTO system_metrics (cpu_usage, memory_usage, disk_usage, network_mbps)" \
-                        "VALUES (%s, %s, %s, %s)",
-                        (cpu, memory, disk, network)
-                    )
+                    execute_values(cursor, SAVE_METRICS_SQL, rows, page_size=len(rows))
+                    # Delivered on commit, live dashboards read the batch once per API process
+                    cursor.execute("SELECT pg_notify(%s, %s)", (METRICS_CHANNEL, json.dumps({
+                        "host": host or LOCAL_HOST,
+                        "timestamp": max(row[0] for row in rows).isoformat(),
+                        "count": len(rows),
+                    })))
+                connection.commit()
+                return True
+            except psycopg2.Error as e:
+                print(f"Batch save to DB Failed ({len(samples)} rows): {e}")
+                return False
+
+    def register_host(self, name, labels=None):
+        """
+        Creates or updates an agent's host row and returns its id. labels=None leaves existing labels alone
+        """
+        self.ensure_table()
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("""
+                            INSERT INTO metric_hosts AS h (name, labels) VALUES (%(name)s, COALESCE(%(labels)s::jsonb, '{}'))
+                            ON CONFLICT (name) DO UPDATE SET labels = COALESCE(%(labels)s::jsonb, h.labels)
+                            RETURNING id
+                        """, {"name": name, "labels": Json(labels) if labels is not None else None})
+                        host_id = cursor.fetchone()[0]
                     connection.commit()
-            except Exception as e:
-                if "releation" in str(e) and "does not exists" in str(e):
-                    print("Tables missing. Resetting flag")
-                    self.tables_ready = False
-                print(F"Save to DB Failed: {e}")
-            finally:
-                connection.close()
-    
-    def get_recent_metrics(self, limit=10):
+                    self.host_ids[name] = host_id
+                    return host_id
+                except psycopg2.Error as e:
+                    print(f"Host registration failed for {name}: {e}")
+        return None
+
+    def get_host_id(self, name):
+        """Cached lookup, registers the host on first sight"""
+        if name in self.host_ids:
+            return self.host_ids[name]
+        return self.register_host(name)
+
+    def get_hosts(self):
+        """Every known agent with its labels and when it last reported"""
+        self.ensure_table()
+        hosts = []
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT name, labels, first_seen, last_seen FROM metric_hosts ORDER BY name")
+                        for name, labels, first_seen, last_seen in cursor.fetchall():
+                            hosts.append({
+                                "host": name,
+                                "labels": labels,
+                                "first_seen": first_seen.isoformat(),
+                                "last_seen": last_seen.isoformat() if last_seen else None
+                            })
+                except psycopg2.Error as e:
+                    print(f"Fetching hosts Failed: {e}")
+        return hosts
+
+    def get_recent_metrics(self, limit=10, host=None):
         """
-        Retreives the last 'limit' entries from the DB
+        Retreives the last 'limit' entries from the DB, for one host or the whole fleet
         """
         self.ensure_table()
-        connection = self.get_connection()
         clean_data = []
 
-        if connection:
-            try:
-                with connection.cursor() as cursor:
-                    # Ordered by newest first
-                    cursor.execute("""
-                        SELECT timestamp, cpu_usage, memory_usage, disk_usage, network_mbps
-                        FROM system_metrics
-                        ORDER BY timestamp DESC
-                        LIMIT %s
-                    """, (limit,))
-                    data = cursor.fetchall()
-
-                    for row in data:
-                        clean_data.append({
-                            "timestamp": row[0].isoformat(),
-                            "cpu": row[1],
-                            "memory": row[2],
-                            "disk": row[3],
-                            "network": row[4]
-                        })
-            except Exception as e:
-                print(f"Fetching recent metrics Failed: {e}")
-            finally:
-                connection.close()
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        # Ordered by newest first
+                        cursor.execute(f"""
+                            SELECT m.timestamp, m.cpu_usage, m.memory_usage, m.disk_usage, m.network_mbps, h.name
+                            FROM system_metrics m
+                            JOIN metric_hosts h ON h.id = m.host_id
+                            WHERE TRUE {HOST_FILTER if host else ""}
+                            ORDER BY m.timestamp DESC
+                            LIMIT %(limit)s
+                        """, {"limit": limit, "host": host})
+                        data = cursor.fetchall()
+
+                        for row in data:
+                            clean_data.append({
+                                "timestamp": row[0].isoformat(),
+                                "cpu": row[1],
+                                "memory": row[2],
+                                "disk": row[3],
+                                "network": row[4],
+                                "host": row[5]
+                            })
+                except psycopg2.Error as e:
+                    print(f"Fetching recent metrics Failed: {e}")
         
         return clean_data
+
+    def get_recent_columns(self, limit=10, host=None):
+        """
+        Same rows as get_recent_metrics() but as columns: epoch-ms timestamps (computed in SQL) and
+        float arrays per metric, no per-row dicts or isoformat(). Missing values are NaN
+        """
+        self.ensure_table()
+        rows = []
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"""
+                            SELECT (extract(epoch FROM m.timestamp) * 1000)::int8,
+                                m.cpu_usage, m.memory_usage, m.disk_usage, m.network_mbps, h.name
+                            FROM system_metrics m
+                            JOIN metric_hosts h ON h.id = m.host_id
+                            WHERE TRUE {HOST_FILTER if host else ""}
+                            ORDER BY m.timestamp DESC
+                            LIMIT %(limit)s
+                        """, {"limit": limit, "host": host})
+                        rows = cursor.fetchall()
+                except psycopg2.Error as e:
+                    print(f"Fetching recent metrics Failed: {e}")
+
+        if not rows:
+            return {}
+        timestamps, cpu, memory, disk, network, hosts = zip(*rows)
+        return {
+            "timestamp": np.array(timestamps, dtype=np.int64),
+            "cpu": np.array(cpu, dtype=float),
+            "memory": np.array(memory, dtype=float),
+            "disk": np.array(disk, dtype=float),
+            "network": np.array(network, dtype=float),
+            "host": list(hosts),
+        }
+
+    def get_fleet_metrics(self, limit=10, step=None, active=30):
+        """
+        One series for the whole fleet, newest first, in the same shape as get_recent_metrics(): per
+        `step`-second bucket the average over every host that has samples in it ('hosts' says how many).
+        Agents flush batches on their own schedule, so buckets are only returned up to the oldest last_seen
+        among hosts that reported within `active` seconds of the newest one. A bucket therefore doesn't show up
+        before every live host's batch for it is in, and readers that remember the newest timestamp they
+        consumed never miss a late flush
+        """
+        self.ensure_table()
+        step = step or self.fleet_step
+        clean_data = []
+
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("""
+                            WITH hosts AS (
+                                SELECT last_seen FROM metric_hosts WHERE last_seen IS NOT NULL
+                            ), watermark AS (
+                                SELECT floor(extract(epoch FROM min(last_seen)) / %(step)s) AS upto, min(last_seen) AS since
+                                FROM hosts
+                                WHERE last_seen >= (SELECT max(last_seen) FROM hosts) - make_interval(secs => %(active)s)
+                            )
+                            SELECT to_timestamp(floor(extract(epoch FROM m.timestamp) / %(step)s) * %(step)s) AT TIME ZONE 'UTC',
+                                AVG(m.cpu_usage), AVG(m.memory_usage), AVG(m.disk_usage), AVG(m.network_mbps), COUNT(DISTINCT m.host_id)
+                            FROM system_metrics m, watermark w
+                            WHERE m.timestamp > w.since - make_interval(secs => %(limit)s * %(step)s)
+                              AND floor(extract(epoch FROM m.timestamp) / %(step)s) <= w.upto
+                            GROUP BY 1
+                            ORDER BY 1 DESC
+                            LIMIT %(limit)s
+                        """, {"limit": limit, "step": step, "active": active})
+                        for row in cursor.fetchall():
+                            clean_data.append({
+                                "timestamp": row[0].isoformat(),
+                                "cpu": row[1],
+                                "memory": row[2],
+                                "disk": row[3],
+                                "network": row[4],
+                                "hosts": row[5]
+                            })
+                except psycopg2.Error as e:
+                    print(f"Fetching fleet metrics Failed: {e}")
+
+        return clean_data
+
+    def get_latest_timestamp(self, host=None):
+        """
+        Time of the newest sample, an index-only lookup used as a cache key by readers
+        """
+        self.ensure_table()
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"""
+                            SELECT max(timestamp) FROM system_metrics
+                            WHERE TRUE {HOST_FILTER if host else ""}
+                        """, {"host": host})
+                        return cursor.fetchone()[0]
+                except psycopg2.Error as e:
+                    print(f"Fetching latest timestamp Failed: {e}")
+        return None
     
+    def save_samples(self, samples, host=None):
+        """
+        Bulk insert for detail collector output: (timestamp, metric name, labels dict, value) tuples.
+        Series ids are resolved once and cached, so steady-state ingest is a single INSERT per batch
+        """
+        if not samples:
+            return True
+        self.ensure_table()
+        host_id = self.get_host_id(host or LOCAL_HOST)
+        if host_id is None:
+            return False
+
+        keyed = [(ts, (host_id, name, json.dumps(labels, sort_keys=True)), value) for ts, name, labels, value in samples]
+        with self.get_connection() as connection:
+            if not connection:
+                return False
+            try:
+                with connection.cursor() as cursor:
+                    missing = {key for _, key, _ in keyed if key not in self.series_ids}
+                    if missing:
+                        # The no-op update makes RETURNING give back ids of series that already existed
+                        for series_id, name, labels in execute_values(cursor, """
+                            INSERT INTO metric_series AS s (host_id, name, labels) VALUES %s
+                            ON CONFLICT (host_id, name, labels) DO UPDATE SET name = s.name
+                            RETURNING id, name, labels
+                        """, list(missing), template="(%s, %s, %s::jsonb)", fetch=True):
+                            self.series_ids[(host_id, name, json.dumps(labels, sort_keys=True))] = series_id
+
+                    execute_values(
+                        cursor,
+                        "INSERT INTO metric_samples (timestamp, series_id, value) VALUES %s",
+                        [(ts, self.series_ids[key], value) for ts, key, value in keyed],
+                        page_size=1000
+                    )
+                connection.commit()
+                return True
+            except psycopg2.Error as e:
+                print(f"Detail samples save Failed ({len(samples)} rows): {e}")
+                return False
+
+    def get_detail_metrics(self, host=None, prefix="", minutes=5):
+        """
+        Latest value of every detail series whose name starts with `prefix` (e.g. 'cpu.core', 'process.')
+        reported in the last `minutes`
+        """
+        self.ensure_table()
+        data = []
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"""
+                            SELECT h.name, s.name, s.labels, latest.timestamp, latest.value
+                            FROM metric_series s
+                            JOIN metric_hosts h ON h.id = s.host_id
+                            CROSS JOIN LATERAL (
+                                SELECT timestamp, value FROM metric_samples m
+                                WHERE m.series_id = s.id AND m.timestamp > LOCALTIMESTAMP - make_interval(mins => %(minutes)s)
+                                ORDER BY timestamp DESC LIMIT 1
+                            ) latest
+                            WHERE s.name LIKE %(prefix)s {"AND h.name = %(host)s" if host else ""}
+                            ORDER BY h.name, s.name, s.labels::text
+                        """, {"minutes": minutes, "prefix": prefix.replace("%", "") + "%", "host": host})
+                        for host_name, name, labels, timestamp, value in cursor.fetchall():
+                            data.append({
+                                "host": host_name, "metric": name, "labels": labels,
+                                "timestamp": timestamp.isoformat(), "value": value
+                            })
+                except psycopg2.Error as e:
+                    print(f"Fetching detail metrics Failed: {e}")
+        return data
+
     def get_24h_summary(self):
         """
         Calculatees Highs, Lows, and Averages for the last 24 hours
         """
+        return self.get_summary(hours=24)
+
+    def get_summary(self, hours=24, host=None):
+        """
+        Highs, Lows and Averages over the last `hours` (whole hours, >= 1), for one host or fleet-wide.
+        Full hours come from the 1h rollup and the two partial hours at the edges from the 1m rollup,
+        ~150 rows per host instead of 86,400
+        """
         self.ensure_table()
-        connection = self.get_connection()
         summary = {}
+        parts = ", ".join(f"{name}_sum, {name}_min, {name}_max" for name, _ in ROLLUP_FIELDS)
+        host_filter = HOST_FILTER if host else ""
 
-        if connection:
-            try:
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT MIN(cpu_usage), MAX(cpu_usage), AVG(cpu_usage),
-                            MIN(memory_usage), MAX(memory_usage), AVG(memory_usage),
-                            MIN(network_mbps), MAX(network_mbps), AVG(network_mbps),
-                            COUNT(*)
-                        FROM system_metrics
-                        WHERE timestamp > NOW() - INTERVAL '24 hours'
-                    """)
-                    row = cursor.fetchone()
-                    if row and row[9] > 0: # Is there data
-                        summary = {
-                            "cpu_min": row[0], "cpu_max": row[1], "cpu_avg": round(row[2], 2),
-                            "mem_min": row[3], "mem_max": row[4], "mem_avg": round(row[5], 2),
-                            "net_min": row[6], "net_max": row[7], "net_avg": round(row[8], 2),
-                            "data_points": row[9]
-                        }
-            except Exception as e:
-                print(f"Summary 24h fetch failed: {e}")
-            finally:
-                connection.close()
-        return summary
\ No newline at end of file
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"""
+                            WITH bounds AS (
+                                SELECT LOCALTIMESTAMP - make_interval(hours => %(hours)s) AS since,
+                                       date_trunc('hour', LOCALTIMESTAMP - make_interval(hours => %(hours)s)) + INTERVAL '1 hour' AS first_hour,
+                                       date_trunc('hour', LOCALTIMESTAMP) AS last_hour
+                            ), parts AS (
+                                SELECT samples, {parts} FROM system_metrics_1h, bounds
+                                WHERE bucket >= first_hour AND bucket < last_hour {host_filter}
+                                UNION ALL
+                                SELECT samples, {parts} FROM system_metrics_1m, bounds
+                                WHERE ((bucket >= since AND bucket < first_hour) OR bucket >= last_hour) {host_filter}
+                            )
+                            SELECT MIN(cpu_min), MAX(cpu_max), SUM(cpu_sum) / SUM(samples),
+                                MIN(memory_min), MAX(memory_max), SUM(memory_sum) / SUM(samples),
+                                MIN(network_min), MAX(network_max), SUM(network_sum) / SUM(samples),
+                                COALESCE(SUM(samples), 0)
+                            FROM parts
+                        """, {"hours": hours, "host": host})
+                        row = cursor.fetchone()
+                        if row and row[9] > 0: # Is there data
+                            summary = {
+                                "cpu_min": row[0], "cpu_max": row[1], "cpu_avg": round(row[2], 2),
+                                "mem_min": row[3], "mem_max": row[4], "mem_avg": round(row[5], 2),
+                                "net_min": row[6], "net_max": row[7], "net_avg": round(row[8], 2),
+                                "data_points": row[9]
+                            }
+                except psycopg2.Error as e:
+                    print(f"Summary {hours}h fetch failed: {e}")
+        return summary
+
+    def pick_resolution(self, step):
+        """
+        Coarsest source whose buckets tile `step` seconds exactly: (table, width) or (None, 0) for raw rows
+        """
+        for table, width, _ in ROLLUPS:
+            if step >= width and step % width == 0:
+                return table, width
+        return None, 0
+
+    def get_series(self, start, end, step=None, max_points=500, host=None):
+        """
+        Bucketed avg/min/max between `start` and `end` (naive datetimes, DB local time),
+        for one host or aggregated over the fleet.
+        Buckets are sized so at most `max_points` come back, without `step` or when `step` is finer than that.
+        Reads from the coarsest rollup that can still be re-bucketed to `step`, so a week at 1h
+        is 168 rows from system_metrics_1h instead of 600k raw rows
+        """
+        self.ensure_table()
+        fitting = max(1, int(-(-(end - start).total_seconds() // max_points)))   # ceil
+        if not step or step < fitting:
+            step = fitting
+            # Round up to whole buckets of the coarsest rollup that fits, so it can be used
+            for _, width, _ in ROLLUPS:
+                if step >= width:
+                    step = -(-step // width) * width
+                    break
+        step = int(step)
+        table, width = self.pick_resolution(step)
+
+        if table:
+            source = table
+            time_col, samples = "bucket", "SUM(samples)"
+            aggregates = ", ".join(f"SUM({name}_sum) / SUM(samples), MIN({name}_min), MAX({name}_max)" for name, _ in ROLLUP_FIELDS)
+        else:
+            source = "system_metrics"
+            time_col, samples = "timestamp", "COUNT(*)"
+            aggregates = ", ".join(f"AVG({raw}), MIN({raw}), MAX({raw})" for _, raw in ROLLUP_FIELDS)
+
+        series = {"resolution": f"{width}s" if table else "raw", "step": step, "data": []}
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"""
+                            SELECT to_timestamp(floor(extract(epoch FROM {time_col}) / %(step)s) * %(step)s) AT TIME ZONE 'UTC',
+                                {samples}, {aggregates}
+                            FROM {source}
+                            WHERE {time_col} >= %(start)s AND {time_col} < %(end)s {HOST_FILTER if host else ""}
+                            GROUP BY 1
+                            ORDER BY 1
+                        """, {"step": step, "start": start, "end": end, "host": host})
+                        for row in cursor.fetchall():
+                            point = {"timestamp": row[0].isoformat(), "samples": row[1]}
+                            for i, (name, _) in enumerate(ROLLUP_FIELDS):
+                                avg, low, high = row[2 + 3 * i: 5 + 3 * i]
+                                point[f"{name}_avg"] = round(avg, 2) if avg is not None else None
+                                point[f"{name}_min"] = low
+                                point[f"{name}_max"] = high
+                            series["data"].append(point)
+                except psycopg2.Error as e:
+                    print(f"Series fetch failed: {e}")
+        return series
+
+    def get_raw_metrics(self, start, end, limit=1000, after=None, host=None):
+        """
+        One page of raw rows between `start` and `end`, oldest first, for exports.
+        Keyset pagination: `after` is the (timestamp, id) of the last row of the previous page, so every page
+        is an index range scan on the primary key instead of an OFFSET that re-reads all earlier pages.
+        Returns (rows, next) where next is the key to pass as `after`, None on the last page
+        """
+        self.ensure_table()
+        rows = []
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"""
+                            SELECT m.timestamp, m.id, m.cpu_usage, m.memory_usage, m.disk_usage, m.network_mbps, h.name
+                            FROM system_metrics m
+                            JOIN metric_hosts h ON h.id = m.host_id
+                            WHERE m.timestamp >= %(start)s AND m.timestamp < %(end)s
+                                {"AND (m.timestamp, m.id) > (%(after_ts)s, %(after_id)s)" if after else ""}
+                                {HOST_FILTER if host else ""}
+                            ORDER BY m.timestamp, m.id
+                            LIMIT %(limit)s
+                        """, {
+                            "start": start, "end": end, "limit": limit + 1, "host": host,
+                            "after_ts": after[0] if after else None, "after_id": after[1] if after else None,
+                        })
+                        rows = cursor.fetchall()
+                except psycopg2.Error as e:
+                    print(f"Raw metrics export failed: {e}")
+
+        # One extra row tells whether another page exists without a COUNT(*)
+        last = (rows[limit - 1][0], rows[limit - 1][1]) if len(rows) > limit else None
+        data = [{
+            "timestamp": row[0].isoformat(),
+            "cpu": row[2],
+            "memory": row[3],
+            "disk": row[4],
+            "network": row[5],
+            "host": row[6]
+        } for row in rows[:limit]]
+        return data, last
+
+    def get_lttb_series(self, start, end, max_points=500, field="cpu", host=None, raw_limit=100000):
+        """
+        Largest-Triangle-Three-Buckets downsample of `field` between `start` and `end`: keeps real samples
+        (spikes included) instead of averaging them away. Every field is returned for the picked samples.
+        Ranges with more than `raw_limit` raw rows are downsampled from the 1m rollup averages instead
+        """
+        if field not in dict(ROLLUP_FIELDS):
+            raise ValueError(f"Unknown field: {field}")
+        names = [name for name, _ in ROLLUP_FIELDS]
+        rows, more = self.get_raw_metrics(start, end, limit=raw_limit, host=host)
+        resolution = "raw"
+        if more or len({row["host"] for row in rows}) > 1:
+            # Too many rows, or several hosts interleaved in time: downsample the fleet/minute averages,
+            # a single line needs one value per timestamp
+            # get_series widens the step to fit its point bound, so it is given raw_limit, never less than max_points
+            series = self.get_series(start, end, step=60 if more else 1, max_points=max(raw_limit, max_points), host=host)
+            resolution = f"{series['step']}s"
+            rows = [
+                {"timestamp": point["timestamp"], **{name: point[f"{name}_avg"] for name in names}}
+                for point in series["data"]
+            ]
+
+        if not rows:
+            return {"resolution": resolution, "method": "lttb", "field": field, "data": []}
+        x = np.array([datetime.fromisoformat(row["timestamp"]).timestamp() for row in rows])
+        y = np.array([row[field] if row[field] is not None else np.nan for row in rows], dtype=float)
+        picked = lttb(x, y, max_points)
+        data = [{key: rows[i][key] for key in ["timestamp"] + names} for i in picked]
+        return {"resolution": resolution, "method": "lttb", "field": field, "data": data}
+
+    def get_fleet_summary(self, minutes=5, labels=None):
+        """
+        Per-host averages/peaks over the last `minutes` from the 1m rollup (one row per host per minute),
+        plus fleet-wide totals. `labels` keeps only hosts whose labels contain all the given pairs
+        """
+        self.ensure_table()
+        hosts = []
+        with self.get_connection() as connection:
+            if connection:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"""
+                            SELECT h.name, h.labels, SUM(r.samples),
+                                SUM(r.cpu_sum) / SUM(r.samples), MAX(r.cpu_max),
+                                SUM(r.memory_sum) / SUM(r.samples), MAX(r.memory_max),
+                                SUM(r.network_sum) / SUM(r.samples), MAX(r.network_max)
+                            FROM system_metrics_1m r
+                            JOIN metric_hosts h ON h.id = r.host_id
+                            WHERE r.bucket >= date_trunc('minute', LOCALTIMESTAMP - make_interval(mins => %(minutes)s))
+                            {"AND h.labels @> %(labels)s" if labels else ""}
+                            GROUP BY h.name, h.labels
+                            ORDER BY h.name
+                        """, {"minutes": minutes, "labels": Json(labels) if labels else None})
+                        for row in cursor.fetchall():
+                            hosts.append({
+                                "host": row[0], "labels": row[1], "data_points": row[2],
+                                "cpu_avg": round(row[3], 2), "cpu_max": row[4],
+                                "mem_avg": round(row[5], 2), "mem_max": row[6],
+                                "net_avg": round(row[7], 2), "net_max": row[8]
+                            })
+                except psycopg2.Error as e:
+                    print(f"Fleet summary fetch failed: {e}")
+
+        fleet = {"hosts": len(hosts)}
+        if hosts:
+            fleet.update({
+                "cpu_avg": round(sum(h["cpu_avg"] for h in hosts) / len(hosts), 2),
+                "cpu_max": max(h["cpu_max"] for h in hosts),
+                "mem_avg": round(sum(h["mem_avg"] for h in hosts) / len(hosts), 2),
+                "net_total": round(sum(h["net_avg"] for h in hosts), 2),   # Fleet throughput, MB/s
+                "busiest_host": max(hosts, key=lambda h: h["cpu_avg"])["host"]
+            })
+        return {"fleet": fleet, "hosts": hosts}
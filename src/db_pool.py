@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up before the pool timeout"""
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of psycopg2 connections.
+    One pool per DSN is shared by every DatabaseManager in the process (see shared())
+    """
+    _shared = {}     # noqa: RUF012 One per process, only touched under _shared_lock
+    _shared_lock = threading.Lock()
+
+    def __init__(self, connect_kwargs, min_size=1, max_size=10, timeout=5.0, max_idle=30.0):
+        self.connect_kwargs = connect_kwargs
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.max_idle = max_idle    # Idle connections older than this get a SELECT 1 before reuse
+
+        self._cond = threading.Condition()
+        self._idle = []     # (connection, last_used) pairs, newest last
+        self._size = 0      # Open connections, idle + in use
+        self._in_use = 0
+        self._pid = os.getpid()
+
+        # Counters exposed through stats()
+        self._requests = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._failures = 0
+
+        self._fill()
+
+    @classmethod
+    def shared(cls, connect_kwargs, **options):
+        """
+        Returns the process-wide pool for these connection settings, creating it on first use.
+        A forked child gets its own pool, sockets can't be shared across processes
+        """
+        key = tuple(sorted(connect_kwargs.items()))
+        with cls._shared_lock:
+            pool = cls._shared.get(key)
+            if pool is None or pool._pid != os.getpid():
+                pool = cls(connect_kwargs, **options)
+                cls._shared[key] = pool
+            return pool
+
+    def _connect(self):
+        connection = psycopg2.connect(**self.connect_kwargs)
+        with self._cond:
+            self._created += 1
+        return connection
+
+    def _fill(self):
+        """Opens the minimum number of connections, a DB that is down just leaves the pool empty"""
+        while self._size < self.min_size:
+            try:
+                connection = self._connect()
+            except psycopg2.Error as e:
+                self._failures += 1
+                print(f"DB Pool warm-up failed: {e}")
+                return
+            self._idle.append((connection, time.monotonic()))
+            self._size += 1
+
+    def _is_healthy(self, connection, last_used):
+        if connection.closed:
+            return False
+        if time.monotonic() - last_used < self.max_idle:
+            return True
+        # Idle for a while, server may have dropped it (restart, idle timeout, failover)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except Exception:     # noqa: BLE001 Whatever the error, the connection is unusable
+            return False
+
+    def _close_quietly(self, connection):
+        with self._cond:
+            self._discarded += 1
+        try:
+            connection.close()
+        except Exception:     # noqa: BLE001, S110 Closing a broken connection, nothing left to do
+            pass
+
+    def getconn(self):
+        """
+        Borrows a connection, blocks up to `timeout` seconds when the pool is exhausted
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        connection, last_used = None, None
+
+        with self._cond:
+            self._requests += 1
+            while True:
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1     # Reserve the slot, connect outside the lock
+                    break
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No free DB connection after {self.timeout}s (max {self.max_size})")
+                self._cond.wait(remaining)
+
+            if waited:
+                wait = time.monotonic() - start
+                self._waits += 1
+                self._wait_time += wait
+                self._max_wait = max(self._max_wait, wait)
+            self._in_use += 1
+
+        if connection is not None and not self._is_healthy(connection, last_used):
+            self._close_quietly(connection)
+            connection = None   # Keep the slot and reconnect below
+
+        if connection is None:
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._cond:
+                    self._failures += 1
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+        return connection
+
+    def putconn(self, connection, discard=False):
+        """
+        Returns a borrowed connection. Broken connections and ones stuck in a transaction are closed
+        """
+        if (not discard and not connection.closed
+                and connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE):
+            try:
+                connection.rollback()
+            except Exception:     # noqa: BLE001 Whatever the error, the connection is discarded
+                discard = True
+
+        if discard or connection.closed:
+            self._close_quietly(connection)
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._in_use -= 1
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for connection, _ in idle:
+            self._close_quietly(connection)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "requests": self._requests,
+                "waits": self._waits,
+                "wait_time_ms": round(self._wait_time * 1000, 2),
+                "avg_wait_ms": round(self._wait_time * 1000 / self._waits, 2) if self._waits else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "failures": self._failures,
+            }
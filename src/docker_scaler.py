@@ -0,0 +1,122 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SERVICE_LABEL = "com.docker.compose.service"
+PROJECT_LABEL = "com.docker.compose.project"
+NUMBER_LABEL = "com.docker.compose.container-number"
+
+class NoTemplate(Exception):
+    """No container of the service exists to copy, docker-compose has to create the first one"""
+
+class DockerScaler:
+    """
+    Scales a compose service through the Docker API, no docker-compose process or compose file parse.
+    New replicas are cloned from a running one (image, command, env, labels, ports, mounts, networks),
+    started in parallel and waited on until running (healthy, when the image has a healthcheck).
+    Scaling down stops and removes the highest-numbered replicas, like `compose up --scale` does
+    """
+    def __init__(self, client, service, project, ready_timeout=30, workers=8):
+        self.client = client
+        self.service = service
+        self.project = project
+        self.ready_timeout = ready_timeout
+        self.workers = workers
+
+    def containers(self, all=False):
+        filters = {"label": [f"{SERVICE_LABEL}={self.service}", f"{PROJECT_LABEL}={self.project}"]}
+        if not all:
+            filters["status"] = "running"
+        return self.client.containers.list(all=all, filters=filters)
+
+    @staticmethod
+    def number(container):
+        try:
+            return int(container.labels.get(NUMBER_LABEL, 0))
+        except ValueError:
+            return 0
+
+    def create(self, template, number):
+        attrs = template.attrs
+        config, host = attrs["Config"], attrs["HostConfig"]
+        networks = list(attrs["NetworkSettings"]["Networks"])
+        labels = {**config.get("Labels", {}), NUMBER_LABEL: str(number)}
+
+        container = self.client.containers.create(
+            config["Image"],
+            command=config.get("Cmd"),
+            entrypoint=config.get("Entrypoint"),
+            environment=config.get("Env"),
+            labels=labels,
+            name=f"{self.project}-{self.service}-{number}",
+            ports=host.get("PortBindings") or None,     # Host port ranges like 8080-8090 are allocated by the daemon
+            volumes=host.get("Binds") or None,
+            restart_policy=host.get("RestartPolicy") or None,
+            network=networks[0] if networks else None,
+            networking_config={networks[0]: self.client.api.create_endpoint_config(aliases=[self.service])} if networks else None,
+            detach=True,
+        )
+        for network in networks[1:]:
+            self.client.networks.get(network).connect(container, aliases=[self.service])
+        return container
+
+    def wait_ready(self, container, started):
+        """Seconds from `started` until the container runs (and is healthy, if it has a healthcheck)"""
+        deadline = started + self.ready_timeout
+        while True:
+            container.reload()
+            state = container.attrs["State"]
+            health = state.get("Health", {}).get("Status")
+            if state.get("Status") == "running" and health in (None, "healthy"):
+                return time.perf_counter() - started
+            if state.get("Status") in ("exited", "dead") or health == "unhealthy":
+                raise RuntimeError(f"{container.name} failed to start ({state.get('Status')}, {health})")
+            if time.perf_counter() >= deadline:
+                raise TimeoutError(f"{container.name} not ready after {self.ready_timeout}s")
+            time.sleep(0.1)
+
+    def start(self, container):
+        started = time.perf_counter()
+        container.start()
+        return self.wait_ready(container, started)
+
+    def stop(self, container):
+        started = time.perf_counter()
+        container.stop(timeout=10)
+        container.remove()
+        return time.perf_counter() - started
+
+    def scale(self, target):
+        """
+        Brings the service to `target` running replicas. Returns a report with the per-container
+        and total latency in ms. Raises NoTemplate when there is nothing to clone
+        """
+        started = time.perf_counter()
+        running = sorted(self.containers(), key=self.number)
+        report = {"backend": "docker-sdk", "from": len(running), "to": target, "started": [], "stopped": []}
+
+        if target > len(running):
+            missing = target - len(running)
+            everything = self.containers(all=True)
+            # Stopped replicas are restarted before new ones are created
+            jobs = [c for c in everything if c.status != "running"][:missing]
+            if len(jobs) < missing:
+                template = running[0] if running else (everything[0] if everything else None)
+                if template is None:
+                    raise NoTemplate(f"no {self.service} container to clone")
+                numbers = [self.number(c) for c in everything]
+                first = max(numbers, default=0) + 1
+                jobs += [self.create(template, number) for number in range(first, first + missing - len(jobs))]
+            action, containers = self.start, jobs
+        elif target < len(running):
+            action, containers = self.stop, running[target:]    # Newest replicas go first
+        else:
+            action, containers = None, []
+
+        if containers:
+            with ThreadPoolExecutor(min(self.workers, len(containers))) as pool:
+                latencies = list(pool.map(action, containers))
+            key = "started" if action == self.start else "stopped"
+            report[key] = [{"name": c.name, "ms": round(s * 1000, 1)} for c, s in zip(containers, latencies)]
+
+        report["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return report
@@ -0,0 +1,30 @@
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the visual shape of y(x).
+    First and last points are always kept, each bucket in between keeps the point forming the largest
+    triangle with the previous pick and the next bucket's average. Per bucket work is vectorized
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+
+    # threshold - 2 buckets over the points between first and last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        low, high = edges[i], edges[i + 1]
+        next_low, next_high = high, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_low:next_high].mean(), y[next_low:next_high].mean()
+
+        area = np.abs((x[previous] - avg_x) * (y[low:high] - y[previous]) - (x[previous] - x[low:high]) * (avg_y - y[previous]))
+        previous = low + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
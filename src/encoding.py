@@ -0,0 +1,125 @@
+import gzip
+
+import numpy as np
+import orjson
+
+# Optional encoders, a format is only offered when its library is installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON = "application/json"
+COLUMNAR = "application/vnd.sysmon.columnar+json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# ?format= values, they override the Accept header (handy in a browser or curl)
+FORMATS = {"rows": JSON, "columnar": COLUMNAR, "msgpack": MSGPACK, "arrow": ARROW}
+ALIASES = {"application/x-msgpack": MSGPACK, "application/vnd.apache.arrow.file": ARROW}
+COMPRESS_MIN_BYTES = 1024   # Below this compression costs more than it saves
+
+class NotAcceptable(Exception):
+    pass
+
+def available(media_type):
+    if media_type == MSGPACK:
+        return msgpack is not None
+    if media_type == ARROW:
+        return pa is not None
+    return media_type in (JSON, COLUMNAR)
+
+def negotiate(accept=None, format=None):
+    """
+    Picks the response media type: ?format= when given, otherwise the supported type with the
+    highest q in Accept. Plain JSON rows when nothing specific is asked for
+    """
+    if format:
+        media_type = FORMATS.get(format)
+        if media_type is None:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        if not available(media_type):
+            raise NotAcceptable(f"format '{format}' is not available on this server")
+        return media_type
+
+    offers = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        media_type = ALIASES.get(media_type, media_type)
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0 and available(media_type):
+            offers.append((-q, position, media_type))
+    return min(offers)[2] if offers else JSON
+
+def epoch_ms(timestamps):
+    """ISO strings (or datetimes) -> int64 epoch milliseconds, parsed by numpy in one go"""
+    return np.array([str(t) for t in timestamps], dtype="datetime64[ms]").astype(np.int64)
+
+def to_columns(rows):
+    """
+    [{"a": 1, "b": 2}, {"a": 3, "b": 4}] -> {"a": [1, 3], "b": [2, 4]}. Timestamps become epoch ms
+    """
+    if not rows:
+        return {}
+    columns = {key: [row[key] for row in rows] for key in rows[0]}
+    if "timestamp" in columns:
+        columns["timestamp"] = epoch_ms(columns["timestamp"])
+    return columns
+
+def plain(value):
+    """numpy arrays -> lists, for encoders that don't know numpy"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    return value
+
+def arrow_stream(payload):
+    """
+    Arrow IPC stream of payload["data"] (columns), the other keys travel as schema metadata
+    """
+    table = pa.table({key: pa.array(column, from_pandas=True) for key, column in payload["data"].items()})
+    meta = {key: orjson.dumps(value) for key, value in payload.items() if key != "data"}
+    table = table.replace_schema_metadata(meta)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def encode(payload, media_type):
+    """
+    Serializes a response payload. Columnar types expect payload["data"] as {field: array}
+    """
+    if media_type == MSGPACK:
+        return msgpack.packb(plain(payload))
+    if media_type == ARROW:
+        return arrow_stream(payload)
+    # NaN (missing values in float columns) comes out as null
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def compress(body, accept_encoding=None):
+    """
+    Returns (body, content encoding or None). Brotli when the client takes it and it is installed, else gzip
+    """
+    if len(body) < COMPRESS_MIN_BYTES or not accept_encoding:
+        return body, None
+    encodings = {part.split(";")[0].strip() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in encodings:
+        return brotli.compress(body, quality=4), "br"
+    if "gzip" in encodings:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
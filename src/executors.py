@@ -0,0 +1,21 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# One bounded pool per kind of blocking work, so a slow LLM call or model inference
+# can't take the threads /metrics needs. DB threads match the connection pool size
+DB = ThreadPoolExecutor(max_workers=int(os.getenv("API_DB_THREADS", os.getenv("POSTGRES_POOL_MAX", "10"))), thread_name_prefix="api-db")
+MODEL = ThreadPoolExecutor(max_workers=int(os.getenv("API_MODEL_THREADS", "2")), thread_name_prefix="api-model")
+LLM = ThreadPoolExecutor(max_workers=int(os.getenv("API_LLM_THREADS", "4")), thread_name_prefix="api-llm")
+
+async def run_in(executor, fn, *args, timeout=None, **kwargs):
+    """
+    Awaits a blocking call on the given executor. With a timeout the caller gets
+    asyncio.TimeoutError, the thread itself finishes in the background
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+    if timeout is None:
+        return await future
+    return await asyncio.wait_for(future, timeout)
@@ -0,0 +1,130 @@
+import numpy as np
+
+TARGETS = ["cpu", "memory", "network"]
+
+class RingBuffer:
+    """
+    Fixed-size window of the newest samples in one numpy array. append() is O(1),
+    view() returns the samples oldest-first
+    """
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, width))
+        self.start = 0      # Index of the oldest sample
+        self.size = 0
+
+    def append(self, row):
+        index = (self.start + self.size) % self.capacity
+        self.data[index] = row
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def last(self):
+        if not self.size:
+            return None
+        return self.data[(self.start + self.size - 1) % self.capacity]
+
+    def view(self, last=None):
+        count = self.size if last is None else min(last, self.size)
+        first = (self.start + self.size - count) % self.capacity
+        if first + count <= self.capacity:
+            return self.data[first:first + count]
+        return np.concatenate((self.data[first:], self.data[:first + count - self.capacity]))
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+class FeatureEngine:
+    """
+    Keeps the newest samples in a ring buffer and turns them into model features with numpy:
+    lags, rolling means over several windows, rolling std, velocity, an EWMA that is updated
+    incrementally on append, and time of day as sin/cos.
+    Buffer columns: timestamp (epoch seconds), one raw column per target, one EWMA column per target
+    """
+    LAGS = (1, 2, 3, 5, 10)
+    WINDOWS = (5, 15, 60)
+    STD_WINDOW = 15
+    ALPHA = 0.3
+    DAY = 86400
+
+    def __init__(self, capacity=720, targets=TARGETS):
+        self.targets = list(targets)
+        self.buffer = RingBuffer(capacity, 1 + 2 * len(self.targets))
+        self.lookback = max(max(self.LAGS), max(self.WINDOWS))   # Samples needed before the first full row
+
+    @property
+    def names(self):
+        return (
+            ["value"] + [f"lag_{lag}" for lag in self.LAGS] + [f"mean_{w}" for w in self.WINDOWS]
+            + [f"std_{self.STD_WINDOW}", "ewma", "velocity", "tod_sin", "tod_cos"]
+        )
+
+    def append(self, timestamp, values):
+        values = np.asarray(values, dtype=float)
+        previous = self.buffer.last()
+        if previous is None:
+            ewma = values
+        else:
+            ewma = self.ALPHA * values + (1 - self.ALPHA) * previous[1 + len(self.targets):]
+        self.buffer.append(np.concatenate(([timestamp], values, ewma)))
+
+    def last_timestamp(self):
+        last = self.buffer.last()
+        return None if last is None else last[0]
+
+    def interval(self, data=None):
+        """Median sampling period in seconds"""
+        data = self.buffer.view() if data is None else data
+        if len(data) < 2:
+            return 1.0
+        return float(np.median(np.diff(data[:, 0]))) or 1.0
+
+    def covers_day(self, data=None):
+        data = self.buffer.view() if data is None else data
+        return len(data) > 1 and data[-1, 0] - data[0, 0] >= self.DAY
+
+    def matrix(self, target, data=None, time_of_day=True):
+        """
+        Feature rows for every sample that has a full lookback, all columns at once.
+        Returns (X, positions) where positions index into `data`.
+        time_of_day=False zeroes the sin/cos columns: trained on less than a day of history
+        they only act as a time index and the models overfit to it
+        """
+        data = self.buffer.view() if data is None else data
+        index = self.targets.index(target)
+        x = data[:, 1 + index]
+        if len(x) <= self.lookback:
+            return np.empty((0, len(self.names))), np.empty(0, dtype=int)
+
+        rows = np.arange(self.lookback, len(x))
+        sums = np.concatenate(([0.0], np.cumsum(x)))
+        squares = np.concatenate(([0.0], np.cumsum(x * x)))
+
+        columns = [x[rows]]
+        columns += [x[rows - lag] for lag in self.LAGS]
+        columns += [(sums[rows + 1] - sums[rows + 1 - w]) / w for w in self.WINDOWS]
+
+        w = self.STD_WINDOW
+        mean = (sums[rows + 1] - sums[rows + 1 - w]) / w
+        variance = (squares[rows + 1] - squares[rows + 1 - w]) / w - mean * mean
+        columns.append(np.sqrt(np.maximum(variance, 0)))
+
+        columns.append(data[rows, 1 + len(self.targets) + index])
+        columns.append(x[rows] - x[rows - 1])
+
+        if time_of_day:
+            phase = 2 * np.pi * (data[rows, 0] % self.DAY) / self.DAY
+            columns += [np.sin(phase), np.cos(phase)]
+        else:
+            columns += [np.zeros(len(rows)), np.zeros(len(rows))]
+        return np.column_stack(columns), rows
+
+    def latest(self, target, time_of_day=True):
+        """
+        Feature row for the newest sample only, computed over just the lookback tail
+        """
+        X, _ = self.matrix(target, self.buffer.view(self.lookback + 1), time_of_day)
+        return X[-1:] if len(X) else None
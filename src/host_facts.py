@@ -0,0 +1,124 @@
+import os
+import platform
+import socket
+import threading
+import time
+
+import psutil
+
+from src.cache import TTLCache
+
+GB = 1024 ** 3
+
+class HostFacts:
+    """
+    Facts about the machine this process runs on, shared by /system and the RAG agent.
+    Static facts are read once per process, disk usage is cached for `disk_ttl` seconds, and the
+    primary interface is only re-detected when the interface list changes or after `interface_ttl`
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, disk_ttl=30.0, interface_ttl=300.0, change_check=10.0):
+        self.disk_ttl = disk_ttl
+        self.interface_ttl = interface_ttl
+        self.change_check = change_check    # How often the (cheap) interface list is compared
+        self.cache = TTLCache(max_size=16)
+        self.interface_signature = None
+        self.checked_at = 0.0
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(
+                    disk_ttl = float(os.getenv("HOST_FACTS_DISK_TTL", "30")),
+                    interface_ttl = float(os.getenv("HOST_FACTS_INTERFACE_TTL", "300")),
+                )
+            return cls._shared
+
+    def invalidate(self):
+        self.cache.invalidate()
+        self.interface_signature = None
+
+    def static(self):
+        """Hostname, OS, CPU and RAM size, these don't change while the process runs"""
+        return self.cache.get_or_compute("static", self._read_static)[0]
+
+    def _read_static(self):
+        system_os = platform.system()
+        disk_path = '/'
+        if system_os == 'Windows':
+            disk_path = 'C:\\'
+        elif system_os == 'Darwin' and os.path.exists('/System/Volumes/Data'):
+            disk_path = '/System/Volumes/Data'
+
+        return {
+            "hostname": platform.node(),
+            "os": f"{system_os} {platform.release()}",
+            "cpu_arch": platform.machine(),
+            "cpu_cores": psutil.cpu_count(logical=True),
+            "ram_total": round(psutil.virtual_memory().total / GB, 2),
+            "python_version": platform.python_version(),
+            "disk_path": disk_path,
+        }
+
+    def disk(self):
+        return self.cache.get_or_compute("disk", self._read_disk, ttl=self.disk_ttl)[0]
+
+    def _read_disk(self):
+        disk_path = self.static()["disk_path"]
+        try:
+            disk_info = psutil.disk_usage(disk_path)
+        except OSError:
+            print(f"Disk check failed for {disk_path}, falling back to current directory")
+            disk_info = psutil.disk_usage('.')
+        return {
+            "disk_total": round(disk_info.total / GB, 2),
+            "disk_used": round(disk_info.used / GB, 2),
+        }
+
+    def _signature(self):
+        """IPv4 addresses per interface, changes when a link comes up/down or gets a new address"""
+        return tuple(sorted(
+            (name, tuple(sorted(addr.address for addr in addrs if addr.family == socket.AF_INET)))
+            for name, addrs in psutil.net_if_addrs().items()
+        ))
+
+    def interface(self):
+        now = time.monotonic()
+        if now - self.checked_at >= self.change_check:
+            self.checked_at = now
+            signature = self._signature()
+            if signature != self.interface_signature:
+                self.interface_signature = signature
+                self.cache.invalidate("interface")
+        return self.cache.get_or_compute("interface", self._detect_interface, ttl=self.interface_ttl)[0]
+
+    def _detect_interface(self):
+        """Finds the active network interface and IP address"""
+        addresses = {
+            addr.address: name
+            for name, addrs in psutil.net_if_addrs().items()
+            for addr in addrs if addr.family == socket.AF_INET
+        }
+        try:
+            # UDP connect sends nothing, it only asks the kernel which source address routes to the internet
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.connect(("8.8.8.8", 80))
+                primary_ip = sock.getsockname()[0]
+            if primary_ip in addresses:
+                return f"{addresses[primary_ip]} - {primary_ip}"
+        except OSError:
+            pass    # No default route (offline / air-gapped), pick a local interface instead
+
+        stats = psutil.net_if_stats()
+        for ip, name in addresses.items():
+            if not ip.startswith("127.") and getattr(stats.get(name), "isup", False):
+                return f"{name} - {ip}"
+        return "No active network interface"
+
+    def system_info(self):
+        """The /system payload"""
+        static = {key: value for key, value in self.static().items() if key != "disk_path"}
+        return {**static, **self.disk(), "net_interface": self.interface()}
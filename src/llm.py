@@ -0,0 +1,79 @@
+import os
+import time
+
+import google.generativeai as genai
+
+
+class GeminiLLM:
+    """Google Gemini, generate() returns the whole answer, stream() yields it as the model writes it"""
+    def __init__(self, api_key, model_name="gemini-2.5-flash", timeout=30.0):
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.timeout = timeout
+        self.name = model_name
+
+    def generate(self, prompt):
+        response = self.model.generate_content(prompt, request_options={"timeout": self.timeout})
+        return response.text
+
+    def stream(self, prompt):
+        response = self.model.generate_content(prompt, stream=True, request_options={"timeout": self.timeout})
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue    # Chunk without text parts, e.g. only the finish reason
+            if text:
+                yield text
+
+class FakeLLM:
+    """
+    Offline stand-in for tests and load runs. Answers `reply` (a string, or a function of the prompt) after
+    `latency` seconds, streamed in `chunk_size` character pieces `chunk_delay` seconds apart.
+    Prompts it was asked are kept in `prompts`
+    """
+    def __init__(self, reply="All systems nominal.", latency=0.0, chunk_size=16, chunk_delay=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.name = "fake"
+        self.prompts = []
+
+    def answer(self, prompt):
+        self.prompts.append(prompt)
+        time.sleep(self.latency)
+        return self.reply(prompt) if callable(self.reply) else self.reply
+
+    def generate(self, prompt):
+        return "".join(self.stream(prompt))
+
+    def stream(self, prompt):
+        text = self.answer(prompt)
+        for i in range(0, len(text), self.chunk_size):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield text[i:i + self.chunk_size]
+
+def from_env(timeout=30.0):
+    """
+    The model backend picked by LLM_BACKEND: gemini (default, needs GEMINI_API_KEY) or fake
+    (FAKE_LLM_REPLY, FAKE_LLM_LATENCY, FAKE_LLM_CHUNK_DELAY). None when Gemini can't be set up
+    """
+    backend = os.getenv("LLM_BACKEND", "gemini").lower()
+    if backend == "fake":
+        return FakeLLM(
+            reply = os.getenv("FAKE_LLM_REPLY", "All systems nominal."),
+            latency = float(os.getenv("FAKE_LLM_LATENCY", "0")),
+            chunk_delay = float(os.getenv("FAKE_LLM_CHUNK_DELAY", "0")),
+        )
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("!!! No Gemini API Key found is .env !!!")
+        return None
+    try:
+        return GeminiLLM(api_key, timeout=timeout)
+    except Exception as e:     # noqa: BLE001 The Gemini SDK raises its own errors
+        print(f"Error configuring Gemini: {e}")
+        return None
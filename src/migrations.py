@@ -0,0 +1,355 @@
+"""
+Versioned schema migrations. Each one runs once per database, in order, and is recorded in
+schema_migrations together with how long it took. Every DatabaseManager process applies what is
+pending on startup (DB_AUTO_MIGRATE=0 turns that off), or run them on their own before a deploy:
+
+    python -m src.migrations            # apply pending migrations
+    python -m src.migrations --status   # list applied and pending ones
+
+New schema changes go at the end of MIGRATIONS with the next version number, never edit one that shipped.
+Each migration spells out its own columns and SQL instead of reading the current layout from src.database,
+so a shipped one keeps creating exactly what it did. The first migrations use IF NOT EXISTS / layout checks,
+so databases created before schema_migrations existed are adopted as they are
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from psycopg2 import sql
+
+# Layout of migration 1, as shipped. A rollup field added later is a new migration, not an edit here
+V1_LOCAL_HOST = "local"
+# (rollup column prefix, raw column)
+V1_ROLLUP_FIELDS = [("cpu", "cpu_usage"), ("memory", "memory_usage"), ("disk", "disk_usage"), ("network", "network_mbps")]
+# (table, date_trunc unit)
+V1_ROLLUPS = [("system_metrics_1h", "hour"), ("system_metrics_1m", "minute")]
+
+VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        ms REAL
+    )
+"""
+
+def metrics_table_kind(cursor):
+    """'p' partitioned, 'r' plain (legacy) table, None if missing"""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('system_metrics')")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def create_metrics_table(cursor):
+    """
+    Daily range partitions on timestamp. The default partition catches rows for days
+    that have no partition yet, run_maintenance() moves them out
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS system_metrics(
+            id BIGSERIAL,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            cpu_usage REAL,
+            memory_usage REAL,
+            disk_usage REAL,
+            network_mbps REAL,
+            PRIMARY KEY (timestamp, id)     -- Doubles as the time index for ORDER BY / range scans
+        ) PARTITION BY RANGE (timestamp);
+    """)
+    cursor.execute("CREATE TABLE IF NOT EXISTS system_metrics_default PARTITION OF system_metrics DEFAULT")
+
+def create_hosts_table(cursor):
+    """
+    One row per agent. Labels live here, not on every sample, samples only carry the integer id.
+    Returns the id of the 'local' host that pre-multi-host rows are assigned to
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS metric_hosts (
+            id SERIAL PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            labels JSONB NOT NULL DEFAULT '{}',
+            first_seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO metric_hosts AS h (name) VALUES (%s)
+        ON CONFLICT (name) DO UPDATE SET name = h.name
+        RETURNING id
+    """, (V1_LOCAL_HOST,))
+    return cursor.fetchone()[0]
+
+def add_host_column(cursor, local_id):
+    """host_id on raw samples. A constant default is a catalog-only change, no table rewrite"""
+    cursor.execute(f"ALTER TABLE system_metrics ADD COLUMN IF NOT EXISTS host_id INTEGER NOT NULL DEFAULT {int(local_id)}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS system_metrics_host_time_idx ON system_metrics (host_id, timestamp DESC)")
+
+def create_day_partition(cursor, day, parent="system_metrics"):
+    """The partition of `parent` for one day, taking over rows the default partition already holds for it"""
+    name = f"{parent}_p{day:%Y%m%d}"
+    cursor.execute("SELECT to_regclass(%s)", (name,))
+    if cursor.fetchone()[0]:
+        return
+    start, end = day, day + timedelta(days=1)
+    table, parent_table = sql.Identifier(name), sql.Identifier(parent)
+    cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(table, parent_table))
+    cursor.execute(sql.SQL("""
+        WITH moved AS (
+            DELETE FROM {} WHERE timestamp >= %s AND timestamp < %s RETURNING *
+        )
+        INSERT INTO {} SELECT * FROM moved
+    """).format(sql.Identifier(f"{parent}_default"), table), (start, end))
+    cursor.execute(
+        sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(parent_table, table),
+        (start, end)
+    )
+
+def backfill_rollup(cursor, table, unit):
+    """Fills a new rollup table from the raw samples, one bucket per host and `unit`"""
+    columns = ", ".join(f"{name}_sum, {name}_min, {name}_max" for name, _ in V1_ROLLUP_FIELDS)
+    aggregates = ", ".join(f"SUM({raw}::float8), MIN({raw}), MAX({raw})" for _, raw in V1_ROLLUP_FIELDS)
+    cursor.execute(f"""
+        INSERT INTO {table} (host_id, bucket, samples, {columns})
+        SELECT host_id, date_trunc('{unit}', timestamp), COUNT(*), {aggregates}
+        FROM system_metrics
+        GROUP BY 1, 2
+    """)
+
+def create_rollup_tables(cursor, local_id):
+    """
+    1-minute and 1-hour buckets per host, backfilled from raw data the first time they are created.
+    Single-host rollups from before host_id existed are re-keyed onto the 'local' host
+    """
+    columns = ", ".join(f"{name}_sum DOUBLE PRECISION, {name}_min REAL, {name}_max REAL" for name, _ in V1_ROLLUP_FIELDS)
+    for table, unit in V1_ROLLUPS:
+        cursor.execute("SELECT to_regclass(%s)", (table,))
+        if not cursor.fetchone()[0]:
+            cursor.execute(f"""
+                CREATE TABLE {table} (
+                    host_id INTEGER NOT NULL,
+                    bucket TIMESTAMP NOT NULL,
+                    samples INTEGER NOT NULL,
+                    {columns},
+                    PRIMARY KEY (host_id, bucket)
+                )
+            """)
+            backfill_rollup(cursor, table, unit)
+        else:
+            cursor.execute("SELECT 1 FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'host_id'", (table,))
+            if not cursor.fetchone():
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN host_id INTEGER NOT NULL DEFAULT {int(local_id)}")
+                cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_pkey")
+                cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (host_id, bucket)")
+        # Fleet-wide queries filter on time only
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_bucket_idx ON {table} (bucket)")
+
+def create_series_tables(cursor):
+    """
+    Narrow storage for the detail collectors (per core, per NIC, per disk, per process...).
+    metric_series maps (host, name, labels) to a small id once, metric_samples is just
+    (timestamp, series_id, value), so a new core or disk is a new row, never a new column
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS metric_series (
+            id SERIAL PRIMARY KEY,
+            host_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            labels JSONB NOT NULL DEFAULT '{}',
+            UNIQUE (host_id, name, labels)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS metric_samples (
+            timestamp TIMESTAMP NOT NULL,
+            series_id INTEGER NOT NULL,
+            value REAL
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    cursor.execute("CREATE TABLE IF NOT EXISTS metric_samples_default PARTITION OF metric_samples DEFAULT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS metric_samples_series_time_idx ON metric_samples (series_id, timestamp DESC)")
+    create_day_partition(cursor, date.today(), "metric_samples")
+
+def migrate_legacy_metrics(cursor):
+    """
+    One-time move of a pre-partitioning system_metrics table into the partitioned layout.
+    Runs in the migration's transaction, a failure leaves the old table untouched
+    """
+    print("Migrating system_metrics to daily partitions...")
+    cursor.execute("ALTER TABLE system_metrics RENAME TO system_metrics_legacy")
+    cursor.execute("ALTER INDEX IF EXISTS system_metrics_pkey RENAME TO system_metrics_legacy_pkey")
+    cursor.execute("ALTER SEQUENCE IF EXISTS system_metrics_id_seq RENAME TO system_metrics_legacy_id_seq")
+    create_metrics_table(cursor)
+
+    cursor.execute("SELECT DISTINCT timestamp::date FROM system_metrics_legacy WHERE timestamp IS NOT NULL")
+    days = [row[0] for row in cursor.fetchall()]
+    for day in days + [date.today()]:
+        create_day_partition(cursor, day)
+
+    cursor.execute("""
+        INSERT INTO system_metrics (id, timestamp, cpu_usage, memory_usage, disk_usage, network_mbps)
+        SELECT id, timestamp, cpu_usage, memory_usage, disk_usage, network_mbps
+        FROM system_metrics_legacy
+        WHERE timestamp IS NOT NULL
+    """)
+    moved = cursor.rowcount
+    cursor.execute("""
+        SELECT setval(pg_get_serial_sequence('system_metrics', 'id'),
+                      COALESCE((SELECT MAX(id) FROM system_metrics), 0) + 1, false)
+    """)
+    cursor.execute("DROP TABLE system_metrics_legacy")
+    print(f"Migrated {moved} rows into {len(days)} daily partitions")
+
+def metrics_layout(db, cursor):
+    """Partitioned raw samples, hosts, per-host rollups and detail series, converting older layouts in place"""
+    local_id = create_hosts_table(cursor)
+    kind = metrics_table_kind(cursor)
+    if kind == "r":
+        migrate_legacy_metrics(cursor)
+    elif kind is None:
+        create_metrics_table(cursor)
+        create_day_partition(cursor, date.today())
+    add_host_column(cursor, local_id)
+    create_rollup_tables(cursor, local_id)
+    create_series_tables(cursor)
+
+def system_config(db, cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS system_config (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+    cursor.execute("""
+        INSERT INTO system_config (key, value)
+        VALUES ('scaling_mode', 'auto')
+        ON CONFLICT (key) DO NOTHING;
+    """)
+
+def scale_leases(db, cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scale_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at TIMESTAMPTZ NOT NULL
+        );
+    """)
+
+def scale_history(db, cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scale_history (
+            id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            action TEXT NOT NULL,
+            steps INT NOT NULL,
+            status TEXT NOT NULL,
+            replicas_from INT,
+            replicas_to INT,
+            submitted_at TIMESTAMPTZ NOT NULL,
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            queue_ms REAL,
+            run_ms REAL,
+            total_ms REAL,
+            report JSONB,
+            error TEXT
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS scale_history_submitted_idx ON scale_history (submitted_at DESC)")
+
+# (version, name, fn(db, cursor)), append only
+MIGRATIONS = [
+    (1, "metrics layout: partitions, hosts, rollups, detail series", metrics_layout),
+    (2, "system_config", system_config),
+    (3, "scale_leases", scale_leases),
+    (4, "scale_history", scale_history),
+]
+
+def applied_versions(cursor):
+    cursor.execute("SELECT to_regclass('schema_migrations')")
+    if cursor.fetchone()[0] is None:
+        return set()
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def pending(db):
+    """Migrations not applied yet, None if the DB is unreachable"""
+    with db.get_connection() as connection:
+        if not connection:
+            return None
+        try:
+            with connection.cursor() as cursor:
+                done = applied_versions(cursor)
+            return [migration for migration in MIGRATIONS if migration[0] not in done]
+        finally:
+            connection.rollback()
+
+def migrate(db):
+    """
+    Applies pending migrations in order, in one transaction. Returns the versions applied ([] when up to date,
+    two catalog reads and no DDL), None if the DB is unreachable or a migration failed and was rolled back
+    """
+    with db.get_connection() as connection:
+        if not connection:
+            return None
+        applied = []
+        try:
+            with connection.cursor() as cursor:
+                done = applied_versions(cursor)
+                if all(version in done for version, _, _ in MIGRATIONS):
+                    connection.rollback()
+                    return applied
+                # Serialize with other processes starting up, one of them may have migrated while we waited
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+                cursor.execute(VERSION_TABLE)
+                done = applied_versions(cursor)
+                for version, name, step in MIGRATIONS:
+                    if version in done:
+                        continue
+                    started = time.perf_counter()
+                    step(db, cursor)
+                    ms = round((time.perf_counter() - started) * 1000, 1)
+                    cursor.execute("INSERT INTO schema_migrations (version, name, ms) VALUES (%s, %s, %s)", (version, name, ms))
+                    applied.append(version)
+                    print(f"Applied migration {version}: {name} ({ms} ms)")
+            connection.commit()
+            return applied
+        except Exception as e:     # noqa: BLE001 Any failure rolls back every migration of this run
+            connection.rollback()
+            print(f"Migration failed, nothing applied: {e}")
+            return None
+
+def status(db):
+    """[(version, name, applied_at or None)] for every known migration"""
+    with db.get_connection() as connection:
+        if not connection:
+            return None
+        try:
+            with connection.cursor() as cursor:
+                applied = {}
+                if applied_versions(cursor):
+                    cursor.execute("SELECT version, applied_at FROM schema_migrations")
+                    applied = dict(cursor.fetchall())
+            return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
+        finally:
+            connection.rollback()
+
+def main():
+    from src.database import DatabaseManager
+    parser = argparse.ArgumentParser(description="Apply or list schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    args = parser.parse_args()
+
+    db = DatabaseManager(auto_migrate=False)
+    if args.status:
+        rows = status(db)
+        if rows is None:
+            raise SystemExit("Database unreachable")
+        for version, name, applied_at in rows:
+            print(f"{version:>4}  {applied_at.isoformat() if applied_at else 'pending':<32}  {name}")
+        return
+    applied = migrate(db)
+    if applied is None:
+        raise SystemExit("Migration failed")
+    print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,386 @@
+import os
+import platform
 import psutil
+import signal
+import threading
 import time
-from src.database import DatabaseManager
+from collections import deque
+from datetime import UTC, datetime
+from src.database import DatabaseManager, parse_labels
+
+class MetricBuffer:
+    """
+    Write-behind buffer: samples queue up in memory and go to the DB in bulk,
+    when `batch_size` samples are waiting or every `flush_interval` seconds
+    """
+    def __init__(self, db, host=None, batch_size=100, flush_interval=5.0, max_size=10000, drop_policy="oldest",
+                 method="save_metrics"):
+        self.db = db
+        self.host = host
+        self.save = getattr(db, method)     # save_metrics for core samples, save_samples for detail series
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.drop_policy = drop_policy   # "oldest" keeps the latest data, "newest" keeps the backlog intact
+
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+        self.failures = 0   # Consecutive failed flushes, drives the retry backoff
+        self.dropped = 0
+        self.flushed = 0
+
+    def add(self, sample):
+        """Queues one sample, never blocks the caller. When the buffer is full one sample gets dropped"""
+        with self.lock:
+            if len(self.pending) >= self.max_size:
+                self.dropped += 1
+                if self.dropped % 100 == 1:
+                    print(f"Metric buffer full ({self.max_size}), DB unreachable? Dropped {self.dropped} samples so far")
+                if self.drop_policy == "newest":
+                    return
+                self.pending.popleft()
+            self.pending.append(sample)
+            full_batch = len(self.pending) >= self.batch_size
+
+        if full_batch:
+            self.wakeup.set()
+
+    def flush(self):
+        """
+        Writes everything pending in batches. On failure the batch goes back in front of the queue
+        Returns False if the DB refused a batch
+        """
+        with self.flush_lock:
+            while True:
+                with self.lock:
+                    batch = [self.pending.popleft() for _ in range(min(len(self.pending), 1000))]
+                if not batch:
+                    return True
+
+                if not self.save(batch, host=self.host):
+                    with self.lock:
+                        self.pending.extendleft(reversed(batch))
+                        overflow = len(self.pending) - self.max_size
+                        if overflow > 0:
+                            # Samples that arrived while we were writing pushed us over the limit
+                            self.dropped += overflow
+                            for _ in range(overflow):
+                                if self.drop_policy == "newest":
+                                    self.pending.pop()
+                                else:
+                                    self.pending.popleft()
+                    return False
+                self.flushed += len(batch)
+
+    def run(self):
+        while not self.stopping.is_set():
+            # Back off while the DB is down: 5s, 10s, 20s... capped at 60s
+            delay = self.flush_interval if not self.failures else min(60, self.flush_interval * 2 ** self.failures)
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
+            if self.stopping.is_set():
+                break
+
+            if self.flush():
+                self.failures = 0
+            else:
+                self.failures += 1
+                print(f"Metric flush failed, {len(self.pending)} samples buffered. Retrying in {min(60, self.flush_interval * 2 ** self.failures)}s")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="metric-flusher", daemon=True)
+        self.thread.start()
+
+    def close(self, timeout=10):
+        """Stops the flusher and pushes whatever is left, retrying until `timeout` runs out"""
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+        deadline = time.monotonic() + timeout
+        while not self.flush():
+            if time.monotonic() >= deadline:
+                print(f"Final flush failed, lost {len(self.pending)} samples")
+                return False
+            time.sleep(1)
+        return True
+
+MB = 1024 * 1024
+
+class Collector:
+    """
+    Base for pluggable detail collectors. collect(elapsed) returns (metric, labels, value) triples,
+    `every` runs it on every Nth tick only. run() measures the CPU time each call costs
+    """
+    name = "collector"
+
+    def __init__(self, every=1):
+        self.every = every
+        self.base_every = every
+        self.runs = 0
+        self.cost = 0.0     # Moving average of CPU seconds per run
+        self.last_time = time.monotonic()
+
+    def collect(self, elapsed):
+        raise NotImplementedError
+
+    def run(self):
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        self.last_time = now
+
+        started = time.thread_time()
+        samples = self.collect(elapsed)
+        spent = time.thread_time() - started
+        self.cost = spent if not self.runs else 0.8 * self.cost + 0.2 * spent
+        self.runs += 1
+        return samples
+
+class CpuCoreCollector(Collector):
+    """Utilization of every logical CPU"""
+    name = "cpu_cores"
+
+    def collect(self, elapsed):
+        return [("cpu.core.percent", {"core": str(i)}, pct) for i, pct in enumerate(psutil.cpu_percent(percpu=True))]
+
+class LoadAverageCollector(Collector):
+    """1/5/15 minute load average"""
+    name = "load"
+
+    def collect(self, elapsed):
+        one, five, fifteen = psutil.getloadavg()
+        return [("load.1m", {}, one), ("load.5m", {}, five), ("load.15m", {}, fifteen)]
+
+class NetInterfaceCollector(Collector):
+    """Receive/transmit MB/s per network interface"""
+    name = "net_interfaces"
+
+    def __init__(self, every=1):
+        super().__init__(every)
+        self.last = psutil.net_io_counters(pernic=True)
+
+    def collect(self, elapsed):
+        current = psutil.net_io_counters(pernic=True)
+        samples = []
+        for nic, stats in current.items():
+            before = self.last.get(nic)
+            if before is None or nic == "lo" or elapsed <= 0:
+                continue
+            labels = {"interface": nic}
+            # max(0) because counters reset when an interface goes down/up
+            samples.append(("net.rx_mbps", labels, round(max(0, stats.bytes_recv - before.bytes_recv) / MB / elapsed, 4)))
+            samples.append(("net.tx_mbps", labels, round(max(0, stats.bytes_sent - before.bytes_sent) / MB / elapsed, 4)))
+        self.last = current
+        return samples
+
+class DiskIOCollector(Collector):
+    """Read/write throughput (MB/s) and IOPS per physical disk"""
+    name = "disk_io"
+    SKIP = ("loop", "ram", "zram")
+
+    def __init__(self, every=1):
+        super().__init__(every)
+        self.last = psutil.disk_io_counters(perdisk=True) or {}
+
+    def collect(self, elapsed):
+        current = psutil.disk_io_counters(perdisk=True) or {}   # Empty inside some containers
+        samples = []
+        for disk, stats in current.items():
+            before = self.last.get(disk)
+            if before is None or disk.startswith(self.SKIP) or elapsed <= 0:
+                continue
+            labels = {"disk": disk}
+            samples.append(("disk.read_mbps", labels, round(max(0, stats.read_bytes - before.read_bytes) / MB / elapsed, 4)))
+            samples.append(("disk.write_mbps", labels, round(max(0, stats.write_bytes - before.write_bytes) / MB / elapsed, 4)))
+            samples.append(("disk.read_iops", labels, round(max(0, stats.read_count - before.read_count) / elapsed, 2)))
+            samples.append(("disk.write_iops", labels, round(max(0, stats.write_count - before.write_count) / elapsed, 2)))
+        self.last = current
+        return samples
+
+class TopProcessCollector(Collector):
+    """
+    Top N process names by CPU and by resident memory. Grouped by name rather than pid
+    so the number of series stays bounded as processes come and go
+    """
+    name = "top_processes"
+
+    def __init__(self, every=5, top_n=5):
+        super().__init__(every)
+        self.top_n = top_n
+
+    def collect(self, elapsed):
+        usage = {}
+        # process_iter caches Process objects, so cpu_percent is measured since the previous run
+        for proc in psutil.process_iter(["name", "cpu_percent", "memory_info"]):
+            info = proc.info
+            name = info["name"] or "unknown"
+            cpu, rss = usage.get(name, (0.0, 0))
+            usage[name] = (cpu + (info["cpu_percent"] or 0.0), rss + (info["memory_info"].rss if info["memory_info"] else 0))
+
+        by_cpu = sorted(usage.items(), key=lambda item: item[1][0], reverse=True)[:self.top_n]
+        by_rss = sorted(usage.items(), key=lambda item: item[1][1], reverse=True)[:self.top_n]
+        samples = [("process.cpu_percent", {"process": name}, round(cpu, 2)) for name, (cpu, _) in by_cpu]
+        samples += [("process.rss_mb", {"process": name}, round(rss / MB, 2)) for name, (_, rss) in by_rss]
+        return samples
+
+COLLECTORS = {c.name: c for c in (CpuCoreCollector, LoadAverageCollector, NetInterfaceCollector, DiskIOCollector, TopProcessCollector)}
+DEFAULT_COLLECTORS = "cpu_cores,load,net_interfaces,disk_io,top_processes:5"
+
+def build_collectors(spec):
+    """
+    'cpu_cores,disk_io:2,top_processes:10' -> collector instances, ':N' runs one every N ticks.
+    'none' turns detail collection off
+    """
+    collectors = []
+    for item in (spec or "").split(","):
+        name, _, every = item.strip().partition(":")
+        if not name or name == "none":
+            continue
+        if name not in COLLECTORS:
+            print(f"Unknown collector '{name}', available: {', '.join(COLLECTORS)}")
+            continue
+        try:
+            collectors.append(COLLECTORS[name](every=int(every)) if every else COLLECTORS[name]())
+        except Exception as e:     # noqa: BLE001 Platform-specific collectors fail in their own ways
+            print(f"Collector {name} unavailable on this host: {e}")
+    return collectors
+
+class CollectorSet:
+    """
+    Runs the detail collectors on their ticks and keeps the whole agent under `cpu_budget`
+    (percent of one core). Over budget, the collector with the highest measured cost per tick
+    runs half as often. Well under budget, backed-off collectors speed up again
+    """
+    def __init__(self, collectors, interval, cpu_budget=1.0, max_every=60):
+        self.collectors = collectors
+        self.interval = interval
+        self.cpu_budget = cpu_budget
+        self.max_every = max_every
+        self.check_every = max(1, round(10 / interval))     # Re-check the budget about every 10s
+        self.process = psutil.Process()
+        self.process.cpu_percent()      # First call only primes the counter
+        self.agent_cpu = 0.0
+
+    def collect(self, tick):
+        samples = []
+        for collector in self.collectors:
+            if tick % collector.every == 0:
+                try:
+                    samples.extend(collector.run())
+                except Exception as e:     # noqa: BLE001 One failing collector must not stop the others
+                    print(f"Collector {collector.name} failed: {e}")
+        if tick and tick % self.check_every == 0:
+            self.enforce_budget(self.process.cpu_percent())
+        return samples
+
+    def enforce_budget(self, agent_cpu):
+        self.agent_cpu = agent_cpu
+        ran = [c for c in self.collectors if c.runs]
+        if agent_cpu > self.cpu_budget:
+            candidates = [c for c in ran if c.every < self.max_every]
+            if candidates:
+                worst = max(candidates, key=lambda c: c.cost / c.every)
+                worst.every = min(self.max_every, worst.every * 2)
+                print(f"Agent CPU {agent_cpu:.2f}% over budget ({self.cpu_budget}%), {worst.name} now every {worst.every} ticks")
+        elif agent_cpu < self.cpu_budget / 2:
+            slowed = [c for c in ran if c.every > c.base_every]
+            if slowed:
+                cheapest = min(slowed, key=lambda c: c.cost / c.every)
+                cheapest.every = max(cheapest.base_every, cheapest.every // 2)
+
+    def stats(self):
+        return {
+            "agent_cpu_percent": round(self.agent_cpu, 3),
+            "cpu_budget_percent": self.cpu_budget,
+            "collectors": {
+                c.name: {"every": c.every, "runs": c.runs, "cost_ms": round(c.cost * 1000, 3)}
+                for c in self.collectors
+            }
+        }
+
+class Ticker:
+    """
+    Fixed-rate schedule on the monotonic clock. Tick k is due at start + k * interval, so time spent
+    collecting never adds up into drift. Ticks missed entirely (suspend, stalls) are skipped, not burst
+    """
+    MIN_INTERVAL = 0.1
+
+    def __init__(self, interval):
+        self.interval = max(self.MIN_INTERVAL, interval)
+        self.next_tick = None
+        self.missed = 0
+
+    def wait(self):
+        """Sleeps until the next tick is due and returns its scheduled (monotonic) time"""
+        now = time.monotonic()
+        if self.next_tick is None:
+            self.next_tick = now + self.interval
+
+        delay = self.next_tick - now
+        if delay > 0:
+            time.sleep(delay)
+        elif -delay >= self.interval:
+            skipped = int(-delay // self.interval)
+            self.missed += skipped
+            self.next_tick += skipped * self.interval
+
+        due = self.next_tick
+        self.next_tick += self.interval
+        return due
 
 class SystemMonitor:
     def __init__(self):
         print("System Monitor starting...")
         self.db = DatabaseManager()
+        # Node name in k8s (see monitor-deployment.yaml), hostname otherwise
+        self.host = os.getenv("MONITOR_HOST") or platform.node()
+        self.labels = parse_labels(os.getenv("MONITOR_LABELS", ""))
+        self.db.register_host(self.host, self.labels)
         self.last_net = psutil.net_io_counters()
-        self.last_time = time.time()
-    
+        self.last_time = time.monotonic()
+        self.ticker = Ticker(float(os.getenv("MONITOR_INTERVAL", "1")))
+        self.buffer = MetricBuffer(
+            self.db,
+            host = self.host,
+            batch_size = int(os.getenv("MONITOR_BATCH_SIZE", "100")),
+            flush_interval = float(os.getenv("MONITOR_FLUSH_INTERVAL", "5")),
+            max_size = int(os.getenv("MONITOR_BUFFER_SIZE", "10000")),
+            drop_policy = os.getenv("MONITOR_DROP_POLICY", "oldest"),
+        )
+        self.collectors = CollectorSet(
+            build_collectors(os.getenv("MONITOR_COLLECTORS", DEFAULT_COLLECTORS)),
+            self.ticker.interval,
+            cpu_budget = float(os.getenv("MONITOR_CPU_BUDGET", "1.0")),
+        )
+        self.detail_buffer = MetricBuffer(
+            self.db,
+            host = self.host,
+            batch_size = 5000,
+            flush_interval = float(os.getenv("MONITOR_FLUSH_INTERVAL", "5")),
+            max_size = int(os.getenv("MONITOR_DETAIL_BUFFER_SIZE", "200000")),
+            drop_policy = os.getenv("MONITOR_DROP_POLICY", "oldest"),
+            method = "save_samples",
+        )
+        self.maintenance_interval = float(os.getenv("METRICS_MAINTENANCE_INTERVAL", "3600"))
+        self.retention_days = int(os.getenv("METRICS_RETENTION_DAYS", "30"))
+        self.stopping = threading.Event()
+
+    def run_maintenance(self):
+        """
+        Background job: keeps partitions ahead of the clock and drops expired ones
+        """
+        while not self.stopping.is_set():
+            result = self.db.run_maintenance(retention_days=self.retention_days)
+            if result["created"] or result["dropped"]:
+                print(f"Partitions created: {result['created']} | dropped: {result['dropped']}")
+            self.stopping.wait(self.maintenance_interval)
+
     def collect_metrics(self):
         """
         Gathers system stats
@@ -19,35 +391,60 @@ class SystemMonitor:
             disk = psutil.disk_usage('/').percent
 
             current_net = psutil.net_io_counters()
-            current_time = time.time()
+            current_time = time.monotonic()
+            elapsed = current_time - self.last_time
             # delta (change)
             bytes_sent = current_net.bytes_sent - self.last_net.bytes_sent
             bytes_recv = current_net.bytes_recv - self.last_net.bytes_recv
-            # convert to megabytes
+            # convert to megabytes per second over the time that actually passed
             total_bytes = bytes_sent + bytes_recv
-            mb_total = total_bytes / (1024 * 1024)
+            mb_per_sec = total_bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
             # update state for next loop
             self.last_net = current_net
             self.last_time = current_time
-            return cpu, memory, disk, round(mb_total, 2)
+            return cpu, memory, disk, round(mb_per_sec, 2)
         except Exception as e:
             print(f"Error collection metrics: {e}")
-            return 0, 0, 0
-    
+            return 0, 0, 0, 0
+
     def start(self):
         """
         The main Loop
         """
         print("Monitoring Active. Press Ctrl+C to stop")
+        if threading.current_thread() is threading.main_thread():
+            # docker stop / kubectl delete send SIGTERM, treat it like Ctrl+C so the buffer gets flushed
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.buffer.start()
+        self.detail_buffer.start()
+        threading.Thread(target=self.run_maintenance, name="metrics-maintenance", daemon=True).start()
+        # At sub-second intervals only print about once a second
+        print_every = max(1, round(1 / self.ticker.interval))
+        ticks = 0
         try:
             while True:
-                time.sleep(1)
+                self.ticker.wait()
                 cpu, memory, disk, net = self.collect_metrics()
-                print(f"Stats -> CPU: {cpu}% | RAM: {memory}% | Disk: {disk}% | Net: {net} MB/s")
-                self.db.save_metric(cpu, memory, disk, net)
+                # Timestamp taken now, the row may only reach the DB a few seconds later.
+                # The buffer never blocks, a slow DB can't stretch the sampling period
+                timestamp = datetime.now(UTC)
+                self.buffer.add((timestamp, cpu, memory, disk, net))
+                for metric, labels, value in self.collectors.collect(ticks):
+                    self.detail_buffer.add((timestamp, metric, labels, value))
+
+                ticks += 1
+                if ticks % print_every == 0:
+                    print(f"Stats -> CPU: {cpu}% | RAM: {memory}% | Disk: {disk}% | Net: {net} MB/s")
+                if ticks % (print_every * 60) == 0:
+                    print(f"Agent cost -> {self.collectors.stats()}")
         except KeyboardInterrupt:
             print("\nMonitor Stopped")
+        finally:
+            self.stopping.set()
+            self.buffer.close()
+            self.detail_buffer.close()
+            print(f"Flushed {self.buffer.flushed} samples, dropped {self.buffer.dropped}, missed ticks {self.ticker.missed}")
 
 if __name__ == "__main__":
     app = SystemMonitor()
-    app.start()
\ No newline at end of file
+    app.start()
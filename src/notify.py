@@ -0,0 +1,72 @@
+import select
+import threading
+
+import psycopg2
+
+
+class PgListener:
+    """
+    LISTENs on Postgres channels over one dedicated connection (kept outside the pool, it never goes idle)
+    and calls callback(channel, payload) from its own thread. Reconnects with backoff when the DB goes away,
+    `connected` tells callers whether they can rely on notifications or should poll.
+    on_connect() runs after every (re)connect, anything cached while disconnected may have missed a notification
+    """
+    def __init__(self, connect_kwargs, channels, callback, timeout=5.0, on_connect=None):
+        self.connect_kwargs = connect_kwargs
+        self.channels = list(channels)
+        self.callback = callback
+        self.on_connect = on_connect
+        self.timeout = timeout
+        self.connected = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name="pg-listener", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=self.timeout + 1)
+
+    def run(self):
+        failures = 0
+        while not self.stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(**self.connect_kwargs)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    for channel in self.channels:
+                        cursor.execute(f"LISTEN {channel}")
+                if self.on_connect:
+                    self.on_connect()   # Before connected is set, LISTEN is already active
+                self.connected.set()
+                failures = 0
+
+                while not self.stopping.is_set():
+                    # Wakes on socket activity or every `timeout` to check for stop()
+                    if select.select([connection], [], [], self.timeout) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        try:
+                            self.callback(notify.channel, notify.payload)
+                        except Exception as e:     # noqa: BLE001 A failing callback must not drop the LISTEN connection
+                            print(f"Notification handler failed: {e}")
+            except Exception as e:     # noqa: BLE001 Any failure reconnects with backoff
+                failures += 1
+                print(f"LISTEN connection lost ({', '.join(self.channels)}): {e}")
+            finally:
+                self.connected.clear()
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:     # noqa: BLE001, S110 Closing a dead connection, nothing left to do
+                        pass
+            self.stopping.wait(min(60, 2 ** failures))
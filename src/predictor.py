@@ -1,9 +1,47 @@
-import pandas as pd
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.linear_model import LinearRegression
+from src.cache import TTLCache
 from src.database import DatabaseManager
+from src.features import TARGETS, FeatureEngine
+
+MIN_TRAIN_ROWS = 20
+
+def horizon_label(seconds):
+    """10 -> '10s', 60 -> '1m', 300 -> '5m'"""
+    if seconds >= 60 and seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+def fit_models(models, X, y):
+    """
+    Fits fresh copies of the given models. Module level so it can run in the fit process pool
+    """
+    fitted = {}
+    for name, model in models.items():
+        try:
+            fitted[name] = clone(model).fit(X, y)
+        except Exception as e:     # noqa: BLE001 One model failing to fit leaves the others
+            print(f"Error fitting {name}: {e}")
+    return fitted
+
+def parse_time(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
 
 class Predictor:
+    """
+    Models are fitted in the background (on a schedule, or sooner once enough new samples arrived)
+    and swapped in as a new version. /predict only runs inference on the newest feature row.
+    One model set per target and horizon (direct multi-step forecasting)
+    """
     def __init__(self):
         self.db = DatabaseManager()
         self.models = {
@@ -11,47 +49,164 @@ class Predictor:
             "RandomForest": RandomForestRegressor(n_estimators=50, random_state=42),
             "GradientBoosting": GradientBoostingRegressor(n_estimators=50, random_state=42)
         }
-    
-    def train_predict(self, df, target_col):
+        self.window = int(os.getenv("PREDICTOR_WINDOW", "720"))                      # Rows used for training
+        self.retrain_interval = float(os.getenv("PREDICTOR_RETRAIN_INTERVAL", "60"))  # Seconds
+        self.retrain_samples = int(os.getenv("PREDICTOR_RETRAIN_SAMPLES", "30"))      # ...or after this many new rows
+        self.check_interval = float(os.getenv("PREDICTOR_CHECK_INTERVAL", "5"))
+        self.horizons = [int(h) for h in os.getenv("PREDICTOR_HORIZONS", "10,60,300").split(",")]  # Seconds ahead
+        self.refresh_rows = 64      # Rows fetched per incremental refresh
+        # Fits run in worker processes so they neither hold the GIL nor slow API threads, 0 fits inline
+        self.fit_workers = int(os.getenv("PREDICTOR_FIT_WORKERS", "2"))
+        self.fit_pool = None
+
+        self.engine = FeatureEngine(capacity=self.window)
+        self.buffer_lock = threading.Lock()
+
+        self.trained = None     # Current model version, replaced as a whole so readers never see half a retrain
+        self.version = 0
+        self.train_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+        # Results per (newest sample, model version): repeat and concurrent requests inside one
+        # sample interval share a single computation
+        self.cache = TTLCache(max_size=16)
+
+    def refresh(self):
         """
-        Helper function: Trains all 3 models on a specific target (cpu or network)
-        and returns their predictions
+        Appends samples newer than the ring buffer. Only a small tail is fetched,
+        the full window only on the first call or after a gap the tail doesn't cover
         """
-        # Feature engineering, the "Context"
-        df['prev'] = df[target_col].shift(1)
-        df['rolling'] = df[target_col].rolling(window=5).mean()
-        df['velocity'] = df[target_col].diff()
+        with self.buffer_lock:
+            last = self.engine.last_timestamp()
+            limit = self.window if last is None else self.refresh_rows
+            rows = self.db.get_fleet_metrics(limit=limit)     # Newest first, one row per timestamp for the fleet
+            if not rows:
+                return
 
-        df = df.dropna() # Remove empty rows created by shifting
+            if last is not None and len(rows) == limit and parse_time(rows[-1]['timestamp']) > last:
+                self.engine.buffer.clear()
+                last = None
+                rows = self.db.get_fleet_metrics(limit=self.window)
 
-        if len(df) < 10:
-            return None
-        
-        # Preparetion X (features), y (target)
-        X = df[['prev', 'rolling', 'velocity']].values
-        y = df[target_col].values
+            for row in reversed(rows):
+                timestamp = parse_time(row['timestamp'])
+                if last is None or timestamp > last:
+                    self.engine.append(timestamp, [row[target] or 0.0 for target in TARGETS])
+
+    def fit(self, jobs):
+        """
+        Fits all 3 models for every (key, X, y) job, in the process pool when enabled
+        """
+        if self.fit_workers <= 0:
+            return {key: fit_models(self.models, X, y) for key, X, y in jobs}
+        if self.fit_pool is None:
+            # spawn: forking a process that already runs API/trainer threads isn't safe.
+            # Workers run niced, training gives way to request handling when CPU is short
+            self.fit_pool = ProcessPoolExecutor(
+                self.fit_workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=os.nice, initargs=(10,),
+            )
+        futures = {key: self.fit_pool.submit(fit_models, self.models, X, y) for key, X, y in jobs}
+        return {key: future.result() for key, future in futures.items()}
+
+    def train(self):
+        """
+        Trains a new model version over the ring buffer. Returns False if there isn't enough data
+        """
+        with self.train_lock:
+            self.refresh()
+            with self.buffer_lock:
+                data = self.engine.buffer.view().copy()
+
+            started = time.perf_counter()
+            interval = self.engine.interval(data)
+            time_of_day = self.engine.covers_day(data)
+            jobs = []
+            horizons = {}
+            for target in TARGETS:
+                X, rows = self.engine.matrix(target, data, time_of_day)
+                values = data[:, 1 + TARGETS.index(target)]
+                for seconds in self.horizons:
+                    steps = max(1, round(seconds / interval))
+                    if len(X) - steps < MIN_TRAIN_ROWS:
+                        continue    # Not enough history for this horizon yet
+                    # Direct strategy: features at t, target at t + steps
+                    jobs.append(((target, horizon_label(seconds)), X[:-steps], values[rows[:-steps] + steps]))
+                    horizons[horizon_label(seconds)] = seconds
+            models = self.fit(jobs)
+            fit_ms = (time.perf_counter() - started) * 1000
+
+            if not models:
+                return False
+
+            self.version += 1
+            self.trained = {
+                "version": self.version,
+                "trained_at": datetime.now(UTC).isoformat(),
+                "trained_through": data[-1, 0],     # Newest sample seen by this version
+                "samples": len(data),
+                "horizons": horizons,
+                "time_of_day": time_of_day,
+                "fit_ms": round(fit_ms, 2),
+                "models": models,
+            }
+            print(f"Predictor: trained model v{self.version} ({', '.join(horizons)}) on {len(data)} samples in {fit_ms:.0f} ms")
+            return True
+
+    def needs_training(self):
+        """
+        Retrain when the interval passed, or earlier once `retrain_samples` new rows came in
+        """
+        if self.trained is None:
+            return True
+        self.refresh()
+        with self.buffer_lock:
+            timestamps = self.engine.buffer.view()[:, 0]
+            new_rows = int((timestamps > self.trained['trained_through']).sum())
+        if new_rows >= self.retrain_samples:
+            return True
+        age = (datetime.now(UTC) - datetime.fromisoformat(self.trained['trained_at'])).total_seconds()
+        return new_rows > 0 and age >= self.retrain_interval
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                if self.needs_training():
+                    self.train()
+            except Exception as e:     # noqa: BLE001 One failed round must not stop the training loop
+                print(f"Predictor training failed: {e}")
+            self.stopping.wait(self.check_interval)
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name="predictor-trainer", daemon=True)
+            self.thread.start()
 
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        if self.fit_pool:
+            self.fit_pool.shutdown(wait=False, cancel_futures=True)
+            self.fit_pool = None
+
+    def infer(self, features, target_col, models):
+        """
+        Runs the fitted models on the newest feature row
+        """
         predictions = {}
-        
-        # Train and predict for each model
-        last_row = df.iloc[-1]
-        next_input = [[
-            last_row[target_col],   # current val becomes 'prev'
-            last_row['rolling'],    # current rolling
-            last_row['velocity']    # current velocity
-        ]]
-
-        for name, model in self.models.items():
+        for name, model in models.items():
             try:
-                model.fit(X,y)
-                pred = model.predict(next_input)[0]
-                # Cap results, cpu 0-100, network 0-infinit
-                if target_col == 'cpu':
+                pred = model.predict(features)[0]
+                # Cap results, cpu/memory 0-100, network 0-infinit
+                if target_col in ('cpu', 'memory'):
                     pred = max(0, min(100, pred))
                 else:
                     pred = max(0, pred)
-                
-                predictions[name] = round(pred, 2)
+
+                predictions[name] = round(float(pred), 2)
             except Exception as e:
                 predictions[name] = 0.0
                 print(f"Error in {name}: {e}")
@@ -59,24 +214,53 @@ class Predictor:
 
     def predict_next_minute(self):
         """
-        Orchestrator: Gets data and runs predictions for both CPU and Network.
+        Orchestrator: serves CPU, Memory and Network forecasts for every horizon from the current
+        model version. Only trains inline when no version exists yet (first call before the
+        background thread caught up)
         """
-        data = self.db.get_recent_metrics(limit=120) # 4 minutes of history
-
-        if len(data) < 20:
-            return None, "Gathering more data for AI models..."
-        
-        df = pd.DataFrame(data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp').reset_index(drop=True)
+        trained = self.trained
+        if trained is None:
+            if not self.train():
+                return None, "Gathering more data for AI models..."
+            trained = self.trained
 
-        cpu_preds = self.train_predict(df, 'cpu')
-        net_preds = self.train_predict(df, 'network')
+        latest = self.db.get_latest_timestamp()
+        if latest is None:
+            return None, "Insufficient Data to make Predictions"
 
-        if not cpu_preds or not net_preds:
+        predictions, hit = self.cache.get_or_compute((latest, trained['version']), lambda: self.compute(trained))
+        if predictions is None:
             return None, "Insufficient Data to make Predictions"
-        
+
+        return {**predictions, "model": {**predictions["model"], "cached": hit}}, "Prediction Successful"
+
+    def compute(self, trained):
+        """
+        Inference on the newest feature row, only runs on a cache miss
+        """
+        started = time.perf_counter()
+        self.refresh()
+        with self.buffer_lock:
+            features = {target: self.engine.latest(target, trained['time_of_day']) for target in TARGETS}
+        if any(row is None for row in features.values()):
+            return None
+
+        horizons = {}
+        for (target, label), models in trained['models'].items():
+            horizons.setdefault(label, {})[target] = self.infer(features[target], target, models)
+        predict_ms = (time.perf_counter() - started) * 1000
+
+        # Top level keeps the old shape, filled from the horizon closest to one minute
+        headline = min(horizons, key=lambda label: abs(trained['horizons'][label] - 60))
         return {
-            "cpu": cpu_preds,
-            "network": net_preds
-        }, "Prediction Successful"
\ No newline at end of file
+            **horizons[headline],
+            "horizon": headline,
+            "horizons": horizons,
+            "model": {
+                "version": trained['version'],
+                "trained_at": trained['trained_at'],
+                "samples": trained['samples'],
+                "fit_ms": trained['fit_ms'],
+                "predict_ms": round(predict_ms, 2),
+            }
+        }
@@ -1,38 +1,57 @@
+import hashlib
+import json
 import os
-import platform
-import psutil
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import chromadb
-import google.generativeai as genai
 from dotenv import load_dotenv
+from src import llm
 from src.database import DatabaseManager
 from src.actuator import Actuator
+from src.cache import TTLCache
+from src.config_cache import ConfigCache
+from src.host_facts import HostFacts
+from src.scale_jobs import ScaleJobs
+from src.vector_index import LocalVectorIndex
+
+# DevOps runbook, embedded into every knowledge source on startup
+RUNBOOK = [
+    "If a Kubernetes Pod is stuck in 'CrashLoopBackOff', it means the application inside the container is repeatedly crashing. To fix it, check the logs using: kubectl logs deploy/<deployment-name> --previous",
+    "If a Kubernetes Pod is stuck in 'ErrImageNeverPull', it means the imagePullPolicy is set to 'Never' but the node does not have the image locally. To fix it, import the image using 'k3d image import' or change the policy to 'IfNotPresent'.",
+    "A '502 Bad Gateway' error from the Kubernetes LoadBalancer usually means the worker node is frozen or the backend service is misconfigured in the Ingress.",
+    "System Monitor Auto-Scaler logic: High Network Traffic is usually above 2 MB/s. Low traffic is below 100 KB/s."
+]
+ACTION_TAG = "[ACTION:"
 
 class RagAgent:
     def __init__(self):
         load_dotenv()
-        self.api_key = os.getenv("GEMINI_API_KEY")
         self.db = DatabaseManager()
-        self.actuator = Actuator()
+        self.config = ConfigCache.shared(self.db)
+        self.actuator = Actuator(db=self.db)
+        self.scale_jobs = ScaleJobs(self.actuator, self.db)
+        self.host_facts = HostFacts.shared()
 
-        if not self.api_key:
-            print("!!! No Gemini API Key found is .env !!!")
-            self.model = None
-        else:
-            try:
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-2.5-flash')
-            except Exception as e:
-                print(f"Error configuring Gemini: {e}")
-                self.model = None
-        
+        self.llm_timeout = float(os.getenv("LLM_TIMEOUT", "30"))
+        self.llm = llm.from_env(timeout=self.llm_timeout)     # LLM_BACKEND: gemini or fake
         self.chroma_host = os.getenv("CHROMA_HOST", "localhost")
-        self.collection = None
-        try:
-            self.chroma_client = chromadb.HttpClient(host=self.chroma_host, port=8000)
-            self.collection = self.chroma_client.get_or_create_collection(name="devops_runbook")
-            self.seed_knowledge()
-        except Exception as e:
-            print(f"ChromaDB not reachable at {self.chroma_host}: {e}")
+        self.retrieval_stats = {}   # source -> {"queries", "failures", "last_ms", "total_ms"}, under stats_lock
+        self.stats_lock = threading.Lock()      # Concurrent chats update the counters from context_pool threads
+        self.knowledge = self.knowledge_sources()
+
+        # Prompt context: fetched in parallel, the slow-moving parts reused for a few seconds
+        self.context_pool = ThreadPoolExecutor(max_workers=int(os.getenv("RAG_CONTEXT_THREADS", "6")), thread_name_prefix="rag-context")
+        self.context_cache = TTLCache(max_size=8)
+        self.summary_ttl = float(os.getenv("RAG_SUMMARY_TTL", "60"))
+        self.containers_ttl = float(os.getenv("RAG_CONTAINERS_TTL", "5"))
+        self.last_timings = {}      # ms per stage of the latest ask()
+
+        # Same question, same context: same answer. The key leaves out the live samples, so a cached answer
+        # can be built on samples up to LLM_CACHE_TTL seconds old. LLM_CACHE_TTL=0 turns it off
+        self.answer_ttl = float(os.getenv("LLM_CACHE_TTL", "30"))
+        self.answer_cache = TTLCache(ttl=self.answer_ttl, max_size=256)
 
         self.system_architecture = """
         [SYSTEM ARCHITECTURE]
@@ -45,59 +64,127 @@ class RagAgent:
         - Orchestration: Custon Python Auto-Scaler & Actuator
         """
                 
-    def ask(self, user_question):
+    def knowledge_sources(self):
         """
-        RAG Loop:
-        1. Get Context (Recent DB Metrics)
-        2. Combine with Question
-        3. Ask Gemini
+        Runbook stores, asked in this order until one answers. RAG_BACKEND=chroma (default): the Chroma server,
+        then the local index when Chroma is unreachable or a query fails. RAG_BACKEND=local: only the local
+        index (RAG_INDEX_DIR), fully offline
         """
-        if not self.model:
-            return "Error: Gemini API missing (Check .env file)"
-        
-        rag_context = "No specific runbook documentation found"
-        if self.collection:
+        sources = []
+        if os.getenv("RAG_BACKEND", "chroma").lower() == "chroma":
+            try:
+                self.chroma_client = chromadb.HttpClient(host=self.chroma_host, port=8000)
+                collection = self.chroma_client.get_or_create_collection(name="devops_runbook")
+                self.seed_knowledge(collection)
+                sources.append(("chroma", collection))
+            except Exception as e:     # noqa: BLE001 The Chroma client raises its own errors, the local index takes over
+                print(f"ChromaDB not reachable at {self.chroma_host}: {e}")
+        try:
+            index = LocalVectorIndex(os.getenv("RAG_INDEX_DIR", "data/rag_index"))
+            self.seed_knowledge(index)
+            sources.append(("local", index))
+        except OSError as e:
+            print(f"Local vector index unavailable: {e}")
+        return sources
+
+    def seed_knowledge(self, collection):
+        """Injects the technical manuals into a vector store, upsert keeps it idempotent"""
+        # Both stores need a unique ID for every document
+        ids = [f"runbook_rule_{i}" for i in range(len(RUNBOOK))]
+        collection.upsert(documents=RUNBOOK, ids=ids)
+
+    def retrieve(self, question, n_results=2):
+        """
+        Runbook passages for the question from the first source that answers, None if none found anything.
+        Every query's latency is kept in retrieval_stats
+        """
+        for name, collection in self.knowledge:
+            started = time.perf_counter()
             try:
-                # find 2 most relevant documents 
-                results = self.collection.query(query_texts=[user_question], n_results=2)
-                if results['documents'] and results['documents'][0]:
-                    rag_context = "\n".join(results['documents'][0])
-                    print(f"CHROMA FOUND THIS CONTEXT: {rag_context}", flush=True)
-            except Exception as e:
-                print(f"Chroma Query Error: {e}")
+                results = collection.query(query_texts=[question], n_results=n_results)
+            except Exception as e:     # noqa: BLE001 Any query failure moves on to the next source
+                self.count_query(name, None)
+                print(f"{name} query failed, trying the next knowledge source: {e}")
+                continue
+            ms = round((time.perf_counter() - started) * 1000, 2)
+            self.count_query(name, ms)
+            documents = results["documents"][0] if results["documents"] else []
+            if documents:
+                print(f"Runbook context from {name} in {ms} ms", flush=True)
+                return "\n".join(documents)
+            return None
+        return None
 
+    def count_query(self, name, ms):
+        """Records one query against a knowledge source, ms=None for a failed one"""
+        with self.stats_lock:
+            stats = self.retrieval_stats.setdefault(name, {"queries": 0, "failures": 0, "last_ms": None, "total_ms": 0.0})
+            if ms is None:
+                stats["failures"] += 1
+                return
+            stats["queries"] += 1
+            stats["last_ms"] = ms
+            stats["total_ms"] += ms
+
+    def stats(self):
+        """Copies of the retrieval counters, the latest chat's stage timings and the cache counters"""
+        with self.stats_lock:
+            retrieval = {name: dict(stats) for name, stats in self.retrieval_stats.items()}
+        return {"retrieval": retrieval, "chat": {"last_ms": dict(self.last_timings),
+                "context_cache": self.context_cache.stats(), "answer_cache": self.answer_cache.stats()}}
+
+    @staticmethod
+    def timed(name, fn):
+        """(fn(), ms), None instead of raising so one broken source doesn't cost the whole answer"""
+        started = time.perf_counter()
         try:
-            active_containers = self.actuator.get_container_count()
-        except Exception:
+            value = fn()
+        except Exception as e:     # noqa: BLE001 A failing stage is left out of the prompt
+            print(f"Context stage '{name}' failed: {e}")
+            value = None
+        return value, round((time.perf_counter() - started) * 1000, 2)
+
+    def gather_context(self, user_question):
+        """
+        Runs every context lookup at once on context_pool, so building the prompt takes as long as the
+        slowest one instead of their sum. The 24h summary and container count come from context_cache
+        (RAG_SUMMARY_TTL / RAG_CONTAINERS_TTL seconds), hardware facts and the mode have their own caches.
+        Returns (context, ms per stage)
+        """
+        stages = {
+            "runbook": lambda: self.retrieve(user_question),
+            "containers": lambda: self.context_cache.get_or_compute("containers", self.actuator.get_container_count, ttl=self.containers_ttl)[0],
+            "hardware": self.host_facts.system_info,
+            "summary": lambda: self.context_cache.get_or_compute("summary", self.db.get_24h_summary, ttl=self.summary_ttl)[0],
+            "recent": lambda: self.db.get_fleet_metrics(limit = 20),     # Fetch 20 rows, live data is never cached
+            "mode": lambda: self.config.get("scaling_mode"),
+        }
+        futures = {name: self.context_pool.submit(self.timed, name, fn) for name, fn in stages.items()}
+        context, timings = {}, {}
+        for name, future in futures.items():
+            context[name], timings[name] = future.result()
+        return context, timings
+
+    def build_prompt(self, user_question, context):
+        rag_context = context.get("runbook") or "No specific runbook documentation found"
+
+        active_containers = context.get("containers")
+        if active_containers is None:
             active_containers = "Can't identify number of Nginx container. Docker Error"
-        
-        
-        system_os = platform.system()
-        disk_path = '/'
-
-        if system_os == 'Windows':
-            disk_path = 'C:\\'
-        elif system_os == 'Darwin':
-            if os.path.exists('/System/Volumes/Data'):
-                disk_path = '/System/Volumes/Data'
-        
-        try:
-            disk_info = psutil.disk_usage(disk_path)
-        except Exception:
-            print(f"Disk check failed for {disk_path}, falling back to current directory")
-            disk_info = psutil.disk_usage('.')
-        
-        # Hardware context
-        memory = psutil.virtual_memory()
+
+        # Hardware context, cached and shared with /system
+        facts = context.get("hardware") or {}
+        hostname = facts.get("hostname", "unknown host")
         hardware_info = f"""
         [HARDWARE SPECS]
-        - Hostname: {platform.node()}
-        - OS: {platform.system()} {platform.release()}
-        - CPU Arch: {platform.machine()}
-        - CPU Cores: {psutil.cpu_count(logical=True)}
-        - Total RAM: {round(memory.total / (1024 ** 3), 2)} GB
-        - Total Disk: {round(disk_info.total / (1024 ** 3), 2)} GB
-        - Disk Used: {round(disk_info.used / (1024 ** 3), 2)} GB
+        - Hostname: {hostname}
+        - OS: {facts.get('os')}
+        - CPU Arch: {facts.get('cpu_arch')}
+        - CPU Cores: {facts.get('cpu_cores')}
+        - Total RAM: {facts.get('ram_total')} GB
+        - Total Disk: {facts.get('disk_total')} GB
+        - Disk Used: {facts.get('disk_used')} GB
+        - Network Interface: {facts.get('net_interface')}
         """
         infra_info = f"""
         [INFRASTRUCTURE STATUS]
@@ -106,7 +193,7 @@ class RagAgent:
         """
         
         # 24h Summary
-        summary = self.db.get_24h_summary()
+        summary = context.get("summary")
         history_context = "No historical data available"
         if summary:
             history_context = f"""
@@ -118,16 +205,15 @@ class RagAgent:
             """
 
         # Recent logs
-        recent_data = self.db.get_recent_metrics(limit = 20)    # Fetch 60 rows, assuming 1 row every 5-10 sec
         logs_context = "[CURRENT LIVE METRICS (Last 30 seconds)]\n"
-        for row in recent_data:
+        for row in context.get("recent") or []:
             logs_context += f"- Time: {row['timestamp']}, CPU: {row['cpu']}%, Network: {row['network']} MB/s\n"
         
-        current_mode = self.db.get_config("scaling_mode") or "auto"
+        current_mode = context.get("mode") or "auto"
 
         # Augmentation
-        prompt = f"""
-        You are 'System Monitoring', an expert Site Reliability Engineer (SRE)/DevOps AI assistant running on {platform.node()}.
+        return f"""
+        You are 'System Monitoring', an expert Site Reliability Engineer (SRE)/DevOps AI assistant running on {hostname}.
         Analyze the system metrics below to answer the user's question.
         
         [CURRENT OPERATING MODE]
@@ -161,34 +247,123 @@ class RagAgent:
         - Be concise and professional. No fluff. Structure the answer like a status report
         """
 
+    @staticmethod
+    def normalize(question):
+        """Case, punctuation and spacing don't change the question"""
+        return " ".join(re.findall(r"[a-z0-9]+", question.lower()))
+
+    @staticmethod
+    def fingerprint(context):
+        """Hash of the context without the live samples, which change every interval and would make every key unique"""
+        stable = {name: value for name, value in context.items() if name != "recent"}
+        return hashlib.sha1(json.dumps(stable, sort_keys=True, default=str).encode()).hexdigest()
+
+    def prepare(self, user_question):
+        """Gathers the context and builds the prompt. Returns (prompt, answer cache key, timings, start time)"""
+        started = time.perf_counter()
+        context, timings = self.gather_context(user_question)
+        prompt = self.build_prompt(user_question, context)
+        key = (self.normalize(user_question), self.fingerprint(context))
+        timings["context"] = round((time.perf_counter() - started) * 1000, 2)
+        return prompt, key, timings, started
+
+    def cached_answer(self, key):
+        return self.answer_cache.get(key) if self.answer_ttl > 0 else None
+
+    def finish(self, reply, key):
+        """
+        The model's reply as the user's answer. Scale actions are submitted as jobs and never cached,
+        asking again has to scale again
+        """
+        # Scaling runs as a background job, the answer doesn't wait for containers to start
+        if "[ACTION: SCALE_UP]" in reply:
+            job = self.scale_jobs.submit("up", source="chat")
+            self.context_cache.invalidate("containers")
+            return f"**Command Accepted:** scaling UP the Nginx/Client server (job `{job['id']}`, status at /scale/jobs/{job['id']})"
+        elif "ACTION: SCALE_DOWN" in reply:
+            job = self.scale_jobs.submit("down", source="chat")
+            self.context_cache.invalidate("containers")
+            return f"**Command Accepted:** scaling DOWN the Nginx/Client server (job `{job['id']}`, status at /scale/jobs/{job['id']})"
+
+        if self.answer_ttl > 0 and reply:
+            self.answer_cache.set(key, reply)
+        return reply
+
+    def record(self, timings, started):
+        timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+        self.last_timings = timings
+        print(f"Chat latency (ms): {timings}", flush=True)
+
+    def ask(self, user_question):
+        """
+        RAG Loop:
+        1. Get Context (runbook, DB metrics, hardware, all at once)
+        2. Combine with Question
+        3. Ask the LLM, unless the same question was answered on the same context within LLM_CACHE_TTL
+        Per-stage latency ends up in last_timings
+        """
+        if not self.llm:
+            return "Error: Gemini API missing (Check .env file)"
+
+        prompt, key, timings, started = self.prepare(user_question)
         try:
-            response = self.model.generate_content(prompt)
-            reply = response.text.strip()
-
-            if "[ACTION: SCALE_UP]" in reply:
-                self.actuator.scale_up()
-                return "**Command Executed:** I have successfully scaled UP the Nginx/Client server"
-            elif "ACTION: SCALE_DOWN" in reply:
-                self.actuator.scale_down()
-                return "**Command Executed:** I have successfully scaled DOWN the Nginx/Client server"
-            
-            return reply
+            cached = self.cached_answer(key)
+            if cached is not None:
+                return cached
+
+            llm_started = time.perf_counter()
+            reply = self.llm.generate(prompt).strip()
+            timings["llm"] = round((time.perf_counter() - llm_started) * 1000, 2)
+            return self.finish(reply, key)
+        except Exception as e:     # noqa: BLE001 Reported to the user as the answer
+            return f"AI Generation Error: {e}"
+        finally:
+            self.record(timings, started)
+
+    def ask_stream(self, user_question):
+        """
+        ask() piece by piece, for /chat/stream: yields text as the model writes it (a cached answer in one
+        piece). A reply that starts like an action tag is held back, the user sees the job confirmation instead
+        of '[ACTION: SCALE_UP]'. first_token in last_timings is the time from the question to the first piece
+        """
+        if not self.llm:
+            yield "Error: Gemini API missing (Check .env file)"
+            return
+
+        prompt, key, timings, started = self.prepare(user_question)
+        try:
+            cached = self.cached_answer(key)
+            if cached is not None:
+                yield cached
+                return
+
+            llm_started = time.perf_counter()
+            parts = []
+            held = True     # Until the text so far can't be the start of an action tag
+            for piece in self.llm.stream(prompt):
+                if not parts:
+                    timings["first_token"] = round((time.perf_counter() - started) * 1000, 2)
+                parts.append(piece)
+                if held:
+                    text = "".join(parts).lstrip()
+                    if not text or ACTION_TAG.startswith(text[:len(ACTION_TAG)]):
+                        continue
+                    held = False
+                    yield text
+                else:
+                    yield piece
+            timings["llm"] = round((time.perf_counter() - llm_started) * 1000, 2)
+
+            reply = "".join(parts).strip()
+            answer = self.finish(reply, key)
+            if held and answer:
+                yield answer
+            elif answer != reply:
+                yield f"\n\n{answer}"     # Action tag after some text
         except Exception as e:
-            return f"AI Generation Error: {str(e)}"
-
-def seed_knowledge(self):
-    """Injecfts technical manuals into the Vector Database"""
-    docs = [
-        "If a Kubernetes Pod is stuck in 'CrashLoopBackOff', it means the application inside the container is repeatedly crashing. To fix it, check the logs using: kubectl logs deploy/<deployment-name> --previous",
-        "If a Kubernetes Pod is stuck in 'ErrImageNeverPull', it means the imagePullPolicy is set to 'Never' but the node does not have the image locally. To fix it, import the image using 'k3d image import' or change the policy to 'IfNotPresent'.",
-        "A '502 Bad Gateway' error from the Kubernetes LoadBalancer usually means the worker node is frozen or the backend service is misconfigured in the Ingress.",
-        "System Monitor Auto-Scaler logic: High Network Traffic is usually above 2 MB/s. Low traffic is below 100 KB/s."
-    ]
-
-    # ChromaDB needs a unique ID for every document
-    ids = [f"runbook_rule_{i}" for i in range(len(docs))]   # 'upsert' safely inserts or updates 
-    self.collection.upsert(documents=docs, ids=ids)
-    print("ChromaDB Knowledge Base Seeded!")
+            yield f"AI Generation Error: {e}"
+        finally:
+            self.record(timings, started)
 
 if __name__ == "__main__":
     agent = RagAgent()
@@ -0,0 +1,165 @@
+import threading
+import time
+
+from kubernetes import watch
+
+
+class ReplicaWatcher:
+    """
+    Keeps one service's replica count in memory, updated from the orchestrator's event stream on its
+    own thread, so count() is O(1) instead of an API round trip. While the stream is down count() falls
+    back to a filtered server-side query, cached for `fallback_ttl` seconds. Reconnects with backoff
+    """
+    def __init__(self, fallback_ttl=2.0):
+        self.fallback_ttl = fallback_ttl
+        self.replicas = 0
+        self.synced = threading.Event()     # Set while the cached count follows the event stream
+        self.stopping = threading.Event()
+        self.thread = None
+        self.fallback = (0.0, None)         # (expires at, count)
+        self.events = 0
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, name="replica-watch", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.cancel()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def count(self):
+        if self.synced.is_set():
+            return self.replicas
+        expires, value = self.fallback
+        if value is None or time.monotonic() >= expires:
+            value = self.query()
+            self.fallback = (time.monotonic() + self.fallback_ttl, value)
+        return value
+
+    def update(self, replicas):
+        self.replicas = replicas
+        self.events += 1
+        self.synced.set()
+
+    def run(self):
+        failures = 0
+        while not self.stopping.is_set():
+            try:
+                self.watch()
+                failures = 0
+            except Exception as e:     # noqa: BLE001 Any failure restarts the watch with backoff
+                failures += 1
+                if not self.stopping.is_set():
+                    print(f"Replica watch lost: {e}")
+            finally:
+                self.synced.clear()
+            if failures:
+                self.stopping.wait(min(60, 2 ** failures))
+
+    def query(self):
+        raise NotImplementedError
+
+    def watch(self):
+        """Lists the current state, then applies events until the stream ends"""
+        raise NotImplementedError
+
+    def cancel(self):
+        pass
+
+class DockerReplicaWatcher(ReplicaWatcher):
+    """
+    Running containers of a compose service, found by compose labels (server-side filter)
+    and followed through container start/die/destroy events
+    """
+    def __init__(self, client, service, project, fallback_ttl=2.0):
+        super().__init__(fallback_ttl)
+        self.client = client
+        self.labels = [f"com.docker.compose.service={service}", f"com.docker.compose.project={project}"]
+        self.stream = None
+
+    def running(self):
+        return {container.id for container in self.client.containers.list(filters={"label": self.labels, "status": "running"})}
+
+    def query(self):
+        return len(self.running())
+
+    def watch(self):
+        # Subscribe before listing so nothing that happens in between is missed, applying events is idempotent
+        self.stream = self.client.events(decode=True, filters={"type": "container", "label": self.labels})
+        try:
+            running = self.running()
+            self.update(len(running))
+            for event in self.stream:
+                action = event.get("Action") or event.get("status")
+                container = event.get("id") or event.get("Actor", {}).get("ID")
+                if action == "start":
+                    running.add(container)
+                elif action in ("die", "destroy"):      # die covers stop and kill
+                    running.discard(container)
+                else:
+                    continue
+                self.update(len(running))
+        finally:
+            self.stream.close()
+
+    def cancel(self):
+        if self.stream is not None:
+            try:
+                self.stream.close()
+            except Exception:     # noqa: BLE001, S110 The stream may already be closed
+                pass
+
+class K8sReplicaWatcher(ReplicaWatcher):
+    """
+    status.replicas of one Deployment, kept current by a watch that resumes from the last resourceVersion.
+    `desired` (spec.replicas) and `ready` come along for free
+    """
+    def __init__(self, apps_api, name, namespace, fallback_ttl=2.0, timeout=60):
+        super().__init__(fallback_ttl)
+        self.api = apps_api
+        self.name = name
+        self.namespace = namespace
+        self.timeout = timeout      # Seconds per watch request, the loop checks stop() in between
+        self.desired = None
+        self.ready = 0
+        self.watcher = None
+
+    def query(self):
+        deployment = self.api.read_namespaced_deployment(self.name, self.namespace)
+        return deployment.status.replicas or 0
+
+    def apply(self, deployment):
+        if deployment is None:
+            self.desired, self.ready = None, 0
+            self.update(0)
+            return
+        self.desired = deployment.spec.replicas
+        self.ready = deployment.status.ready_replicas or 0
+        self.update(deployment.status.replicas or 0)
+
+    def watch(self):
+        selector = f"metadata.name={self.name}"
+        listing = self.api.list_namespaced_deployment(self.namespace, field_selector=selector)
+        self.apply(listing.items[0] if listing.items else None)
+        version = listing.metadata.resource_version
+
+        self.watcher = watch.Watch()
+        while not self.stopping.is_set():
+            for event in self.watcher.stream(
+                self.api.list_namespaced_deployment, self.namespace,
+                field_selector=selector, resource_version=version, timeout_seconds=self.timeout,
+            ):
+                if event["type"] == "ERROR":
+                    raise RuntimeError(f"watch error: {event['object']}")   # e.g. 410 Gone, relist
+                deployment = event["object"]
+                version = deployment.metadata.resource_version
+                self.apply(None if event["type"] == "DELETED" else deployment)
+
+    def cancel(self):
+        if self.watcher is not None:
+            self.watcher.stop()
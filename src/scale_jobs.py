@@ -0,0 +1,106 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+
+
+class ScaleJobs:
+    """
+    Runs scale actions on a background worker so callers (API handlers, chat agent, autoscaler loop)
+    return at once with a job id. One worker per process: actions run in order, the actuator's
+    DB lease serializes them across processes. Every state change is written to scale_history,
+    so a job can be looked up from any API replica and end-to-end scale latency can be measured
+    """
+    def __init__(self, actuator, db, max_jobs=200):
+        self.actuator = actuator
+        self.db = db
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()   # id -> job dict, newest last
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="scale-job")
+
+    def submit(self, direction, steps=1, source="api"):
+        if direction not in ("up", "down"):
+            raise ValueError("direction must be 'up' or 'down'")
+        job = {
+            "id": uuid.uuid4().hex,
+            "source": source,
+            "action": direction,
+            "steps": steps,
+            "status": "queued",
+            "submitted_at": datetime.now(UTC).isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "replicas_from": None,
+            "replicas_to": None,
+            "queue_ms": None,
+            "run_ms": None,
+            "total_ms": None,
+            "report": None,
+            "error": None,
+        }
+        with self.lock:
+            self.jobs[job["id"]] = job
+            while len(self.jobs) > self.max_jobs:
+                old, _ = self.jobs.popitem(last=False)
+                self.futures.pop(old, None)
+        self.save(job)
+        queued = dict(job)      # Snapshot, the worker may pick the job up right away
+        self.futures[job["id"]] = self.executor.submit(self.run, job, time.perf_counter())
+        return queued
+
+    def run(self, job, submitted):
+        started = time.perf_counter()
+        job.update(status="running", started_at=datetime.now(UTC).isoformat(),
+                   queue_ms=round((started - submitted) * 1000, 1))
+        try:
+            job["replicas_from"] = self.actuator.get_container_count()
+            self.save(job)
+            before = self.actuator.last_scale
+            if job["action"] == "up":
+                target = self.actuator.scale_up(job["steps"])
+            else:
+                target = self.actuator.scale_down(job["steps"])
+            job["replicas_to"] = target
+            if self.actuator.last_scale is not before:
+                job["report"] = self.actuator.last_scale
+            job["status"] = "skipped" if target is None else "succeeded"
+        except Exception as e:     # noqa: BLE001 Any failure is recorded on the job
+            job.update(status="failed", error=str(e))
+            print(f"Scale job {job['id']} failed: {e}")
+        finished = time.perf_counter()
+        job.update(finished_at=datetime.now(UTC).isoformat(), run_ms=round((finished - started) * 1000, 1),
+                   total_ms=round((finished - submitted) * 1000, 1))
+        self.save(job)
+        return job
+
+    def save(self, job):
+        try:
+            self.db.save_scale_job(job)
+        except Exception as e:     # noqa: BLE001 History is best effort, the job result stands
+            print(f"Scale history write failed: {e}")
+
+    def get(self, job_id):
+        """
+        Job by id, from memory when it ran here, else from scale_history. Running jobs carry the live replica count
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            job = dict(job) if job else None
+        if job is None:
+            job = self.db.get_scale_job(job_id)
+        if job and job["status"] == "running":
+            job["replicas_now"] = self.actuator.get_container_count()
+        return job
+
+    def wait(self, job_id, timeout=None):
+        future = self.futures.get(job_id)
+        if future:
+            future.result(timeout)
+        return self.get(job_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
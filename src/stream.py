@@ -0,0 +1,159 @@
+import asyncio
+import json
+from collections import deque
+
+from src.database import CONFIG_CHANNEL, METRICS_CHANNEL
+from src.executors import DB, MODEL, run_in
+
+
+def sse(event, data):
+    """Formats one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+class MetricHub:
+    """
+    One per API process: learns about new samples once (Postgres NOTIFY, or a poll while LISTEN is down),
+    reads them once and fans the events out to every connected dashboard. DB load stays the same
+    whether one tab is open or a hundred.
+
+    fetch(limit) -> newest-first rows like /metrics, predict() -> /predict payload, mode() -> scaling mode,
+    listen(channels, callback) -> PgListener
+    """
+    def __init__(self, fetch, predict, mode, listen=None, history=30, poll_interval=2.0, queue_size=100):
+        self.fetch = fetch
+        self.predict = predict
+        self.mode = mode
+        self.listen = listen
+        self.history = deque(maxlen=history)    # Newest last
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+
+        self.subscribers = set()
+        self.state = {"mode": None, "prediction": None}
+        self.pending = 0        # Samples announced by NOTIFY since the last read
+        self.config_changed = True
+        self.listener = None
+        self.task = None
+        self.wake = None
+        self.loop = None
+        self.dropped = 0
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.loop = asyncio.get_running_loop()
+            self.wake = asyncio.Event()
+            if self.listen:
+                try:
+                    self.listener = self.listen([METRICS_CHANNEL, CONFIG_CHANNEL], self.on_notify)
+                except Exception as e:     # noqa: BLE001 Without LISTEN the stream polls
+                    print(f"Live stream falls back to polling: {e}")
+            self.task = asyncio.create_task(self.run())
+
+    def on_notify(self, channel, payload):
+        """Runs on the listener thread, hands over to the event loop"""
+        self.loop.call_soon_threadsafe(self.poke, channel, payload)
+
+    def poke(self, channel=METRICS_CHANNEL, payload=None):
+        if channel == CONFIG_CHANNEL:
+            self.config_changed = True
+        else:
+            try:
+                self.pending += json.loads(payload)["count"] if payload else 1
+            except (ValueError, KeyError, TypeError):
+                self.pending += 1
+        if self.wake:
+            self.wake.set()
+
+    def listening(self):
+        return self.listener is not None and self.listener.connected.is_set()
+
+    async def subscribe(self):
+        """
+        Returns (queue, snapshot). The snapshot carries the recent history so a new tab can draw at once
+        """
+        self.start()
+        if not self.subscribers:
+            # Nobody was watching, so nothing was read: catch up before taking the snapshot
+            await self.refresh_mode()
+            await self.refresh_samples()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        snapshot = {"metrics": list(reversed(self.history)), **self.state}
+        return queue, snapshot
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event, data):
+        for queue in list(self.subscribers):
+            if queue.full():
+                # Slow client: drop its oldest event rather than stall everyone else
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait((event, data))
+
+    async def refresh_mode(self):
+        self.config_changed = False
+        mode = await run_in(DB, self.mode)
+        if mode != self.state["mode"]:
+            self.state["mode"] = mode
+            self.publish("mode", {"mode": mode})
+
+    async def refresh_samples(self):
+        limit = min(1000, max(self.history.maxlen, self.pending))
+        self.pending = 0
+        rows = await run_in(DB, self.fetch, limit)
+        seen = {(row["timestamp"], row.get("host")) for row in self.history}
+        new = [row for row in reversed(rows) if (row["timestamp"], row.get("host")) not in seen]
+        if self.history:
+            # Anything older than what we hold already scrolled off the chart
+            oldest = self.history[0]["timestamp"]
+            new = [row for row in new if row["timestamp"] >= oldest]
+        if not new:
+            return
+
+        self.history.extend(new)
+        self.history = deque(sorted(self.history, key=lambda row: row["timestamp"]), maxlen=self.history.maxlen)
+        self.publish("metrics", list(reversed(new)))
+
+        prediction = await run_in(MODEL, self.predict)
+        if prediction != self.state["prediction"]:
+            self.state["prediction"] = prediction
+            self.publish("prediction", prediction)
+
+    async def run(self):
+        while True:
+            try:
+                # Event driven while LISTEN works, otherwise one cheap poll per interval for the whole process
+                timeout = 30 if self.listening() else self.poll_interval
+                try:
+                    await asyncio.wait_for(self.wake.wait(), timeout)
+                except TimeoutError:
+                    pass
+                self.wake.clear()
+
+                if not self.subscribers:
+                    self.pending = 0
+                    continue
+                if self.config_changed or not self.listening():
+                    await self.refresh_mode()
+                if self.pending or not self.listening():
+                    await self.refresh_samples()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:     # noqa: BLE001 One failed refresh must not end the stream
+                print(f"Live stream refresh failed: {e}")
+
+    async def stop(self):
+        if self.listener:
+            await asyncio.to_thread(self.listener.stop)
+        if self.task:
+            self.task.cancel()
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "listening": self.listening(),
+            "history": len(self.history),
+            "dropped_events": self.dropped,
+        }
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+class HashingEmbedder:
+    """
+    Offline text embeddings: word counts hashed into `dim` signed buckets, log-scaled and L2-normalized.
+    No model download or network, deterministic across processes (crc32, not hash()). Good enough for
+    matching questions against runbook entries by shared vocabulary
+    """
+    def __init__(self, dim=1024):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def features(self, text):
+        return TOKEN.findall(text.lower())
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+class LocalVectorIndex:
+    """
+    In-process vector index kept in `path`: vectors.npy (float32, memory-mapped on load) next to
+    meta.json (ids, documents, content hashes, embedder). upsert() only embeds documents whose text
+    changed, so restarting with the same runbook costs a hash per document. query() mirrors
+    Chroma's collection.query() result shape, RagAgent can use either.
+    Similarity is cosine after weighting each dimension by its inverse document frequency, so a rare
+    term like 'CrashLoopBackOff' outweighs words every entry shares. Dense embeddings use every
+    dimension in every document, their weights are uniform and this is plain cosine
+    """
+    def __init__(self, path, embedder=None):
+        self.path = path
+        self.embedder = embedder or HashingEmbedder()
+        self.lock = threading.Lock()
+        self.ids, self.documents, self.hashes = [], [], []
+        self.vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self.weights = self.weigh(self.vectors)
+        self.load()
+
+    @staticmethod
+    def digest(text):
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def load(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("embedder") != self.embedder.name:
+                print(f"Vector index at {self.path} was built with {meta.get('embedder')}, rebuilding")
+                return
+            vectors = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+            if vectors.shape != (len(meta["ids"]), self.embedder.dim):
+                raise ValueError(f"vectors {vectors.shape} don't match {len(meta['ids'])} documents")
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Vector index at {self.path} unreadable, rebuilding: {e}")
+            return
+        self.ids, self.documents, self.hashes = meta["ids"], meta["documents"], meta["hashes"]
+        self.vectors = vectors
+        self.weights = self.weigh(vectors)
+
+    @staticmethod
+    def weigh(vectors):
+        """(idf per dimension, weighted norm per document), recomputed whenever the documents change"""
+        df = np.count_nonzero(vectors, axis=0)
+        idf = (np.log((1 + len(vectors)) / (1 + df)) + 1).astype(np.float32)
+        norms = np.linalg.norm(vectors * idf, axis=1)
+        return idf, np.where(norms == 0, 1, norms)
+
+    def save(self, ids, documents, hashes, vectors):
+        """Writes to temp files and renames, readers of the old memory map keep a consistent view"""
+        os.makedirs(self.path, exist_ok=True)
+        vectors_tmp = os.path.join(self.path, "vectors.tmp.npy")
+        meta_tmp = os.path.join(self.path, "meta.json.tmp")
+        np.save(vectors_tmp, vectors)
+        with open(meta_tmp, "w") as f:
+            json.dump({"embedder": self.embedder.name, "ids": ids, "documents": documents, "hashes": hashes}, f)
+        os.replace(vectors_tmp, os.path.join(self.path, "vectors.npy"))
+        os.replace(meta_tmp, os.path.join(self.path, "meta.json"))
+
+    def upsert(self, documents, ids):
+        """
+        Inserts or updates documents by id. Returns how many were (re-)embedded, 0 means nothing was written
+        """
+        with self.lock:
+            position = {doc_id: i for i, doc_id in enumerate(self.ids)}
+            new_ids, new_documents, new_hashes = list(self.ids), list(self.documents), list(self.hashes)
+            changed = []
+            for doc_id, text in zip(ids, documents):
+                digest = self.digest(text)
+                i = position.get(doc_id)
+                if i is None:
+                    position[doc_id] = i = len(new_ids)
+                    new_ids.append(doc_id)
+                    new_documents.append(text)
+                    new_hashes.append(digest)
+                    changed.append(i)
+                elif new_hashes[i] != digest:
+                    new_documents[i], new_hashes[i] = text, digest
+                    changed.append(i)
+            if not changed:
+                return 0
+
+            vectors = np.zeros((len(new_ids), self.embedder.dim), dtype=np.float32)
+            vectors[:len(self.vectors)] = self.vectors
+            vectors[changed] = self.embedder.embed([new_documents[i] for i in changed])
+            self.save(new_ids, new_documents, new_hashes, vectors)
+            # Swap in one go, a concurrent query sees either the old or the new index
+            self.ids, self.documents, self.hashes, self.vectors, self.weights = (
+                new_ids, new_documents, new_hashes, vectors, self.weigh(vectors))
+            return len(changed)
+
+    def count(self):
+        return len(self.ids)
+
+    def query(self, query_texts, n_results=2):
+        """
+        IDF-weighted cosine similarity against every document (one matrix product). Returns
+        {"ids": [[...]], "documents": [[...]], "distances": [[...]]} per query text, best first
+        """
+        ids, documents, vectors, (idf, norms) = self.ids, self.documents, self.vectors, self.weights
+        result = {"ids": [], "documents": [], "distances": []}
+        if not ids:
+            for _ in query_texts:
+                result["ids"].append([])
+                result["documents"].append([])
+                result["distances"].append([])
+            return result
+
+        queries = self.embedder.embed(query_texts) * idf
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores = (queries * idf) @ np.asarray(vectors).T / norms
+        k = min(n_results, len(ids))
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            result["ids"].append([ids[i] for i in top])
+            result["documents"].append([documents[i] for i in top])
+            result["distances"].append([float(1 - row[i]) for i in top])
+        return result
@@ -0,0 +1,10 @@
+import os
+import shutil
+import tempfile
+
+# Importing src.api builds a RagAgent, which seeds its local runbook index. Keep it out of the working tree
+RAG_INDEX_DIR = tempfile.mkdtemp(prefix="rag_index_")
+os.environ["RAG_INDEX_DIR"] = RAG_INDEX_DIR
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(RAG_INDEX_DIR, ignore_errors=True)
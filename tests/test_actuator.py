@@ -0,0 +1,114 @@
+import threading
+import time
+
+from src.actuator import DESIRED_KEY, Actuator
+
+
+class FakeDB:
+    """system_config + lease table in memory, shared by several actuators like one Postgres"""
+    def __init__(self):
+        self.config = {}
+        self.leases = {}
+        self.lock = threading.Lock()
+
+    def get_config(self, key):
+        return self.config.get(key)
+
+    def set_config(self, key, value):
+        self.config[key] = value
+
+    def acquire_lease(self, name, holder, ttl):
+        with self.lock:
+            current = self.leases.get(name)
+            if current and current[0] != holder and current[1] > time.monotonic():
+                return False
+            self.leases[name] = (holder, time.monotonic() + ttl)
+            return True
+
+    def release_lease(self, name, holder):
+        with self.lock:
+            if self.leases.get(name, (None,))[0] == holder:
+                del self.leases[name]
+
+class FakeOrchestrator:
+    """
+    Replica count and scale command in one. New replicas only show up after `lag` seconds,
+    like containers that are still starting
+    """
+    def __init__(self, replicas=1, lag=0.3):
+        self.running = replicas
+        self.lag = lag
+        self.calls = []
+
+    def count(self):
+        return self.running
+
+    def scale(self, target):
+        self.calls.append(target)
+        if target > self.running:
+            threading.Timer(self.lag, lambda: setattr(self, "running", max(self.running, target))).start()
+        else:
+            self.running = target
+        return {"backend": "fake", "to": target}
+
+def make_actuator(db, orchestrator, **limits):
+    actuator = Actuator(db=db)
+    actuator.mode = "docker"
+    actuator.docker_scaler = orchestrator
+    actuator.replicas = orchestrator
+    for key, value in limits.items():
+        setattr(actuator, key, value)
+    return actuator
+
+def test_repeated_scale_up_while_starting_does_not_over_scale():
+    orchestrator = FakeOrchestrator(replicas=1, lag=0.3)
+    actuator = make_actuator(FakeDB(), orchestrator)
+
+    # Autoscaler and chat agent both react to the same spike while the new container is starting
+    threads = [threading.Thread(target=actuator.scale_up) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    time.sleep(0.4)
+
+    assert orchestrator.running == 2
+    assert orchestrator.calls == [2]
+    assert actuator.db.config[DESIRED_KEY] == "2"
+
+def test_scaling_stays_within_bounds():
+    orchestrator = FakeOrchestrator(replicas=2, lag=0)
+    actuator = make_actuator(FakeDB(), orchestrator, min_replicas=2, max_replicas=4)
+
+    assert actuator.scale_up(5) == 4
+    time.sleep(0.05)
+    assert actuator.scale_down(10) == 2
+    assert orchestrator.calls == [4, 2]
+
+def test_only_the_lease_holder_scales():
+    db = FakeDB()
+    first = make_actuator(db, FakeOrchestrator(lag=0))
+    second = make_actuator(db, FakeOrchestrator(lag=0), lease_wait=0.1)
+
+    with first.leadership() as leader:
+        assert leader
+        assert second.scale_up() is None, "Other process holds the lease"
+    assert second.scale_up() == 2
+
+def test_reconcile_restores_desired_replicas():
+    orchestrator = FakeOrchestrator(replicas=3, lag=0)
+    db = FakeDB()
+    db.config[DESIRED_KEY] = "3"
+    actuator = make_actuator(db, orchestrator)
+
+    assert actuator.reconcile() is None, "Nothing to do while in sync"
+    orchestrator.running = 2    # A replica crashed
+    actuator.reconcile()
+    time.sleep(0.05)
+    assert orchestrator.calls == [3] and orchestrator.running == 3
+
+def test_safe_mode_never_scales():
+    actuator = Actuator(db=FakeDB())
+    assert actuator.mode == "safe_mode"
+    assert actuator.scale_up() is None
+    assert actuator.reconcile() is None
@@ -1,5 +1,12 @@
+import json
+import time
+import numpy as np
+from datetime import datetime
 from fastapi.testclient import TestClient
-from src.api import app
+from src.api import app, hub, hub_listen
+from src.database import CONFIG_CHANNEL, decode_cursor
+from src.encoding import COLUMNAR, JSON
+from src.host_facts import HostFacts
 
 client = TestClient(app)
 
@@ -23,7 +30,9 @@ def test_get_prediction(mocker):
     assert response.json() == {"status": "Success", "cpu": 60.0, "network": 3.0}
 
 def test_get_system_info(mocker):
-    mocker.patch('src.api.psutil.cpu_count', return_value=8)
+    mocker.patch('src.host_facts.psutil.cpu_count', return_value=8)
+    mocker.patch.object(HostFacts, '_shared', HostFacts())     # Fresh cache, facts are kept per process
+    mocker.patch('src.api.host_facts', HostFacts.shared())
     
     response = client.get("/system")
     assert response.status_code == 200
@@ -36,9 +45,19 @@ def test_chat_ai(mocker):
     assert response.status_code == 200
     assert response.json() == {"answer": "Scaling up the cluster."}
 
+def test_chat_stream(mocker):
+    mocker.patch('src.api.rag_agent.ask_stream', return_value=(piece for piece in ["Scaling ", "up the cluster."]))
+
+    response = client.post("/chat/stream", json={"question": "We have high traffic!"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [lines[0] for lines in events] == ["event: token", "event: token", "event: done"]
+    assert "".join(json.loads(lines[1][len("data: "):])["text"] for lines in events[:2]) == "Scaling up the cluster."
+
 def test_config_mode(mocker):
-    mocker.patch('src.api.db.get_config', return_value="manual")
-    mocker.patch('src.api.db.set_config')
+    mocker.patch('src.api.config.get', return_value="manual")
+    mocker.patch('src.api.config.set')
 
     res_get = client.get("/config/mode")
     assert res_get.status_code == 200
@@ -49,4 +68,128 @@ def test_config_mode(mocker):
     assert res_post.json() == {"status": "updated", "mode": "auto"}
 
     res_invalid = client.post("/config/mode", json={"value": "broken_mode"})
-    assert res_invalid.json() == {"error": "Invalid mode, Use 'auto' or 'manual'"}
\ No newline at end of file
+    assert res_invalid.json() == {"error": "Invalid mode, Use 'auto' or 'manual'"}
+
+def test_stream_mode_comes_from_the_config_cache(mocker):
+    mocker.patch('src.api.config.get', return_value="manual")
+    on_notify = mocker.patch('src.api.config.on_notify')
+    get_config = mocker.patch('src.api.db.get_config')
+    listen = mocker.patch('src.api.db.listen')
+    callback = mocker.Mock()
+
+    assert hub.mode() == "manual"
+    get_config.assert_not_called()
+
+    hub_listen([CONFIG_CHANNEL], callback)
+    forward = listen.call_args.args[1]
+    forward(CONFIG_CHANNEL, "scaling_mode")
+    on_notify.assert_called_once_with(CONFIG_CHANNEL, "scaling_mode")
+    callback.assert_called_once_with(CONFIG_CHANNEL, "scaling_mode")
+
+def test_get_metrics_for_host(mocker):
+    recent = mocker.patch('src.api.db.get_recent_metrics', return_value=[{"cpu": 10.0, "host": "node-2"}])
+
+    response = client.get("/metrics?limit=5&host=node-2")
+    assert response.status_code == 200
+    assert response.json()["data"][0]["host"] == "node-2"
+    recent.assert_called_once_with(limit=5, host="node-2")
+
+def test_fleet_summary_label_filter(mocker):
+    summary = mocker.patch('src.api.db.get_fleet_summary', return_value={"fleet": {"hosts": 0}, "hosts": []})
+
+    response = client.get("/fleet/summary?minutes=10&labels=env=prod,role=web")
+    assert response.status_code == 200
+    summary.assert_called_once_with(minutes=10, labels={"env": "prod", "role": "web"})
+
+def test_chat_times_out(mocker):
+    """
+    A hung LLM call answers with an error after LLM_TIMEOUT instead of holding the request forever
+    """
+    mocker.patch('src.api.LLM_TIMEOUT', 0.05)
+    mocker.patch('src.api.rag_agent.ask', side_effect=lambda question: time.sleep(0.5) or "late")
+
+    response = client.post("/chat", json={"question": "Are you there?"})
+    assert response.status_code == 200
+    assert "no answer within" in response.json()["answer"]
+
+def test_metrics_range_is_downsampled_on_server(mocker):
+    series = mocker.patch('src.api.db.get_series', return_value={
+        "resolution": "60s", "step": 60,
+        "data": [{"timestamp": "2024-01-01T00:00:00", "cpu_avg": 10.0}, {"timestamp": "2024-01-01T00:01:00", "cpu_avg": 20.0}],
+    })
+
+    response = client.get("/metrics?start=2024-01-01T00:00:00Z&end=2024-01-01T01:00:00Z&step=60&format=columnar")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["resolution"] == "60s" and body["count"] == 2
+    assert body["data"] == {"timestamp": [1704067200000, 1704067260000], "cpu_avg": [10.0, 20.0]}
+    args = series.call_args
+    assert args.args[0].tzinfo is None and args.kwargs["step"] == 60
+
+def test_metrics_range_point_limit():
+    response = client.get("/metrics?start=2024-01-01T00:00:00Z&max_points=1000000")
+    assert response.status_code == 400
+
+    assert client.get("/metrics?start=2024-01-01T00:00:00&agg=median").status_code == 400
+    assert client.get("/metrics?start=2024-01-02T00:00:00&end=2024-01-01T00:00:00").status_code == 400
+
+def test_stats_are_split_from_the_pool(mocker):
+    mocker.patch('src.api.db.pool_stats', return_value={"size": 4, "in_use": 1})
+
+    assert client.get("/stats/db").json() == {"size": 4, "in_use": 1}
+    stats = client.get("/stats").json()
+    assert {"stream", "config", "retrieval", "chat"} <= set(stats)
+    assert "answer_cache" in stats["chat"] and "size" not in stats
+
+def test_metrics_export_pages_with_cursor(mocker):
+    last = (datetime(2024, 1, 1, 0, 0, 5), 42)
+    page = mocker.patch('src.api.db.get_raw_metrics', side_effect=[([{"cpu": 1.0}], last), ([{"cpu": 2.0}], None)])
+
+    first = client.get("/metrics/export?start=2024-01-01T00:00:00&limit=1").json()
+    assert decode_cursor(first["next_cursor"]) == last
+
+    second = client.get(f"/metrics/export?start=2024-01-01T00:00:00&limit=1&cursor={first['next_cursor']}").json()
+    assert second == {"count": 1, "next_cursor": None, "data": [{"cpu": 2.0}]}
+    assert page.call_args.kwargs["after"] == last
+
+    assert client.get("/metrics/export?start=2024-01-01T00:00:00&cursor=nope").status_code == 400
+
+def test_metrics_content_negotiation(mocker):
+    columns = {"timestamp": np.array([1704067200000, 1704067201000]), "cpu": np.array([10.0, np.nan]), "host": ["a", "a"]}
+    mocker.patch('src.api.db.get_recent_columns', return_value=columns)
+
+    response = client.get("/metrics?limit=2", headers={"Accept": f"{JSON};q=0.5, {COLUMNAR}"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == COLUMNAR
+    assert response.json() == {"count": 2, "data": {"timestamp": [1704067200000, 1704067201000], "cpu": [10.0, None], "host": ["a", "a"]}}
+
+    assert client.get("/metrics?format=yaml").status_code == 400
+    mocker.patch('src.encoding.msgpack', None)
+    assert client.get("/metrics?format=msgpack").status_code == 406
+
+def test_large_metric_responses_are_compressed(mocker):
+    rows = [{"timestamp": f"2024-01-01T00:00:{i % 60:02d}", "cpu": 10.0 + i, "host": "local"} for i in range(200)]
+    mocker.patch('src.api.db.get_recent_metrics', return_value=rows)
+
+    response = client.get("/metrics?limit=200", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["data"] == rows      # httpx decompresses
+    assert int(response.headers["content-length"]) < len(response.content) / 3
+
+def test_scale_is_submitted_as_a_job(mocker):
+    mocker.patch('src.api.config.get', return_value="manual")
+    submit = mocker.patch('src.api.scale_jobs.submit', return_value={"id": "abc", "status": "queued"})
+
+    response = client.post("/scale", json={"direction": "up", "steps": 2})
+    assert response.status_code == 202
+    assert response.json() == {"id": "abc", "status": "queued"}
+    submit.assert_called_once_with("up", 2, "api")
+
+    mocker.patch('src.api.scale_jobs.get', side_effect=lambda job_id: {"id": job_id, "status": "running"} if job_id == "abc" else None)
+    assert client.get("/scale/jobs/abc").json()["status"] == "running"
+    assert client.get("/scale/jobs/nope").status_code == 404
+
+    assert client.post("/scale", json={"direction": "sideways"}).status_code == 400
+    mocker.patch('src.api.config.get', return_value="auto")
+    assert client.post("/scale", json={"direction": "up"}).status_code == 409
+    submit.assert_called_once()
@@ -1,49 +1,110 @@
-from src.autoscaler import AutoScaler
+from datetime import datetime, timedelta
+import pytest
+from src.autoscaler import AutoScaler, ScalingPolicy, replay
+from src.database import CONFIG_CHANNEL, METRICS_CHANNEL
 
-def test_high_traffic_triggers_scale_up(mocker):
-    """
-    Test the AutoScaler scales UP when traffic exceeds the high threshold (2.0)
-    """
+def rows(values, start=datetime(2024, 1, 1)):
+    """Newest-first rows like get_fleet_metrics, one second apart"""
+    return [{'timestamp': (start + timedelta(seconds=i)).isoformat(), 'network': value} for i, value in enumerate(values)][::-1]
+
+@pytest.fixture
+def scaler(mocker):
     mocker.patch('src.autoscaler.DatabaseManager')
     mocker.patch('src.autoscaler.Actuator')
-
+    mocker.patch('src.autoscaler.ScaleJobs')
+    mocker.patch('src.autoscaler.ConfigCache')
     scaler = AutoScaler()
+    scaler.config.get.return_value = "auto"
+    scaler.actuator.get_container_count.return_value = 1
+    return scaler
 
-    scaler.db.get_config.return_value = "auto"
-    scaler.db.get_recent_metrics.return_value = [{'network': 3.5}]
+def test_high_traffic_triggers_scale_up(scaler):
+    """
+    Test the AutoScaler scales UP once traffic stays over the high threshold (2.0), in proportion to the load
+    """
+    scaler.db.get_fleet_metrics.return_value = rows([5.0] * 20)
     scaler.decide()
 
-    scaler.actuator.scale_up.assert_called_once()
-    scaler.actuator.scale_down.assert_not_called()
+    scaler.jobs.submit.assert_called_once_with("up", 2, source="autoscaler")    # 5 MB/s needs 3 replicas
 
-def test_low_traffic_triggers_scale_down(mocker):
+def test_single_spike_does_not_scale(scaler):
     """
-    Test the AutoScaler sclaes DOWN when traffic drops below the low threshold (0.1)
+    One noisy sample is smoothed away by the window
     """
-    mocker.patch('src.autoscaler.DatabaseManager')
-    mocker.patch('src.autoscaler.Actuator')
+    scaler.db.get_fleet_metrics.return_value = rows([0.5] * 20 + [6.0] + [0.5] * 20)
+    scaler.decide()
 
-    scaler = AutoScaler()
+    scaler.jobs.submit.assert_not_called()
+
+def test_low_traffic_triggers_scale_down(scaler):
+    """
+    Test the AutoScaler sclaes DOWN when traffic stays below the low threshold (0.1)
+    """
+    scaler.actuator.get_container_count.return_value = 2
+    scaler.db.get_fleet_metrics.return_value = rows([0.05] * 30)
+    scaler.decide()
+    scaler.jobs.submit.assert_not_called()     # Not low for long enough yet
 
-    scaler.db.get_config.return_value = "auto"
-    scaler.db.get_recent_metrics.return_value = [{'network': 0.05}]
+    scaler.db.get_fleet_metrics.return_value = rows([0.05] * 90)
     scaler.decide()
+    scaler.jobs.submit.assert_called_once_with("down", 1, source="autoscaler")
 
-    scaler.actuator.scale_down.assert_called_once()
-    scaler.actuator.scale_up.assert_not_called()
+def test_only_new_samples_are_fed(scaler):
+    scaler.db.get_fleet_metrics.return_value = rows([5.0] * 20)
+    scaler.decide()
+    scaler.decide()     # Same rows again, e.g. a NOTIFY for another host
+
+    assert len(scaler.policy.samples) == 20
+    scaler.jobs.submit.assert_called_once()
+
+def test_single_host_mode_reads_that_host(scaler):
+    scaler.host = "node-a"
+    scaler.db.get_recent_metrics.return_value = rows([5.0] * 20)
+    scaler.decide()
 
-def test_manual_mode_pauses_autoscaler(mocker):
+    scaler.db.get_recent_metrics.assert_called_once_with(limit=120, host="node-a")
+    scaler.db.get_fleet_metrics.assert_not_called()
+    scaler.jobs.submit.assert_called_once()
+
+def test_manual_mode_pauses_autoscaler(scaler):
     """
     Test the AutoScaler does nothing if the database says 'manual'
     """
-    mocker.patch('src.autoscaler.DatabaseManager')
-    mocker.patch('src.autoscaler.Actuator')
+    scaler.config.get.return_value = "manual"
+    scaler.decide()
 
-    scaler = AutoScaler()
+    scaler.db.get_fleet_metrics.assert_not_called()
+    scaler.jobs.submit.assert_not_called()
 
-    scaler.db.get_config.return_value = "manual"
+def test_notifications_wake_the_loop_and_refresh_mode(scaler):
+    scaler.db.get_fleet_metrics.return_value = []
     scaler.decide()
+    scaler.decide()
+    assert scaler.db.get_config.call_count == 0, "Mode comes from the config cache"
+
+    scaler.on_notify(METRICS_CHANNEL, "{}")
+    assert scaler.wake.is_set()
+    scaler.config.on_notify.assert_not_called()
+    scaler.on_notify(CONFIG_CHANNEL, "scaling_mode")
+    scaler.config.on_notify.assert_called_once_with(CONFIG_CHANNEL, "scaling_mode")
+
+def test_cooldown_spaces_out_actions():
+    policy = ScalingPolicy(window=5, up_for=0, cooldown_up=30)
+    actions = [t for t in range(120) if (policy.observe(t, 5.0) or policy.decide(t, replicas=1))]
+    assert actions == [0, 30, 60, 90]
+
+def test_hysteresis_keeps_replicas_at_moderate_load():
+    policy = ScalingPolicy(window=10, down_for=30, cooldown_down=0)
+    # 1.5 MB/s fits on one replica but would run it at 75%, above down_fraction: stay on 2
+    assert replay([(t, 1.5) for t in range(300)], policy, replicas=2) == []
+    # 0.5 MB/s: once the 10s mean is below 1.0 (~5s) and stays there for down_for, one replica goes
+    assert replay([(t, 0.5) for t in range(300, 400)], policy, replicas=2) == [(335, "down", 1, 1)]
+
+def test_replay_with_forecast_scales_ahead_of_load():
+    trace = [(t, 0.5 if t < 100 else 4.0) for t in range(200)]
+    reactive = replay(trace, ScalingPolicy())
+    forecasts = [value for _, value in trace[60:]] + [4.0] * 60    # The value a minute ahead
+    predictive = replay(trace, ScalingPolicy(), forecasts=forecasts)
 
-    scaler.db.get_recent_metrics.assert_not_called()
-    scaler.actuator.scale_up.assert_not_called()
-    scaler.actuator.scale_down.assert_not_called()
\ No newline at end of file
+    assert reactive[0][:2] == (123, "up") and reactive[-1][3] == 2
+    assert predictive[0][0] < 100, "Scaled before the load arrived"
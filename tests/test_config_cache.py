@@ -0,0 +1,98 @@
+import threading
+import time
+
+from src.config_cache import ConfigCache
+from src.database import CONFIG_CHANNEL
+
+
+class FakeListener:
+    def __init__(self, on_connect):
+        self.connected = threading.Event()
+        self.on_connect = on_connect
+
+    def reconnect(self):
+        self.on_connect()
+        self.connected.set()
+
+    def stop(self):
+        self.connected.clear()
+
+class ConfigDB:
+    """system_config in a dict, counts reads. `during_read` runs in the middle of a read, like a concurrent change"""
+    def __init__(self, listening=True):
+        self.config = {"scaling_mode": "auto"}
+        self.reads = 0
+        self.listening = listening
+        self.listener = None
+        self.during_read = None
+
+    def listen(self, channels, callback, on_connect=None):
+        assert channels == [CONFIG_CHANNEL]
+        self.listener = FakeListener(on_connect)
+        if self.listening:
+            self.listener.reconnect()
+        return self.listener
+
+    def get_config(self, key):
+        self.reads += 1
+        value = self.config.get(key)
+        if self.during_read:
+            self.during_read()
+            self.during_read = None
+        return value
+
+    def set_config(self, key, value):
+        self.config[key] = value
+
+def test_reads_are_cached_until_notified():
+    db = ConfigDB()
+    cache = ConfigCache(db)
+
+    assert [cache.get("scaling_mode") for _ in range(100)] == ["auto"] * 100
+    assert db.reads == 1
+
+    db.config["scaling_mode"] = "manual"     # Another process: set_config + NOTIFY
+    cache.on_notify(CONFIG_CHANNEL, "scaling_mode")
+    assert cache.get("scaling_mode") == "manual"
+    assert db.reads == 2
+    assert cache.stats()["hits"] == 99
+
+def test_without_listen_values_expire():
+    db = ConfigDB(listening=False)
+    cache = ConfigCache(db, fallback_ttl=0.05)
+
+    cache.get("scaling_mode")
+    cache.get("scaling_mode")
+    assert db.reads == 1
+    time.sleep(0.06)
+    db.config["scaling_mode"] = "manual"
+    assert cache.get("scaling_mode") == "manual"
+
+def test_read_racing_a_change_is_not_kept():
+    db = ConfigDB()
+    cache = ConfigCache(db)
+    db.during_read = lambda: cache.on_notify(CONFIG_CHANNEL, "scaling_mode")
+
+    cache.get("scaling_mode")
+    cache.get("scaling_mode")
+    assert db.reads == 2, "The first read may predate the change"
+
+def test_reconnect_drops_everything():
+    db = ConfigDB()
+    cache = ConfigCache(db, fallback_ttl=0)
+    cache.get("scaling_mode")
+
+    db.listener.connected.clear()    # Notifications sent now are lost
+    db.config["scaling_mode"] = "manual"
+    db.listener.reconnect()
+    assert cache.get("scaling_mode") == "manual"
+
+def test_set_writes_through():
+    db = ConfigDB()
+    cache = ConfigCache(db)
+    cache.get("scaling_mode")
+
+    cache.set("scaling_mode", "manual")
+    assert db.config["scaling_mode"] == "manual"
+    assert cache.get("scaling_mode") == "manual"
+    assert db.reads == 1
@@ -0,0 +1,218 @@
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from psycopg2 import extensions
+
+from src import migrations
+from src.database import DatabaseManager
+from src.db_pool import ConnectionPool, PoolTimeout
+
+DDL = re.compile(r"^\s*(CREATE|ALTER|DROP)\b", re.IGNORECASE)
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection, just enough for the pool"""
+    def __init__(self):
+        self.closed = 0
+        self.info = type("Info", (), {"transaction_status": extensions.TRANSACTION_STATUS_IDLE})()
+
+    def close(self):
+        self.closed = 1
+
+    def rollback(self):
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+@pytest.fixture
+def fake_connect(mocker):
+    return mocker.patch('src.db_pool.psycopg2.connect', side_effect=lambda **kwargs: FakeConnection())
+
+def test_pool_reuses_connections(fake_connect):
+    pool = ConnectionPool({"host": "x"}, min_size=1, max_size=2)
+
+    first = pool.getconn()
+    pool.putconn(first)
+    second = pool.getconn()
+
+    assert first is second
+    assert fake_connect.call_count == 1
+    assert pool.stats()["in_use"] == 1
+
+def test_pool_is_bounded_and_times_out(fake_connect):
+    pool = ConnectionPool({"host": "x"}, min_size=0, max_size=1, timeout=0.05)
+    pool.getconn()
+
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+
+def test_pool_waiter_gets_returned_connection(fake_connect):
+    pool = ConnectionPool({"host": "x"}, min_size=0, max_size=1, timeout=2)
+    held = pool.getconn()
+
+    threading.Timer(0.05, pool.putconn, args=(held,)).start()
+    assert pool.getconn() is held
+
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["wait_time_ms"] > 0
+
+def test_pool_replaces_broken_connections(fake_connect):
+    pool = ConnectionPool({"host": "x"}, min_size=0, max_size=1)
+    broken = pool.getconn()
+    broken.closed = 2   # What psycopg2 reports after the server drops the socket
+    pool.putconn(broken)
+
+    assert pool.stats()["size"] == 0
+    assert pool.getconn() is not broken
+    assert pool.stats()["discarded"] == 1
+
+def test_pool_health_checks_stale_connections(fake_connect, mocker):
+    pool = ConnectionPool({"host": "x"}, min_size=1, max_size=1, max_idle=0)
+    stale = pool._idle[0][0]
+    mocker.patch.object(stale, "cursor", create=True, side_effect=Exception("server closed the connection"))
+    time.sleep(0.01)
+
+    assert pool.getconn() is not stale
+    assert fake_connect.call_count == 2
+
+def test_shared_pool_per_settings(fake_connect):
+    settings = {"host": "shared-test", "port": "5432"}
+    assert ConnectionPool.shared(settings) is ConnectionPool.shared(dict(settings))
+    assert ConnectionPool.shared(settings) is not ConnectionPool.shared({"host": "other-test"})
+
+class RecordingDB:
+    """
+    Connection, cursor and pool in one: records every statement and answers the catalog lookups
+    DatabaseManager and the migrations make. `versions` is what schema_migrations holds
+    """
+    def __init__(self, versions=()):
+        self.versions = set(versions)
+        self.statements = []
+        self.result = []
+        self.connection = type("Info", (), {"encoding": "UTF8"})()    # For execute_values
+
+    def getconn(self):
+        return self
+
+    def putconn(self, connection):
+        pass
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def mogrify(self, template, args):
+        return repr(tuple(args)).encode()
+
+    def execute(self, query, params=None):
+        text = " ".join((query.decode() if isinstance(query, bytes) else str(query)).split())
+        self.statements.append(text)
+        if "to_regclass('schema_migrations')" in text:
+            self.result = [("schema_migrations" if self.versions else None,)]
+        elif text.startswith("SELECT version FROM schema_migrations"):
+            self.result = [(version,) for version in sorted(self.versions)]
+        elif text.startswith("INSERT INTO schema_migrations"):
+            self.versions.add(params[0])
+        elif "to_regclass(%s)" in text:
+            self.result = [(None,)]    # Empty database
+        elif "RETURNING id" in text:
+            self.result = [(1,)]
+        else:
+            self.result = []
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+@pytest.fixture
+def recording(mocker):
+    recorder = RecordingDB(versions=[version for version, _, _ in migrations.MIGRATIONS])
+    mocker.patch('src.database.ConnectionPool.shared', return_value=recorder)
+    mocker.patch('src.database.SCHEMA_CHECKED', set())
+    return recorder
+
+def test_hot_path_issues_no_ddl(recording):
+    """
+    The schema is checked once per process at startup, after that a save or a read is just its own statements
+    """
+    db = DatabaseManager(auto_migrate=True)
+    assert len(recording.statements) == 2, "Startup: one version check, nothing to apply"
+    DatabaseManager(auto_migrate=True)
+    assert len(recording.statements) == 2, "Checked once per process"
+
+    db.save_metric(cpu=1.0, memory=2.0, disk=3.0, network=0.5)     # First save registers the host
+    recording.statements.clear()
+    db.save_metric(cpu=1.0, memory=2.0, disk=3.0, network=0.5)
+    assert len(recording.statements) == 2, "Batch insert + NOTIFY"
+
+    recording.statements.clear()
+    db.get_recent_metrics(limit=5)
+    assert len(recording.statements) == 1
+    assert not [statement for statement in recording.statements if DDL.match(statement)]
+
+def test_series_step_is_widened_to_max_points(recording):
+    db = DatabaseManager(auto_migrate=True)
+    start = datetime(2024, 1, 1)
+
+    series = db.get_series(start, start + timedelta(days=30), step=1, max_points=500)
+    assert series["step"] == 7200, "step=1 over 30 days would be 2.6M buckets, widened and served from the 1h rollup"
+    assert series["resolution"] == "3600s"
+    assert db.get_series(start, start + timedelta(days=30), step=86400)["step"] == 86400, "Coarse enough already"
+
+def test_lttb_over_several_hosts_keeps_the_point_bound(recording, mocker):
+    db = DatabaseManager(auto_migrate=True)
+    start = datetime(2024, 1, 1)
+    rows = [{"host": host, "timestamp": (start + timedelta(seconds=i)).isoformat(), "cpu": 1.0} for i in range(4) for host in "ab"]
+    mocker.patch.object(db, "get_raw_metrics", return_value=(rows, None))
+    series = mocker.patch.object(db, "get_series", return_value={"step": 1, "data": []})
+
+    result = db.get_lttb_series(start, start + timedelta(hours=2), max_points=2000, raw_limit=1000)
+    assert series.call_args.kwargs["max_points"] == 2000, "The bound can't be below the points asked for"
+    assert series.call_args.kwargs["step"] == 1
+    assert result["resolution"] == "1s", "The step the series actually used"
+
+    series.return_value = {"step": 15, "data": []}
+    assert db.get_lttb_series(start, start + timedelta(hours=2), max_points=200)["resolution"] == "15s"
+
+def test_migrations_apply_once_in_order(mocker):
+    recorder = RecordingDB()
+    mocker.patch('src.database.ConnectionPool.shared', return_value=recorder)
+    mocker.patch('src.database.SCHEMA_CHECKED', set())
+    db = DatabaseManager(auto_migrate=False)
+    assert recorder.statements == []
+
+    assert [version for version, _, _ in migrations.pending(db)] == [1, 2, 3, 4]
+    assert migrations.migrate(db) == [1, 2, 3, 4]
+    assert any(DDL.match(statement) for statement in recorder.statements)
+    assert migrations.pending(db) == []
+
+    recorder.statements.clear()
+    assert migrations.migrate(db) == []
+    assert not [statement for statement in recorder.statements if DDL.match(statement)]
+
+def test_shipped_migrations_ignore_the_live_layout(mocker):
+    recorder = RecordingDB()
+    mocker.patch('src.database.ConnectionPool.shared', return_value=recorder)
+    mocker.patch('src.database.SCHEMA_CHECKED', set())
+    mocker.patch('src.database.ROLLUP_FIELDS', [("cpu", "cpu_usage"), ("gpu", "gpu_usage")])
+    db = DatabaseManager(auto_migrate=False)
+
+    assert migrations.migrate(db) == [1, 2, 3, 4]
+    rollups = " ".join(statement for statement in recorder.statements if "system_metrics_1m" in statement)
+    assert "gpu_" not in rollups, "A new field needs its own migration"
+    assert "network_sum DOUBLE PRECISION" in rollups
@@ -0,0 +1,119 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.actuator import Actuator
+from src.docker_scaler import NUMBER_LABEL, DockerScaler, NoTemplate
+
+
+class FakeContainer:
+    def __init__(self, docker, name, number, status="running", labels=None, start_delay=0.2):
+        self.docker = docker
+        self.name = name
+        self.status = status
+        self.labels = {**(labels or {"com.docker.compose.service": "nginx"}), NUMBER_LABEL: str(number)}
+        self.start_delay = start_delay
+        self.health = None
+        self.attrs = {}
+        self.refresh()
+
+    def refresh(self):
+        state = {"Status": self.status}
+        if self.health:
+            state["Health"] = {"Status": self.health}
+        self.attrs = {
+            "State": state,
+            "Config": {"Image": "nginx:alpine", "Cmd": ["nginx"], "Env": ["A=1"], "Labels": dict(self.labels)},
+            "HostConfig": {"PortBindings": {"80/tcp": [{"HostIp": "", "HostPort": "8080-8090"}]}, "RestartPolicy": {"Name": "no"}},
+            "NetworkSettings": {"Networks": {"app_default": {}}},
+        }
+
+    def start(self):
+        time.sleep(self.start_delay)    # Docker start latency, parallel starts overlap
+        self.status = "running"
+        self.health = "starting" if self.docker.healthcheck else None
+
+    def reload(self):
+        if self.health == "starting":
+            self.health = "healthy"     # Healthy on the next check
+        self.refresh()
+
+    def stop(self, timeout=10):
+        self.status = "exited"
+
+    def remove(self):
+        self.docker.all.remove(self)
+
+class FakeDocker:
+    def __init__(self, running=1, healthcheck=False):
+        self.healthcheck = healthcheck
+        self.all = [FakeContainer(self, f"app-nginx-{i}", i) for i in range(1, running + 1)]
+        self.created = []
+        self.lock = threading.Lock()
+        self.containers = SimpleNamespace(list=self.list, create=self.create)
+        self.api = SimpleNamespace(create_endpoint_config=lambda aliases: {"Aliases": aliases})
+        self.networks = SimpleNamespace(get=lambda name: None)
+
+    def list(self, all=False, filters=None):
+        return [c for c in self.all if all or c.status == "running"]
+
+    def create(self, image, name, labels, ports, **kwargs):
+        with self.lock:
+            container = FakeContainer(self, name, labels[NUMBER_LABEL], status="created", labels=labels)
+            self.created.append((image, name, ports, kwargs))
+            self.all.append(container)
+        return container
+
+def test_scale_up_clones_template_and_starts_in_parallel():
+    docker = FakeDocker(running=1, healthcheck=True)
+    report = DockerScaler(docker, "nginx", "app").scale(4)
+
+    assert [name for _, name, _, _ in docker.created] == ["app-nginx-2", "app-nginx-3", "app-nginx-4"]
+    image, _, ports, kwargs = docker.created[0]
+    assert image == "nginx:alpine" and kwargs["environment"] == ["A=1"]
+    assert ports == {"80/tcp": [{"HostIp": "", "HostPort": "8080-8090"}]}
+    assert kwargs["networking_config"] == {"app_default": {"Aliases": ["nginx"]}}
+
+    assert len(docker.list()) == 4
+    assert all(c.health == "healthy" for c in docker.list()[1:]), "Waited for the healthcheck"
+    assert (report["from"], report["to"], len(report["started"])) == (1, 4, 3)
+    assert report["ms"] < 500, "Three 200ms starts overlap"
+
+def test_stopped_replicas_are_restarted_before_cloning():
+    docker = FakeDocker(running=2)
+    docker.all[1].status = "exited"
+    DockerScaler(docker, "nginx", "app").scale(2)
+    assert docker.created == []
+    assert len(docker.list()) == 2
+
+def test_scale_down_removes_newest_replicas():
+    docker = FakeDocker(running=3)
+    report = DockerScaler(docker, "nginx", "app").scale(1)
+    assert [c.name for c in docker.all] == ["app-nginx-1"]
+    assert [entry["name"] for entry in report["stopped"]] == ["app-nginx-2", "app-nginx-3"]
+
+def test_not_ready_in_time_is_reported():
+    docker = FakeDocker(running=1)
+    scaler = DockerScaler(docker, "nginx", "app", ready_timeout=0.2)
+    container = docker.all[0]
+    container.status, container.health = "running", "starting"
+    container.reload = container.refresh    # Never gets healthy
+    with pytest.raises(TimeoutError):
+        scaler.wait_ready(container, time.perf_counter())
+
+def test_actuator_falls_back_to_compose(mocker):
+    actuator = Actuator()
+    actuator.mode = "docker"
+    actuator.docker_scaler = DockerScaler(FakeDocker(running=0), "nginx", "app")
+    run = mocker.patch('src.actuator.subprocess.run', return_value=SimpleNamespace(stdout="", stderr="", returncode=0))
+
+    report = actuator.execute_scale(2)
+    assert report["backend"] == "docker-compose"
+    assert "nginx=2" in run.call_args.args[0]
+    assert actuator.last_scale is report
+
+def test_no_template_raises():
+    with pytest.raises(NoTemplate):
+        DockerScaler(FakeDocker(running=0), "nginx", "app").scale(1)
@@ -0,0 +1,16 @@
+import numpy as np
+
+from src.downsample import lttb
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    x = np.arange(5000)
+    y = np.sin(x / 200)
+    y[1234] = 40    # A spike an average would flatten
+
+    picked = lttb(x, y, 200)
+    assert len(picked) == 200
+    assert picked[0] == 0 and picked[-1] == 4999
+    assert 1234 in picked
+    assert np.all(np.diff(picked) > 0)
+    assert len(lttb(x[:50], y[:50], 200)) == 50
@@ -0,0 +1,64 @@
+import gzip
+
+import numpy as np
+import orjson
+import pytest
+
+from src import encoding
+from src.encoding import (
+    ARROW,
+    COLUMNAR,
+    JSON,
+    MSGPACK,
+    NotAcceptable,
+    compress,
+    encode,
+    negotiate,
+    to_columns,
+)
+
+
+def test_negotiate_picks_highest_supported_q(mocker):
+    mocker.patch('src.encoding.msgpack', object())
+    assert negotiate(None) == JSON
+    assert negotiate("text/html, */*") == JSON
+    assert negotiate(f"{JSON};q=0.9, {COLUMNAR}") == COLUMNAR
+    assert negotiate(f"application/x-msgpack, {COLUMNAR};q=0.5") == MSGPACK
+    assert negotiate(f"{COLUMNAR}", format="rows") == JSON, "?format= wins over Accept"
+
+def test_unavailable_formats_are_skipped_or_refused(mocker):
+    mocker.patch('src.encoding.pa', None)
+    assert negotiate(f"{ARROW}, {COLUMNAR};q=0.1") == COLUMNAR
+    with pytest.raises(NotAcceptable):
+        negotiate(None, format="arrow")
+    with pytest.raises(ValueError):
+        negotiate(None, format="xml")
+
+def test_to_columns_uses_epoch_ms():
+    columns = to_columns([{"timestamp": "2024-01-01T00:00:01.500000", "cpu": 1.0}, {"timestamp": "2024-01-01T00:00:02", "cpu": None}])
+    assert columns["timestamp"].tolist() == [1704067201500, 1704067202000]
+    assert columns["cpu"] == [1.0, None]
+    assert to_columns([]) == {}
+
+def test_encode_and_compress_round_trip():
+    payload = {"count": 3, "data": {"timestamp": np.arange(3, dtype=np.int64), "cpu": np.array([1.0, np.nan, 3.0])}}
+    body = encode(payload, COLUMNAR)
+    assert orjson.loads(body) == {"count": 3, "data": {"timestamp": [0, 1, 2], "cpu": [1.0, None, 3.0]}}
+
+    assert compress(body, "gzip") == (body, None), "Small bodies are sent as is"
+    big = body * 100
+    packed, used = compress(big, "gzip, deflate")
+    assert used == "gzip" and gzip.decompress(packed) == big
+    assert compress(big, "identity") == (big, None)
+
+@pytest.mark.skipif(encoding.msgpack is None, reason="msgpack not installed")
+def test_msgpack_encoding():
+    payload = {"count": 1, "data": {"timestamp": np.array([5], dtype=np.int64), "cpu": np.array([2.5])}}
+    assert encoding.msgpack.unpackb(encode(payload, MSGPACK)) == {"count": 1, "data": {"timestamp": [5], "cpu": [2.5]}}
+
+@pytest.mark.skipif(encoding.pa is None, reason="pyarrow not installed")
+def test_arrow_encoding():
+    payload = {"count": 2, "data": {"timestamp": np.array([5, 6], dtype=np.int64), "cpu": np.array([2.5, np.nan])}}
+    table = encoding.pa.ipc.open_stream(encode(payload, ARROW)).read_all()
+    assert table.column("cpu").to_pylist() == [2.5, None]
+    assert table.schema.metadata[b"count"] == b"2"
@@ -0,0 +1,42 @@
+import socket
+from types import SimpleNamespace
+
+from src.host_facts import HostFacts
+
+
+def addr(ip):
+    return SimpleNamespace(family=socket.AF_INET, address=ip)
+
+def fake_interfaces(mocker, interfaces):
+    mocker.patch('src.host_facts.psutil.net_if_addrs', return_value={name: [addr(ip)] for name, ip in interfaces.items()})
+    mocker.patch('src.host_facts.psutil.net_if_stats', return_value={name: SimpleNamespace(isup=True) for name in interfaces})
+
+def test_facts_are_cached(mocker):
+    facts = HostFacts(disk_ttl=60)
+    disk = mocker.patch('src.host_facts.psutil.disk_usage', return_value=SimpleNamespace(total=100 * 1024 ** 3, used=40 * 1024 ** 3))
+    cores = mocker.spy(facts, "_read_static")
+
+    for _ in range(5):
+        info = facts.system_info()
+
+    assert info["disk_used"] == 40.0
+    assert disk.call_count == 1
+    assert cores.call_count == 1
+
+def test_interface_works_offline(mocker):
+    """
+    No route to 8.8.8.8 (air-gapped host): falls back to the first interface that is up
+    """
+    fake_interfaces(mocker, {"lo": "127.0.0.1", "eth0": "10.0.0.5"})
+    mocker.patch('src.host_facts.socket.socket', side_effect=OSError("Network is unreachable"))
+
+    assert HostFacts().interface() == "eth0 - 10.0.0.5"
+
+def test_interface_redetected_when_addresses_change(mocker):
+    facts = HostFacts(interface_ttl=3600, change_check=0)
+    mocker.patch('src.host_facts.socket.socket', side_effect=OSError("offline"))
+    fake_interfaces(mocker, {"eth0": "10.0.0.5"})
+    assert facts.interface() == "eth0 - 10.0.0.5"
+
+    fake_interfaces(mocker, {"wlan0": "192.168.1.20"})
+    assert facts.interface() == "wlan0 - 192.168.1.20"
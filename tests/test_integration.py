@@ -1,7 +1,15 @@
+import json
 import pytest
 import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
 from testcontainers.postgres import PostgresContainer
-from src.database import DatabaseManager
+from src import migrations
+from src.autoscaler import AutoScaler
+from src.database import CONFIG_CHANNEL, METRICS_CHANNEL, DatabaseManager
+from src.encoding import epoch_ms
+from src.predictor import TARGETS, Predictor
 
 @pytest.fixture(scope="module")
 def postgres_db():
@@ -33,4 +41,296 @@ def test_database_metrics_pipeline(postgres_db):
 
     assert len(metrics) == 1, "Database record matched"
     assert metrics[0]['network'] == 3.5, "Network traffic matched"
-    assert metrics[0]['cpu'] == 50.0, "CPU mached"
\ No newline at end of file
+    assert metrics[0]['cpu'] == 50.0, "CPU mached"
+
+def test_metrics_table_is_partitioned_with_retention(postgres_db):
+    """
+    Rows land in daily partitions and maintenance drops the ones past retention
+    """
+    db = DatabaseManager()
+    old_day = datetime.now() - timedelta(days=40)
+    db.save_metrics([(old_day, 10.0, 20.0, 30.0, 0.5), (datetime.now(), 11.0, 21.0, 31.0, 0.6)])
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'system_metrics'")
+        assert cursor.fetchone()[0] == "p", "Parent table partitioned"
+        cursor.execute("SELECT COUNT(*) FROM system_metrics_default")
+        assert cursor.fetchone()[0] == 1, "Day without a partition caught by default"
+
+    result = db.run_maintenance(days_ahead=1, retention_days=400)
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", (f"system_metrics_p{datetime.now() + timedelta(days=1):%Y%m%d}",))
+        assert cursor.fetchone()[0] is not None, "Tomorrow's partition created ahead of time"
+        cursor.execute("SELECT COUNT(*) FROM system_metrics_default")
+        assert cursor.fetchone()[0] == 1, "Old row kept while inside retention"
+
+    db.run_maintenance(days_ahead=1, retention_days=30)
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM system_metrics WHERE timestamp < NOW() - INTERVAL '30 days'")
+        assert cursor.fetchone()[0] == 0, "Expired rows removed"
+    assert result["dropped"] == []
+
+def test_legacy_metrics_table_is_migrated(postgres_db):
+    """
+    A plain system_metrics table from before partitioning (and before schema_migrations) is converted in place, rows kept
+    """
+    db = DatabaseManager()
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("DROP TABLE system_metrics, system_metrics_1m, system_metrics_1h, schema_migrations CASCADE")
+        cursor.execute("""
+            CREATE TABLE system_metrics(
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                cpu_usage REAL, memory_usage REAL, disk_usage REAL, network_mbps REAL
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO system_metrics (timestamp, cpu_usage, memory_usage, disk_usage, network_mbps)
+            VALUES (NOW() - INTERVAL '2 days', 1, 2, 3, 4), (NOW(), 5, 6, 7, 8)
+        """)
+        connection.commit()
+
+    assert migrations.migrate(db) == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.migrate(db) == [], "Recorded, runs once"
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'system_metrics'")
+        assert cursor.fetchone()[0] == "p"
+        cursor.execute("SELECT COUNT(*) FROM system_metrics_default")
+        assert cursor.fetchone()[0] == 0, "Every migrated day got its own partition"
+    assert len(db.get_recent_metrics(limit=10)) == 2
+    assert db.get_summary(hours=72)["data_points"] == 2, "Rollups backfilled from the migrated rows"
+
+def test_rollups_match_raw_data(postgres_db):
+    """
+    Rollups are maintained on insert and summaries/series read from them agree with the raw rows
+    """
+    db = DatabaseManager()
+    now = datetime.now().replace(second=30, microsecond=0)
+    samples = [(now - timedelta(minutes=i), 10.0 + i, 50.0, 40.0, 1.0 + i) for i in range(120)]
+    db.save_metrics(samples[:60])
+    db.save_metrics(samples[60:])
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT SUM(samples) FROM system_metrics_1h")
+        hourly = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM system_metrics")
+        assert hourly == cursor.fetchone()[0], "Every raw row counted once in the 1h rollup"
+
+    summary = db.get_24h_summary()
+    assert summary["cpu_max"] >= 129.0
+    assert summary["data_points"] >= 120
+
+    series = db.get_series(now - timedelta(hours=3), now + timedelta(minutes=1), step=3600)
+    assert series["resolution"] == "3600s", "Hourly step served from the 1h rollup"
+    assert sum(point["samples"] for point in series["data"]) >= 60
+
+    fine = db.get_series(now - timedelta(minutes=10), now, step=60)
+    assert fine["resolution"] == "60s"
+    assert len(fine["data"]) >= 9, "One point per minute"
+
+def test_samples_are_tagged_per_host(postgres_db):
+    """
+    Two agents write into the same tables, queries can scope to one host or aggregate the fleet
+    """
+    db = DatabaseManager()
+    db.register_host("node-a", {"env": "prod", "role": "web"})
+    db.register_host("node-b", {"env": "staging"})
+    now = datetime.now()
+    db.save_metrics([(now, 80.0, 50.0, 40.0, 2.0)], host="node-a")
+    db.save_metrics([(now, 20.0, 30.0, 40.0, 1.0)], host="node-b")
+
+    only_a = db.get_recent_metrics(limit=5, host="node-a")
+    assert {row["host"] for row in only_a} == {"node-a"}
+    assert only_a[0]["cpu"] == 80.0
+    assert db.get_latest_timestamp(host="node-a").replace(tzinfo=None) == now
+
+    fleet = db.get_fleet_summary(minutes=5)
+    names = {h["host"] for h in fleet["hosts"]}
+    assert {"node-a", "node-b"} <= names
+    assert fleet["fleet"]["hosts"] == len(names)
+
+    prod = db.get_fleet_summary(minutes=5, labels={"env": "prod"})
+    assert [h["host"] for h in prod["hosts"]] == ["node-a"]
+
+    hosts = {h["host"]: h for h in db.get_hosts()}
+    assert hosts["node-a"]["labels"] == {"env": "prod", "role": "web"}
+    assert hosts["node-a"]["last_seen"] is not None
+
+def test_detail_series_round_trip(postgres_db):
+    """
+    Per-core / per-NIC samples: one series row per label set, the latest value comes back per series
+    """
+    db = DatabaseManager()
+    db.register_host("node-c")
+    now = datetime.now()
+    db.save_samples([
+        (now - timedelta(seconds=5), "cpu.core.percent", {"core": "0"}, 10.0),
+        (now, "cpu.core.percent", {"core": "0"}, 30.0),
+        (now, "cpu.core.percent", {"core": "1"}, 50.0),
+        (now, "net.rx_mbps", {"interface": "eth0"}, 1.5),
+    ], host="node-c")
+    # Same series again, ids are reused rather than duplicated
+    assert db.save_samples([(now + timedelta(seconds=1), "cpu.core.percent", {"core": "1"}, 55.0)], host="node-c")
+
+    cores = db.get_detail_metrics(host="node-c", prefix="cpu.core")
+    assert {(row["labels"]["core"], row["value"]) for row in cores} == {("0", 30.0), ("1", 55.0)}
+
+    everything = db.get_detail_metrics(host="node-c")
+    assert len(everything) == 3
+
+def test_saves_notify_listeners(postgres_db):
+    """
+    Every saved batch and config change is announced on its channel, the live stream relies on it
+    """
+    db = DatabaseManager()
+    received = []
+    listener = db.listen([METRICS_CHANNEL, CONFIG_CHANNEL], lambda channel, payload: received.append((channel, payload)))
+    try:
+        assert listener.connected.wait(5)
+        now = datetime.now()
+        db.save_metrics([(now - timedelta(seconds=1), 1.0, 2.0, 3.0, 0.1), (now, 1.0, 2.0, 3.0, 0.1)])
+        db.set_config("scaling_mode", "manual")
+
+        deadline = time.monotonic() + 5
+        while len(received) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        listener.stop()
+
+    metrics = [json.loads(payload) for channel, payload in received if channel == METRICS_CHANNEL]
+    assert metrics == [{"host": "local", "timestamp": now.isoformat(), "count": 2}]
+    assert (CONFIG_CHANNEL, "scaling_mode") in received
+
+def test_raw_export_pages_and_lttb(postgres_db):
+    """
+    Keyset pages cover the range exactly once, LTTB returns real samples incl. the spike
+    """
+    db = DatabaseManager()
+    db.register_host("node-export")
+    start = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+    samples = [(start + timedelta(seconds=i), 50.0 if i == 77 else 10.0, 20.0, 30.0, 1.0) for i in range(250)]
+    db.save_metrics(samples, host="node-export")
+
+    seen, after = [], None
+    while True:
+        rows, after = db.get_raw_metrics(start, start + timedelta(hours=1), limit=100, after=after, host="node-export")
+        seen += rows
+        if after is None:
+            break
+    assert len(seen) == 250
+    assert [row["timestamp"] for row in seen] == sorted(row["timestamp"] for row in seen)
+
+    series = db.get_lttb_series(start, start + timedelta(hours=1), max_points=20, host="node-export")
+    assert series["resolution"] == "raw" and len(series["data"]) == 20
+    assert 50.0 in [point["cpu"] for point in series["data"]]
+
+def test_recent_columns_match_rows(postgres_db):
+    """
+    The columnar fetch returns the same samples as get_recent_metrics, timestamps as epoch ms
+    """
+    db = DatabaseManager()
+    now = datetime.now().replace(microsecond=250000)
+    db.save_metrics([(now - timedelta(seconds=1), 11.0, 22.0, 33.0, 0.5), (now, 12.0, None, 34.0, 0.6)], host="node-columns")
+
+    rows = db.get_recent_metrics(limit=2, host="node-columns")
+    columns = db.get_recent_columns(limit=2, host="node-columns")
+    assert columns["cpu"].tolist() == [row["cpu"] for row in rows]
+    assert columns["timestamp"].tolist() == epoch_ms([row["timestamp"] for row in rows]).tolist()
+    assert np.isnan(columns["memory"][0])
+
+def test_scale_lease_is_exclusive_until_expiry(postgres_db):
+    db = DatabaseManager()
+    assert db.acquire_lease("test-lease", "a", ttl=30)
+    assert db.acquire_lease("test-lease", "a", ttl=30), "Holder can renew"
+    assert not db.acquire_lease("test-lease", "b", ttl=30)
+
+    db.release_lease("test-lease", "b")     # Not b's to release
+    assert not db.acquire_lease("test-lease", "b", ttl=30)
+    db.release_lease("test-lease", "a")
+    assert db.acquire_lease("test-lease", "b", ttl=0.1)
+    time.sleep(0.2)
+    assert db.acquire_lease("test-lease", "a", ttl=30), "Expired leases can be taken over"
+
+def test_scale_jobs_are_kept_in_history(postgres_db):
+    from src.scale_jobs import ScaleJobs
+    db = DatabaseManager()
+    actuator = type("Actuator", (), {"last_scale": None, "get_container_count": lambda self: 1,
+                                     "scale_up": lambda self, steps: 1 + steps})()
+    jobs = ScaleJobs(actuator, db)
+    job = jobs.wait(jobs.submit("up", 2, source="test")["id"], timeout=10)
+    jobs.shutdown()
+
+    saved = db.get_scale_job(job["id"])
+    assert saved["status"] == "succeeded"
+    assert (saved["source"], saved["replicas_from"], saved["replicas_to"]) == ("test", 1, 3)
+    assert saved["total_ms"] == pytest.approx(job["total_ms"], abs=0.1)
+    assert db.get_scale_history(limit=5)[0]["id"] == job["id"]
+
+def test_config_cache_follows_changes(postgres_db):
+    from src.config_cache import ConfigCache
+    db, other = DatabaseManager(), DatabaseManager()
+    cache = ConfigCache(db).start()
+    try:
+        assert cache.listener.connected.wait(5)
+        other.set_config("cache_test", "one")
+        time.sleep(0.2)
+        assert cache.get("cache_test") == "one"
+        assert cache.get("cache_test") == "one" and cache.stats()["hits"] == 1
+
+        other.set_config("cache_test", "two")     # As if from another process
+        deadline = time.monotonic() + 1
+        while cache.get("cache_test") != "two" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert cache.get("cache_test") == "two"
+        assert db.tables_ready, "Schema is checked once per process"
+    finally:
+        cache.stop()
+
+def test_fleet_series_waits_for_every_host(postgres_db):
+    """
+    Two agents flush on their own schedule. The fleet series averages them per second and only shows a second
+    once both batches for it are in, the predictor reads that instead of interleaved rows from both machines
+    """
+    db = DatabaseManager()
+    base = datetime.now().replace(microsecond=0) + timedelta(days=2)     # Newer than every other test's hosts
+    db.save_metrics([(base - timedelta(seconds=i), 30.0, 50.0, 40.0, 3.0) for i in range(1, 6)], host="fleet-b")
+    db.save_metrics([(base + timedelta(seconds=i), 10.0, 50.0, 40.0, 1.0) for i in range(10)], host="fleet-a")
+
+    predictor = Predictor()
+    predictor.refresh()
+    assert predictor.engine.last_timestamp() == (base - timedelta(seconds=1)).timestamp(), "fleet-b hasn't sent these seconds yet"
+
+    # fleet-b's next batch is older than what fleet-a already wrote
+    db.save_metrics([(base + timedelta(seconds=i), 30.0, 50.0, 40.0, 3.0) for i in range(10)], host="fleet-b")
+    rows = db.get_fleet_metrics(limit=10)
+    assert [row["timestamp"] for row in rows] == [(base + timedelta(seconds=i)).isoformat() for i in range(9, -1, -1)]
+    assert {(row["cpu"], row["network"], row["hosts"]) for row in rows} == {(20.0, 2.0, 2)}
+
+    predictor.refresh()
+    data = predictor.engine.buffer.view()
+    assert np.all(np.diff(data[:, 0]) > 0), "One row per timestamp"
+    assert data[-1, 0] == (base + timedelta(seconds=9)).timestamp()
+    assert np.all(data[-10:, 1 + TARGETS.index("cpu")] == 20.0)
+
+def test_autoscaler_sees_out_of_order_flushes(postgres_db):
+    """
+    node-b's batch arrives after node-a already wrote newer seconds. Every second still reaches the policy,
+    once, as the average of both hosts
+    """
+    db = DatabaseManager()
+    base = datetime.now().replace(microsecond=0) + timedelta(days=3)     # Newer than every other test's hosts
+    scaler = AutoScaler.__new__(AutoScaler)
+    scaler.db, scaler.host, scaler.last_seen = db, None, None
+
+    db.save_metrics([(base + timedelta(seconds=i), 10.0, 50.0, 40.0, 1.0) for i in range(5)], host="scale-b")
+    db.save_metrics([(base + timedelta(seconds=i), 10.0, 50.0, 40.0, 4.0) for i in range(5, 10)], host="scale-a")
+    db.save_metrics([(base + timedelta(seconds=i), 10.0, 50.0, 40.0, 4.0) for i in range(5)], host="scale-a")
+    first = scaler.new_samples()
+    assert [value for _, value in first] == [2.5] * 5, "Seconds 5-9: only scale-a so far, held back"
+
+    db.save_metrics([(base + timedelta(seconds=i), 10.0, 50.0, 40.0, 1.0) for i in range(5, 10)], host="scale-b")
+    second = scaler.new_samples()
+    assert [timestamp for timestamp, _ in first + second] == [(base + timedelta(seconds=i)).timestamp() for i in range(10)]
+    assert [value for _, value in second] == [2.5] * 5
+    assert scaler.new_samples() == []
@@ -0,0 +1,183 @@
+import time
+from types import SimpleNamespace
+
+from src.monitor import (
+    Collector,
+    CollectorSet,
+    MetricBuffer,
+    NetInterfaceCollector,
+    SystemMonitor,
+    Ticker,
+    build_collectors,
+)
+
+
+class FakeDB:
+    def __init__(self, up=True):
+        self.up = up
+        self.batches = []
+
+    def save_metrics(self, samples, host=None):
+        if not self.up:
+            return False
+        self.batches.append(list(samples))
+        return True
+
+    save_samples = save_metrics
+
+def test_buffer_flushes_in_bulk():
+    """
+    Many samples go out as one batch, not one INSERT each
+    """
+    db = FakeDB()
+    buffer = MetricBuffer(db, batch_size=100)
+    for i in range(50):
+        buffer.add((i, 1.0, 2.0, 3.0, 0.5))
+
+    assert buffer.flush()
+    assert len(db.batches) == 1
+    assert len(db.batches[0]) == 50
+    assert buffer.flushed == 50
+
+def test_buffer_keeps_samples_while_db_is_down():
+    """
+    A failed flush puts the batch back in order, nothing lost once the DB returns
+    """
+    db = FakeDB(up=False)
+    buffer = MetricBuffer(db)
+    for i in range(5):
+        buffer.add((i,))
+
+    assert not buffer.flush()
+    db.up = True
+    assert buffer.flush()
+    assert [s[0] for s in db.batches[0]] == [0, 1, 2, 3, 4]
+
+def test_buffer_drops_oldest_when_full():
+    db = FakeDB(up=False)
+    buffer = MetricBuffer(db, max_size=3)
+    for i in range(5):
+        buffer.add((i,))
+
+    assert buffer.dropped == 2
+    assert [s[0] for s in buffer.pending] == [2, 3, 4]
+
+def test_close_does_final_flush():
+    """
+    Ctrl+C path: whatever is still buffered is written before exit
+    """
+    db = FakeDB()
+    buffer = MetricBuffer(db, batch_size=100, flush_interval=60)
+    buffer.start()
+    buffer.add((1,))
+    buffer.add((2,))
+
+    assert buffer.close(timeout=2)
+    assert sum(len(b) for b in db.batches) == 2
+
+def test_ticker_does_not_drift():
+    """
+    Work done between ticks is absorbed by the schedule instead of adding to the period
+    """
+    ticker = Ticker(0.1)
+    start = time.monotonic()
+    for _ in range(5):
+        ticker.wait()
+        time.sleep(0.03)    # Simulated collection cost
+
+    elapsed = time.monotonic() - start
+    assert 0.5 <= elapsed < 0.6
+    assert ticker.missed == 0
+
+def test_ticker_skips_missed_ticks():
+    ticker = Ticker(0.1)
+    first = ticker.wait()
+    time.sleep(0.35)    # Stalled for three periods
+
+    assert ticker.wait() - first >= 0.29   # Jumped to the latest due tick
+    assert ticker.missed >= 2
+
+def test_network_rate_uses_elapsed_time(mocker):
+    """
+    Bytes moved are divided by the real interval, so the value is MB/s whatever the sampling period
+    """
+    mocker.patch('src.monitor.DatabaseManager')
+    counters = mocker.patch('src.monitor.psutil.net_io_counters')
+    counters.return_value = SimpleNamespace(bytes_sent=0, bytes_recv=0)
+    monitor = SystemMonitor()
+
+    counters.return_value = SimpleNamespace(bytes_sent=1024 * 1024, bytes_recv=1024 * 1024)
+    mocker.patch('src.monitor.time.monotonic', return_value=monitor.last_time + 0.5)
+    _, _, _, net = monitor.collect_metrics()
+
+    assert net == 4.0   # 2 MB in half a second
+
+def test_buffer_can_target_detail_series():
+    db = FakeDB()
+    buffer = MetricBuffer(db, method="save_samples")
+    buffer.add((0, "load.1m", {}, 0.5))
+
+    assert buffer.flush()
+    assert db.batches == [[(0, "load.1m", {}, 0.5)]]
+
+def test_net_interface_collector_reports_per_nic_rates(mocker):
+    counters = mocker.patch('src.monitor.psutil.net_io_counters')
+    counters.return_value = {
+        "eth0": SimpleNamespace(bytes_sent=0, bytes_recv=0),
+        "lo": SimpleNamespace(bytes_sent=0, bytes_recv=0),
+    }
+    collector = NetInterfaceCollector()
+
+    counters.return_value = {
+        "eth0": SimpleNamespace(bytes_sent=1024 * 1024, bytes_recv=2 * 1024 * 1024),
+        "lo": SimpleNamespace(bytes_sent=10**9, bytes_recv=10**9),
+    }
+    samples = collector.collect(elapsed=2.0)
+
+    assert ("net.rx_mbps", {"interface": "eth0"}, 1.0) in samples
+    assert ("net.tx_mbps", {"interface": "eth0"}, 0.5) in samples
+    assert all(labels["interface"] != "lo" for _, labels, _ in samples)
+
+def test_build_collectors_parses_spec():
+    collectors = build_collectors("load,top_processes:10,bogus")
+
+    assert [c.name for c in collectors] == ["load", "top_processes"]
+    assert collectors[1].every == 10
+    assert build_collectors("none") == []
+
+class Busy(Collector):
+    def __init__(self, name, cost):
+        super().__init__()
+        self.name = name
+        self.runs = 1
+        self.cost = cost
+
+def test_collector_set_backs_off_most_expensive_when_over_budget():
+    """
+    Over the CPU budget the costliest collector runs half as often, the cheap one is untouched
+    """
+    cheap, costly = Busy("cheap", 0.0001), Busy("costly", 0.01)
+    collectors = CollectorSet([cheap, costly], interval=1.0, cpu_budget=1.0)
+
+    collectors.enforce_budget(agent_cpu=3.0)
+    assert costly.every == 2
+    assert cheap.every == 1
+
+    # Quiet again: backed-off collectors recover towards their configured rate
+    collectors.enforce_budget(agent_cpu=0.1)
+    assert costly.every == 1
+    assert collectors.stats()["collectors"]["costly"]["cost_ms"] == 10.0
+
+def test_failing_collector_does_not_stop_the_others():
+    class Broken(Collector):
+        name = "broken"
+        def collect(self, elapsed):
+            raise RuntimeError("no sensors")
+
+    class Constant(Collector):
+        name = "constant"
+        def collect(self, elapsed):
+            return [("x", {}, 1.0)]
+
+    collectors = CollectorSet([Broken(), Constant()], interval=1.0)
+    assert collectors.collect(0) == [("x", {}, 1.0)]
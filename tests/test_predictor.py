@@ -0,0 +1,161 @@
+import threading
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from src.features import FeatureEngine, RingBuffer
+from src.predictor import Predictor
+
+
+class FakeDB:
+    """Newest-first rows like get_fleet_metrics, with a steady ramp so the models have something to learn"""
+    def __init__(self, rows=200):
+        self.start = datetime.now(UTC) - timedelta(seconds=rows)
+        self.rows = rows
+        self.calls = []
+
+    def add(self, count):
+        self.rows += count
+
+    def get_fleet_metrics(self, limit=10, step=None):
+        self.calls.append(limit)
+        rows = [
+            {"timestamp": (self.start + timedelta(seconds=i)).isoformat(), "cpu": 20 + i % 40, "memory": 50 + i % 7, "network": 1 + (i % 10) / 10}
+            for i in range(self.rows)
+        ]
+        return rows[::-1][:limit]
+
+    def get_latest_timestamp(self, host=None):
+        return self.start + timedelta(seconds=self.rows - 1)
+
+@pytest.fixture
+def predictor(mocker):
+    mocker.patch('src.predictor.DatabaseManager', return_value=FakeDB())
+    predictor = Predictor()
+    predictor.fit_workers = 0   # Fit inline, process pool is covered separately
+    return predictor
+
+def test_predict_trains_once_then_serves_from_memory(predictor, mocker):
+    first, status = predictor.predict_next_minute()
+    assert status == "Prediction Successful"
+    assert first["model"]["version"] == 1
+    assert set(first["cpu"]) == {"Linear", "RandomForest", "GradientBoosting"}
+
+    fit = mocker.spy(predictor, "fit")
+    for _ in range(3):
+        again, _ = predictor.predict_next_minute()
+
+    assert fit.call_count == 0, "Inference must not refit"
+    assert again["model"]["version"] == 1
+    assert predictor.db.calls[-1] == predictor.refresh_rows, "Inference only tops up the ring buffer"
+
+def test_retrain_after_enough_new_samples(predictor):
+    predictor.retrain_samples = 10
+    assert predictor.train()
+    assert not predictor.needs_training()
+
+    predictor.db.add(10)
+    assert predictor.needs_training()
+    assert predictor.train()
+    assert predictor.trained["version"] == 2
+
+def test_not_enough_data(mocker):
+    mocker.patch('src.predictor.DatabaseManager', return_value=FakeDB(rows=5))
+    predictions, status = Predictor().predict_next_minute()
+
+    assert predictions is None
+    assert status == "Gathering more data for AI models..."
+
+def test_predictions_cached_per_sample_and_version(predictor, mocker):
+    """
+    Repeat requests inside one sample interval are served from the cache, a new sample or model recomputes
+    """
+    predictor.train()
+    compute = mocker.spy(predictor, "compute")
+
+    first, _ = predictor.predict_next_minute()
+    second, _ = predictor.predict_next_minute()
+    assert compute.call_count == 1
+    assert (first["model"]["cached"], second["model"]["cached"]) == (False, True)
+
+    predictor.db.add(1)
+    predictor.predict_next_minute()
+    assert compute.call_count == 2
+
+    predictor.train()
+    predictor.predict_next_minute()
+    assert compute.call_count == 3
+
+def test_concurrent_requests_compute_once(predictor, mocker):
+    predictor.train()
+    release = threading.Event()
+    original = predictor.compute
+
+    def slow_compute(trained):
+        release.wait(2)
+        return original(trained)
+    compute = mocker.patch.object(predictor, "compute", side_effect=slow_compute)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(predictor.predict_next_minute())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert compute.call_count == 1
+    assert len(results) == 8
+    assert all(status == "Prediction Successful" for _, status in results)
+
+def test_multi_horizon_forecasts(predictor):
+    """
+    One forecast per horizon the history supports, the top level keeps the one-minute view
+    """
+    predictions, _ = predictor.predict_next_minute()
+
+    assert set(predictions["horizons"]) == {"10s", "1m"}, "200 samples can't train a 5 minute horizon"
+    assert predictions["horizon"] == "1m"
+    assert predictions["cpu"] == predictions["horizons"]["1m"]["cpu"]
+    assert set(predictions["horizons"]["10s"]) == {"cpu", "memory", "network"}
+
+def test_ring_buffer_wraps_in_order():
+    ring = RingBuffer(capacity=4, width=1)
+    for i in range(6):
+        ring.append([i])
+
+    assert ring.view()[:, 0].tolist() == [2, 3, 4, 5]
+    assert ring.view(last=2)[:, 0].tolist() == [4, 5]
+    assert ring.last()[0] == 5
+
+def test_vectorized_features_match_plain_python():
+    engine = FeatureEngine(capacity=200)
+    values = [float((i * 7) % 23) for i in range(100)]
+    for i, value in enumerate(values):
+        engine.append(1000.0 + i, [value, 0.0, 0.0])
+
+    X, rows = engine.matrix("cpu")
+    names = engine.names
+    last = X[-1]
+    assert rows[-1] == 99
+    assert last[names.index("lag_10")] == values[89]
+    assert last[names.index("mean_15")] == pytest.approx(sum(values[85:]) / 15)
+    assert last[names.index("std_15")] == pytest.approx(np.std(values[85:]))
+    assert last[names.index("velocity")] == values[99] - values[98]
+
+    ewma = values[0]
+    for value in values[1:]:
+        ewma = 0.3 * value + 0.7 * ewma
+    assert last[names.index("ewma")] == pytest.approx(ewma)
+    assert np.allclose(engine.latest("cpu"), X[-1:])
+
+def test_fits_run_in_process_pool(predictor):
+    predictor.fit_workers = 1
+    try:
+        assert predictor.train()
+        assert predictor.fit_pool is not None
+        predictions, _ = predictor.predict_next_minute()
+        assert set(predictions["cpu"]) == {"Linear", "RandomForest", "GradientBoosting"}
+    finally:
+        predictor.stop()
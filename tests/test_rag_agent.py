@@ -0,0 +1,129 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.cache import TTLCache
+from src.llm import FakeLLM
+from src.rag_agent import RagAgent
+
+DELAY = 0.1
+
+class SlowDB:
+    def __init__(self):
+        self.summaries = 0
+
+    def get_24h_summary(self):
+        time.sleep(DELAY)
+        self.summaries += 1
+        return {"data_points": 42, "cpu_max": 90}
+
+    def get_fleet_metrics(self, limit=10):
+        time.sleep(DELAY)
+        return [{"timestamp": "2024-01-01T00:00:00", "cpu": 12.5, "network": 0.3}]
+
+class SlowActuator:
+    def get_container_count(self):
+        time.sleep(DELAY)
+        return 3
+
+class FakeFacts:
+    def system_info(self):
+        raise OSError("psutil blew up")
+
+class FakeConfig:
+    def get(self, key):
+        return "manual"
+
+class FakeJobs:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, direction, steps=1, source="api"):
+        self.submitted.append(direction)
+        return {"id": "job1"}
+
+def make_agent(llm=None):
+    agent = RagAgent.__new__(RagAgent)
+    agent.db, agent.actuator, agent.host_facts, agent.config = SlowDB(), SlowActuator(), FakeFacts(), FakeConfig()
+    agent.retrieve = lambda question: time.sleep(DELAY) or "Check the logs"
+    agent.context_pool = ThreadPoolExecutor(max_workers=6)
+    agent.context_cache = TTLCache(max_size=8)
+    agent.summary_ttl, agent.containers_ttl = 60, 5
+    agent.llm = llm or FakeLLM("All good.")
+    agent.scale_jobs = FakeJobs()
+    agent.system_architecture = ""
+    agent.last_timings = {}
+    agent.answer_ttl = 30
+    agent.answer_cache = TTLCache(ttl=30)
+    return agent
+
+def test_context_is_gathered_concurrently():
+    agent = make_agent()
+
+    started = time.perf_counter()
+    context, timings = agent.gather_context("why is cpu high?")
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 3 * DELAY, "Four 100 ms lookups ran side by side, not one after another"
+    assert context["runbook"] == "Check the logs" and context["containers"] == 3 and context["mode"] == "manual"
+    assert context["hardware"] is None, "A failing stage is skipped, not fatal"
+    assert set(timings) == {"runbook", "containers", "hardware", "summary", "recent", "mode"}
+
+def test_slow_moving_context_is_reused():
+    agent = make_agent()
+    agent.gather_context("first")
+    _, timings = agent.gather_context("second")
+
+    assert agent.db.summaries == 1
+    assert timings["summary"] < DELAY * 1000 and timings["containers"] < DELAY * 1000
+    assert timings["recent"] >= DELAY * 1000, "Live metrics are read every time"
+
+def test_ask_reports_stage_latency():
+    agent = make_agent()
+
+    assert agent.ask("how are we doing?") == "All good."
+    prompt = agent.llm.prompts[0]
+    assert "Active Nginx Web Servers: 3" in prompt
+    assert "Data Points Collected: 42" in prompt
+    assert "unknown host" in prompt
+    assert {"context", "llm", "total", "recent"} <= set(agent.last_timings)
+    assert agent.last_timings["context"] < 3 * DELAY * 1000
+
+def test_answers_are_cached_per_question_and_context():
+    agent = make_agent(FakeLLM("CPU is fine.", latency=DELAY))
+
+    assert agent.ask("Is the CPU OK?") == "CPU is fine."
+    assert agent.ask("  is the cpu ok ") == "CPU is fine."
+    assert len(agent.llm.prompts) == 1, "Same question on the same context, answered from the cache"
+    assert "llm" not in agent.last_timings
+
+    agent.db.get_fleet_metrics = lambda limit=10: [{"timestamp": "2024-01-01T00:00:05", "cpu": 99.0, "network": 0.3}]
+    assert agent.ask("Is the CPU OK?") == "CPU is fine."
+    assert len(agent.llm.prompts) == 1, "New live samples alone don't change the key"
+
+    agent.config.get = lambda key: "auto"
+    agent.ask("Is the CPU OK?")
+    assert len(agent.llm.prompts) == 2, "New scaling mode, new answer"
+
+def test_scale_actions_are_never_cached():
+    agent = make_agent(FakeLLM("[ACTION: SCALE_UP]"))
+
+    assert "Command Accepted" in agent.ask("scale up")
+    assert "Command Accepted" in agent.ask("scale up")
+    assert agent.scale_jobs.submitted == ["up", "up"]
+
+def test_answer_is_streamed():
+    agent = make_agent(FakeLLM("CPU is at 12.5%, nothing to worry about.", latency=DELAY, chunk_size=8, chunk_delay=DELAY))
+
+    pieces = list(agent.ask_stream("how is the cpu?"))
+    assert len(pieces) > 1
+    assert "".join(pieces) == "CPU is at 12.5%, nothing to worry about."
+    assert agent.last_timings["first_token"] < agent.last_timings["total"] - 3 * DELAY * 1000
+
+    assert list(agent.ask_stream("How is the CPU?")) == ["CPU is at 12.5%, nothing to worry about."], "Cached: one piece"
+
+def test_streamed_action_tag_is_replaced_by_the_confirmation():
+    agent = make_agent(FakeLLM("[ACTION: SCALE_DOWN]", chunk_size=3))
+
+    pieces = list(agent.ask_stream("remove a server"))
+    assert len(pieces) == 1 and pieces[0].startswith("**Command Accepted:** scaling DOWN")
+    assert agent.scale_jobs.submitted == ["down"]
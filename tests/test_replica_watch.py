@@ -0,0 +1,98 @@
+import queue
+import time
+from types import SimpleNamespace
+
+from src.replica_watch import DockerReplicaWatcher, K8sReplicaWatcher
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+class FakeStream:
+    """Blocking event stream like docker's CancellableStream"""
+    def __init__(self):
+        self.events = queue.Queue()
+        self.closed = False
+
+    def __iter__(self):
+        while not self.closed:
+            try:
+                yield self.events.get(timeout=0.05)
+            except queue.Empty:
+                pass
+
+    def close(self):
+        self.closed = True
+
+class FakeDocker:
+    def __init__(self, running):
+        self.running = list(running)
+        self.stream = FakeStream()
+        self.list_calls = 0
+        self.containers = SimpleNamespace(list=self.list)
+
+    def list(self, filters=None):
+        self.list_calls += 1
+        assert "com.docker.compose.service=nginx" in filters["label"], "Filtered on the server, not by name"
+        return [SimpleNamespace(id=c) for c in self.running]
+
+    def events(self, decode=True, filters=None):
+        return self.stream
+
+def test_docker_count_follows_events_without_listing():
+    docker = FakeDocker(["a", "b"])
+    watcher = DockerReplicaWatcher(docker, "nginx", "system_monitoring_app").start()
+    try:
+        assert wait_for(watcher.synced.is_set)
+        assert watcher.count() == 2
+
+        docker.stream.events.put({"Action": "start", "id": "c"})
+        docker.stream.events.put({"Action": "start", "id": "c"})     # Duplicates don't double count
+        assert wait_for(lambda: watcher.count() == 3)
+        docker.stream.events.put({"Action": "die", "id": "a"})
+        docker.stream.events.put({"Action": "exec_start", "id": "b"})
+        assert wait_for(lambda: watcher.count() == 2)
+
+        for _ in range(100):
+            watcher.count()
+        assert docker.list_calls == 1, "Only the initial sync lists containers"
+    finally:
+        watcher.stop()
+
+def test_falls_back_to_cached_query_while_stream_is_down():
+    docker = FakeDocker(["a"])
+    watcher = DockerReplicaWatcher(docker, "nginx", "system_monitoring_app", fallback_ttl=60)     # Not started
+    assert watcher.count() == 1
+    docker.running.append("b")
+    assert watcher.count() == 1, "Fallback query is cached for fallback_ttl"
+    assert docker.list_calls == 1
+
+def deployment(replicas, ready=None, desired=None, version="1"):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(resource_version=version),
+        spec=SimpleNamespace(replicas=desired if desired is not None else replicas),
+        status=SimpleNamespace(replicas=replicas, ready_replicas=ready if ready is not None else replicas),
+    )
+
+def test_k8s_watch_resumes_from_resource_version(mocker):
+    api = mocker.Mock()
+    api.list_namespaced_deployment.return_value = SimpleNamespace(items=[deployment(1)], metadata=SimpleNamespace(resource_version="10"))
+    streams = []
+
+    def stream(fn, namespace, field_selector, resource_version, timeout_seconds):
+        streams.append(resource_version)
+        if len(streams) == 1:
+            yield {"type": "MODIFIED", "object": deployment(3, ready=1, desired=3, version="11")}
+        else:
+            watcher.stopping.set()
+            return
+    mocker.patch('src.replica_watch.watch.Watch').return_value.stream.side_effect = stream
+
+    watcher = K8sReplicaWatcher(api, "client-deployment", "default")
+    watcher.watch()
+    assert (watcher.count(), watcher.desired, watcher.ready) == (3, 3, 1)
+    assert streams == ["10", "11"], "Second watch request continues after the last event"
+    api.read_namespaced_deployment.assert_not_called()
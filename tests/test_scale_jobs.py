@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from src.scale_jobs import ScaleJobs
+
+
+class FakeActuator:
+    """Scales after `delay` seconds, `target` None means another scaler had the lease"""
+    def __init__(self, delay=0.2, target=3):
+        self.delay = delay
+        self.target = target
+        self.replicas = 2
+        self.last_scale = None
+        self.release = threading.Event()
+
+    def get_container_count(self):
+        return self.replicas
+
+    def scale_up(self, steps=1):
+        time.sleep(self.delay)
+        if self.target is not None:
+            self.last_scale = {"backend": "fake", "to": self.target, "ms": self.delay * 1000}
+            self.replicas = self.target
+        return self.target
+
+    def scale_down(self, steps=1):
+        raise RuntimeError("docker daemon gone")
+
+class HistoryDB:
+    def __init__(self):
+        self.saved = []
+
+    def save_scale_job(self, job):
+        self.saved.append(dict(job))
+
+    def get_scale_job(self, job_id):
+        rows = [job for job in self.saved if job["id"] == job_id]
+        return rows[-1] if rows else None
+
+def test_submit_returns_before_the_scale_finishes():
+    jobs = ScaleJobs(FakeActuator(delay=0.3), HistoryDB())
+    started = time.perf_counter()
+    job = jobs.submit("up", 1, source="api")
+
+    assert time.perf_counter() - started < 0.1
+    assert job["status"] == "queued"
+    assert jobs.get(job["id"])["status"] in ("queued", "running")
+
+    done = jobs.wait(job["id"], timeout=5)
+    assert done["status"] == "succeeded"
+    assert (done["replicas_from"], done["replicas_to"]) == (2, 3)
+    assert done["report"]["backend"] == "fake"
+    assert done["run_ms"] >= 300 and done["total_ms"] >= done["run_ms"]
+
+def test_every_status_change_is_recorded():
+    db = HistoryDB()
+    jobs = ScaleJobs(FakeActuator(delay=0), db)
+    job = jobs.wait(jobs.submit("up")["id"], timeout=5)
+
+    assert [row["status"] for row in db.saved] == ["queued", "running", "succeeded"]
+    assert db.saved[-1] == {key: value for key, value in job.items() if key != "replicas_now"}
+
+def test_jobs_run_one_at_a_time_in_order():
+    actuator = FakeActuator(delay=0.1)
+    jobs = ScaleJobs(actuator, HistoryDB())
+    first, second = jobs.submit("up"), jobs.submit("up")
+
+    assert jobs.get(second["id"])["status"] == "queued"
+    jobs.wait(second["id"], timeout=5)
+    first, second = jobs.get(first["id"]), jobs.get(second["id"])
+    assert second["started_at"] >= first["finished_at"]
+    assert second["queue_ms"] >= 50
+
+def test_skipped_and_failed_jobs():
+    jobs = ScaleJobs(FakeActuator(delay=0, target=None), HistoryDB())
+    skipped = jobs.wait(jobs.submit("up")["id"], timeout=5)
+    failed = jobs.wait(jobs.submit("down")["id"], timeout=5)
+
+    assert skipped["status"] == "skipped" and skipped["report"] is None
+    assert failed["status"] == "failed" and "docker daemon gone" in failed["error"]
+    assert failed["finished_at"] is not None
+
+def test_unknown_jobs_come_from_history():
+    db = HistoryDB()
+    db.saved.append({"id": "elsewhere", "status": "succeeded"})    # Ran in another process
+    jobs = ScaleJobs(FakeActuator(), db)
+
+    assert jobs.get("elsewhere")["status"] == "succeeded"
+    assert jobs.get("missing") is None
+    with pytest.raises(ValueError):
+        jobs.submit("sideways")
@@ -0,0 +1,84 @@
+import asyncio
+
+from src.database import CONFIG_CHANNEL
+from src.stream import MetricHub, sse
+
+
+class FakeSource:
+    """Counts reads so tests can check the DB is hit once per sample, not once per subscriber"""
+    def __init__(self):
+        self.rows = []
+        self.fetches = 0
+        self.mode_reads = 0
+        self.current_mode = "auto"
+
+    def add(self, second):
+        self.rows.insert(0, {"timestamp": f"2026-01-01T00:00:{second:02d}", "cpu": float(second), "host": "local"})
+
+    def fetch(self, limit):
+        self.fetches += 1
+        return self.rows[:limit]
+
+    def predict(self):
+        return {"status": "ok", "cpu": {"Linear": float(len(self.rows))}}
+
+    def mode(self):
+        self.mode_reads += 1
+        return self.current_mode
+
+def make_hub(source, **options):
+    return MetricHub(source.fetch, source.predict, source.mode, **options)
+
+def test_fan_out_reads_each_sample_once():
+    async def scenario():
+        source = FakeSource()
+        source.add(1)
+        hub = make_hub(source, poll_interval=60)
+        subscribers = [await hub.subscribe() for _ in range(50)]
+        assert subscribers[0][1]["metrics"][0]["cpu"] == 1.0
+        fetches = source.fetches
+
+        source.add(2)
+        hub.poke()
+        await asyncio.sleep(0.1)
+
+        assert source.fetches == fetches + 1, "One read for all 50 subscribers"
+        for queue, _ in subscribers:
+            event, data = queue.get_nowait()
+            assert event == "metrics" and [row["cpu"] for row in data] == [2.0]
+            assert queue.get_nowait()[0] == "prediction"
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+def test_mode_change_is_pushed():
+    async def scenario():
+        source = FakeSource()
+        hub = make_hub(source, poll_interval=60)
+        queue, snapshot = await hub.subscribe()
+        assert snapshot["mode"] == "auto"
+
+        source.current_mode = "manual"
+        hub.poke(CONFIG_CHANNEL)
+        await asyncio.sleep(0.1)
+
+        assert queue.get_nowait() == ("mode", {"mode": "manual"})
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+def test_slow_subscriber_drops_oldest_events():
+    async def scenario():
+        hub = make_hub(FakeSource(), queue_size=2)
+        queue = asyncio.Queue(maxsize=2)
+        hub.subscribers.add(queue)
+        for i in range(4):
+            hub.publish("metrics", i)
+
+        assert [queue.get_nowait()[1] for _ in range(2)] == [2, 3]
+        assert hub.dropped == 2
+
+    asyncio.run(scenario())
+
+def test_sse_format():
+    assert sse("mode", {"mode": "auto"}) == 'event: mode\ndata: {"mode": "auto"}\n\n'
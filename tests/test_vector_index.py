@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.cache import TTLCache
+from src.rag_agent import RUNBOOK, RagAgent
+from src.vector_index import HashingEmbedder, LocalVectorIndex
+
+IDS = [f"runbook_rule_{i}" for i in range(len(RUNBOOK))]
+
+def test_finds_the_matching_runbook_entry(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    index.upsert(documents=RUNBOOK, ids=IDS)
+
+    result = index.query(query_texts=["my pod is in CrashLoopBackOff, what now?", "502 bad gateway from the ingress"], n_results=2)
+    assert result["ids"][0][0] == "runbook_rule_0"
+    assert result["ids"][1][0] == "runbook_rule_2"
+    assert result["distances"][0][0] < result["distances"][0][1]
+
+def test_embeddings_are_cached_on_disk(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    assert index.upsert(documents=RUNBOOK, ids=IDS) == len(RUNBOOK)
+
+    reopened = LocalVectorIndex(str(tmp_path))
+    assert isinstance(reopened.vectors, np.memmap)
+    assert reopened.upsert(documents=RUNBOOK, ids=IDS) == 0, "Unchanged documents aren't embedded again"
+    assert reopened.upsert(documents=["Disk full: clean up old docker images with docker image prune"], ids=[IDS[1]]) == 1
+    assert reopened.count() == len(RUNBOOK)
+
+    again = LocalVectorIndex(str(tmp_path))
+    assert again.query(query_texts=["disk is full"], n_results=1)["ids"] == [[IDS[1]]]
+    assert LocalVectorIndex(str(tmp_path), HashingEmbedder(dim=64)).count() == 0, "Other embedder: rebuilt"
+
+def test_empty_index():
+    index = LocalVectorIndex("/nonexistent/index")
+    assert index.query(query_texts=["anything"]) == {"ids": [[]], "documents": [[]], "distances": [[]]}
+
+def test_retrieval_falls_back_to_the_local_index(tmp_path):
+    class Down:
+        def query(self, **kwargs):
+            raise ConnectionError("chroma unreachable")
+
+    index = LocalVectorIndex(str(tmp_path))
+    agent = RagAgent.__new__(RagAgent)
+    agent.retrieval_stats, agent.stats_lock = {}, threading.Lock()
+    agent.knowledge = [("chroma", Down()), ("local", index)]
+    agent.seed_knowledge(index)
+
+    assert "k3d image import" in agent.retrieve("ErrImageNeverPull on my pod")
+    agent.last_timings, agent.context_cache, agent.answer_cache = {}, TTLCache(), TTLCache()
+    stats = agent.stats()["retrieval"]
+    assert stats["chroma"]["failures"] == 1
+    assert stats["local"]["queries"] == 1
+
+    agent.knowledge = []
+    assert agent.retrieve("anything") is None
+
+def test_retrieval_counters_survive_concurrent_chats():
+    class Instant:
+        def query(self, **kwargs):
+            return {"documents": [["Check the logs"]]}
+
+    agent = RagAgent.__new__(RagAgent)
+    agent.retrieval_stats, agent.stats_lock = {}, threading.Lock()
+    agent.knowledge = [("local", Instant())]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(agent.retrieve, ["why is cpu high?"] * 2000))
+
+    assert agent.retrieval_stats["local"]["queries"] == 2000